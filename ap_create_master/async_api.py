@@ -0,0 +1,305 @@
+"""
+Asyncio API for driving ap-create-master from an event loop.
+
+Planning (discovery, header reads and master library scans) runs in an
+executor thread, and PixInsight is awaited as an asyncio subprocess, so the
+event loop is never blocked. Several session directories can be planned
+concurrently with asyncio.gather; give each concurrently planned session its
+own cache_dir so their SQLite caches do not contend for write locks.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .calibrate_masters import (
+    RunPlan,
+    aggregate_exit_codes,
+    build_pixinsight_command,
+    complete_run,
+    generate_masters,
+    monitor_pixinsight_progress_two_phase,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the progress monitor after PixInsight exits
+MONITOR_JOIN_TIMEOUT_SECONDS = 5
+
+
+async def async_generate_masters(
+    input_dir: str,
+    output_dir: str,
+    executor: Optional[Executor] = None,
+    **kwargs: Any,
+) -> RunPlan:
+    """
+    Plan a run without blocking the event loop.
+
+    generate_masters runs in an executor thread; its own header reads use
+    the io_workers thread pool as usual.
+
+    Args:
+        input_dir: Directory containing calibration frames
+        output_dir: Base output directory
+        executor: Executor to run planning in (default: the loop's default)
+        **kwargs: Further keyword arguments for generate_masters
+
+    Returns:
+        RunPlan from generate_masters
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(generate_masters, input_dir, output_dir, **kwargs)
+    )
+
+
+async def async_run_pixinsight(
+    pixinsight_binary: str,
+    script_path: str,
+    calibrated_files: List[Path],
+    master_files: List[Path],
+    instance_id: int = 123,
+    force_exit: bool = True,
+    quiet: bool = False,
+    debug: bool = False,
+    script_args: Sequence[str] = (),
+) -> int:
+    """
+    Execute PixInsight as an asyncio subprocess.
+
+    Progress is monitored on a thread like run_pixinsight. If the awaiting
+    task is cancelled, PixInsight is killed before the cancellation
+    propagates.
+
+    Args:
+        pixinsight_binary: Path to PixInsight binary/executable
+        script_path: Path to the JavaScript script to execute
+        calibrated_files: List of expected calibrated files (Phase 1)
+        master_files: List of expected master files (Phase 2)
+        instance_id: PixInsight instance ID (default: 123)
+        force_exit: Exit PixInsight after script completes (default: True)
+        quiet: Suppress progress output
+        debug: Show debug output including PixInsight stderr
+        script_args: Arguments for the script (e.g. the script manifest path)
+
+    Returns:
+        Exit code from PixInsight process
+    """
+    return await async_run_pixinsight_parallel(
+        pixinsight_binary,
+        [(script_path, script_args)],
+        calibrated_files,
+        master_files,
+        instance_id,
+        force_exit,
+        quiet,
+        debug,
+    )
+
+
+async def async_run_pixinsight_parallel(
+    pixinsight_binary: str,
+    script_runs: Sequence[Tuple[str, Sequence[str]]],
+    calibrated_files: List[Path],
+    master_files: List[Path],
+    instance_id: int = 123,
+    force_exit: bool = True,
+    quiet: bool = False,
+    debug: bool = False,
+) -> int:
+    """
+    Execute one PixInsight instance per script as concurrent subprocesses.
+
+    Like run_pixinsight_parallel, script n (counting from 0) runs with
+    instance ID instance_id + n under a single progress monitor. Cancelling
+    the awaiting task kills every instance still running.
+
+    Args:
+        pixinsight_binary: Path to PixInsight binary/executable
+        script_runs: (script_path, script_args) for each instance
+        calibrated_files: List of expected calibrated files (Phase 1)
+        master_files: List of expected master files (Phase 2)
+        instance_id: PixInsight instance ID of the first instance
+            (default: 123)
+        force_exit: Exit PixInsight after script completes (default: True)
+        quiet: Suppress progress output
+        debug: Show debug output including PixInsight stderr
+
+    Returns:
+        0 if every instance succeeded, else the exit code of the first
+        failing instance
+    """
+    commands = [
+        build_pixinsight_command(
+            pixinsight_binary, script_path, instance_id + index, force_exit, args
+        )
+        for index, (script_path, args) in enumerate(script_runs)
+    ]
+
+    stop_event = threading.Event()
+    monitor_thread = threading.Thread(
+        target=monitor_pixinsight_progress_two_phase,
+        args=(calibrated_files, master_files, stop_event, quiet),
+        daemon=True,
+    )
+    monitor_thread.start()
+
+    tasks = [
+        asyncio.ensure_future(_async_run_pixinsight_command(cmd, debug))
+        for cmd in commands
+    ]
+    try:
+        exit_codes = await asyncio.gather(*tasks)
+    except Exception as e:
+        logger.error(f"Failed to execute PixInsight: {e}")
+        # Do not leave the other instances running after a failed launch
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        stop_event.set()
+        await asyncio.to_thread(monitor_thread.join, MONITOR_JOIN_TIMEOUT_SECONDS)
+
+    return aggregate_exit_codes(
+        exit_codes, [script_path for script_path, _ in script_runs], instance_id
+    )
+
+
+async def _async_run_pixinsight_plan(
+    pixinsight_binary: str,
+    plan: RunPlan,
+    instance_id: int,
+    force_exit: bool,
+    quiet: bool,
+    debug: bool,
+) -> int:
+    """Run a plan's scripts as they become ready, killing them if cancelled."""
+    script_runs = plan.script_runs()
+    commands = [
+        build_pixinsight_command(
+            pixinsight_binary, script_path, instance_id + index, force_exit, args
+        )
+        for index, (script_path, args) in enumerate(script_runs)
+    ]
+
+    stop_event = threading.Event()
+    monitor_thread = threading.Thread(
+        target=monitor_pixinsight_progress_two_phase,
+        args=(plan.calibrated_files, plan.expected_master_files, stop_event, quiet),
+        daemon=True,
+    )
+    monitor_thread.start()
+
+    exit_codes: Dict[int, int] = {}
+    running: Dict["asyncio.Task[int]", int] = {}
+    try:
+        while True:
+            if not any(exit_codes.values()):
+                started = set(running.values()) | set(exit_codes)
+                for index in plan.ready_scripts(started, set(exit_codes)):
+                    task = asyncio.create_task(
+                        _async_run_pixinsight_command(commands[index], debug)
+                    )
+                    running[task] = index
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                exit_codes[running.pop(task)] = task.result()
+    except BaseException as e:
+        if not isinstance(e, asyncio.CancelledError):
+            logger.error(f"Failed to execute PixInsight: {e}")
+        # Do not leave other instances running after a failure or cancellation
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        raise
+    finally:
+        stop_event.set()
+        await asyncio.to_thread(monitor_thread.join, MONITOR_JOIN_TIMEOUT_SECONDS)
+
+    ran = sorted(exit_codes)
+    return aggregate_exit_codes(
+        [exit_codes[index] for index in ran],
+        [script_runs[index][0] for index in ran],
+        instance_id,
+        indices=ran,
+    )
+
+
+async def _async_run_pixinsight_command(cmd: List[str], debug: bool) -> int:
+    """Run one PixInsight command, killing it if the task is cancelled."""
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=(asyncio.subprocess.DEVNULL if not debug else asyncio.subprocess.STDOUT),
+    )
+    try:
+        stdout, _ = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    # Log any stderr/stdout from the process itself in debug mode
+    if stdout and debug:
+        logger.debug(stdout.decode(errors="replace"))
+
+    # The process has exited; wait() just returns its exit code
+    return await process.wait()
+
+
+async def async_execute_plan(
+    plan: RunPlan,
+    input_dir: str,
+    pixinsight_binary: str,
+    cache_dir: Optional[str] = None,
+    instance_id: int = 123,
+    force_exit: bool = True,
+    quiet: bool = False,
+    debug: bool = False,
+) -> int:
+    """
+    Run PixInsight for a plan and finish the run if it succeeds.
+
+    Scripts start like run_pixinsight_plan: a flat script of a plan
+    generated with parallel_instances waits only for the scripts creating
+    its masters, and no script starts after one fails. On success the run is
+    completed like the CLI does (run manifest and IMAGETYP headers), off
+    the event loop.
+
+    Args:
+        plan: Plan from async_generate_masters (must contain a script)
+        input_dir: Input directory the plan was generated from
+        pixinsight_binary: Path to PixInsight binary/executable
+        cache_dir: Cache directory used for planning, or None
+        instance_id: PixInsight instance ID of the plan's first script; use
+            distinct ID ranges for concurrent runs
+        force_exit: Exit PixInsight after script completes (default: True)
+        quiet: Suppress progress output
+        debug: Show debug output including PixInsight stderr
+
+    Returns:
+        Exit code from PixInsight process
+
+    Raises:
+        ValueError: If the plan has no script to run
+    """
+    if not plan.script_paths:
+        raise ValueError("Plan has no script to run")
+
+    exit_code = await _async_run_pixinsight_plan(
+        pixinsight_binary, plan, instance_id, force_exit, quiet, debug
+    )
+    if exit_code == 0:
+        await asyncio.to_thread(complete_run, plan, input_dir, cache_dir)
+    else:
+        logger.warning(f"PixInsight exited with code {exit_code}")
+    return exit_code
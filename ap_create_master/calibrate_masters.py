@@ -10,13 +10,14 @@ import subprocess
 import sys
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
 
 import ap_common
 from ap_common.constants import (
-    DEFAULT_FITS_PATTERN,
     HEADER_IMAGETYP,
     TYPE_MASTER_BIAS,
     TYPE_MASTER_DARK,
@@ -27,9 +28,25 @@ from ap_common.logging_config import setup_logging
 from ap_common.progress import ProgressTracker
 
 from . import config
-from .grouping import group_files, get_group_metadata
-from .master_matching import find_matching_master_for_flat
-from .script_generator import generate_combined_script, generate_master_filename
+from .discovery import IGNORED, PruneRules, iter_frames
+from .columnar_grouping import ColumnarGrouper
+from .grouping import FrameGrouper, FrameRecord, get_group_metadata
+from .header_index import (
+    HEADER_INDEX_FILENAME,
+    MASTER_CATALOG_FILENAME,
+    HeaderIndex,
+)
+from .master_matching import match_masters_for_groups
+from .run_manifest import RUN_MANIFEST_FILENAME, RunManifest
+from .script_generator import (
+    DRIVER_SCRIPT_FILENAME,
+    build_script_manifest,
+    generate_master_filename,
+    stream_combined_script,
+    write_driver_script,
+    write_script_manifest,
+)
+from .sharding import MIB, group_working_set, shard_groups
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +61,110 @@ POLLING_FREQUENCY_SECONDS = 1
 ProgressTracker.set_default_desc_width(20)
 
 
+@dataclass
+class RunPlan:
+    """
+    Result of planning a run: groups, chosen masters and expected outputs.
+
+    Attributes:
+        script_paths: Generated script file paths (empty for dryrun)
+        script_args: Arguments PixInsight passes to each script, aligned with
+            script_paths (the manifest path when the driver script runs a
+            JSON script manifest)
+        master_files: List of (master_file_path, frame_type) tuples
+        bias_groups: List of (metadata, file_paths) for bias groups
+        dark_groups: List of (metadata, file_paths) for dark groups
+        flat_groups: List of (metadata, file_paths, master_bias,
+            master_dark) for flat groups
+        calibrated_files: Expected calibrated flat files (Phase 1)
+        expected_master_files: Expected master files (Phase 2)
+        processed_files: Discovered files to record in the run manifest
+            once PixInsight completes (new files only for incremental runs)
+        script_waves: Wave of each script, aligned with script_paths. Wave 1
+            scripts calibrate flats with masters created by wave 0 scripts
+            (default: every script in wave 0)
+        script_dependencies: Indices of the scripts each script waits for,
+            aligned with script_paths (default: none)
+        script_stack_sizes: ImageIntegration stack size in MiB of each
+            script, aligned with script_paths, or None where PixInsight
+            sizes memory automatically
+        max_running: Most scripts running at the same time (default: no
+            limit)
+        memory_budget_mb: MiB the stack sizes of the running scripts may
+            add up to (default: no limit)
+    """
+
+    script_paths: List[str] = field(default_factory=list)
+    script_args: List[List[str]] = field(default_factory=list)
+    master_files: List[Tuple[str, str]] = field(default_factory=list)
+    bias_groups: List[Tuple[Dict[str, Any], List[str]]] = field(default_factory=list)
+    dark_groups: List[Tuple[Dict[str, Any], List[str]]] = field(default_factory=list)
+    flat_groups: List[
+        Tuple[Dict[str, Any], List[str], Optional[str], Optional[str]]
+    ] = field(default_factory=list)
+    calibrated_files: List[Path] = field(default_factory=list)
+    expected_master_files: List[Path] = field(default_factory=list)
+    processed_files: List[str] = field(default_factory=list)
+    script_waves: List[int] = field(default_factory=list)
+    script_dependencies: List[List[int]] = field(default_factory=list)
+    script_stack_sizes: List[Optional[int]] = field(default_factory=list)
+    max_running: Optional[int] = None
+    memory_budget_mb: Optional[int] = None
+
+    def script_runs(self) -> List[Tuple[str, List[str]]]:
+        """Pair each script with its arguments, one PixInsight run each."""
+        return [
+            (script, self.script_args[index] if index < len(self.script_args) else [])
+            for index, script in enumerate(self.script_paths)
+        ]
+
+    def ready_scripts(self, started: Set[int], finished: Set[int]) -> List[int]:
+        """
+        Pick the scripts that can start now.
+
+        A script can start once every script it depends on has finished,
+        while fewer than max_running scripts are running and, with a memory
+        budget, while the stack sizes of the running scripts leave room for
+        its own. A script always fits when nothing else is running.
+
+        Args:
+            started: Indices of the scripts started so far
+            finished: Indices of the scripts that have finished
+
+        Returns:
+            Indices of the scripts to start, in script order
+        """
+
+        def stack_size(index: int) -> int:
+            if index < len(self.script_stack_sizes):
+                return self.script_stack_sizes[index] or 0
+            return 0
+
+        running = len(started - finished)
+        memory = sum(stack_size(index) for index in started - finished)
+        ready: List[int] = []
+        for index in range(len(self.script_paths)):
+            if self.max_running is not None and running >= self.max_running:
+                break
+            dependencies = (
+                self.script_dependencies[index]
+                if index < len(self.script_dependencies)
+                else []
+            )
+            if index in started or not finished.issuperset(dependencies):
+                continue
+            if (
+                self.memory_budget_mb is not None
+                and running
+                and memory + stack_size(index) > self.memory_budget_mb
+            ):
+                continue
+            ready.append(index)
+            running += 1
+            memory += stack_size(index)
+        return ready
+
+
 def get_expected_output_files(
     master_dir: Path,
     calibrated_base_dir: Path,
@@ -228,6 +349,83 @@ def write_master_imagetyp_headers(master_files: List[Tuple[str, str]]) -> None:
             logger.warning(f"Failed to update IMAGETYP header for {master_file}: {e}")
 
 
+def select_touched_groups(
+    groups: Dict[Tuple, List[FrameRecord]], new_paths: Optional[Set[str]]
+) -> Dict[Tuple, List[FrameRecord]]:
+    """
+    Keep only groups that contain at least one new file.
+
+    Touched groups keep all of their files (old and new) so the rebuilt
+    master integrates the complete group.
+
+    Args:
+        groups: Dictionary mapping group keys to lists of frame records
+        new_paths: Paths not processed before, or None to keep every group
+
+    Returns:
+        Dictionary with the selected groups
+    """
+    if new_paths is None:
+        return groups
+    return {
+        group_key: group_files_list
+        for group_key, group_files_list in groups.items()
+        if any(frame.path in new_paths for frame in group_files_list)
+    }
+
+
+def _open_cache(db_path: Path, dryrun: bool) -> Optional[HeaderIndex]:
+    """Open a header cache; a dry run only reads one that already exists."""
+    if not dryrun:
+        return HeaderIndex(str(db_path))
+    if db_path.exists():
+        return HeaderIndex(str(db_path), read_only=True)
+    return None
+
+
+def record_processed_files(cache_dir: str, input_dir: str, paths: List[str]) -> None:
+    """
+    Record files from a completed run in the run manifest.
+
+    Args:
+        cache_dir: Cache directory holding the run manifest
+        input_dir: Input directory the files were discovered in
+        paths: Files included in the completed run
+    """
+    with RunManifest(str(Path(cache_dir) / RUN_MANIFEST_FILENAME)) as manifest:
+        manifest.record(input_dir, paths)
+    logger.debug(f"Recorded {len(paths)} processed file(s) in run manifest")
+
+
+def complete_run(plan: RunPlan, input_dir: str, cache_dir: Optional[str]) -> None:
+    """
+    Finish a run after PixInsight completed successfully.
+
+    Records the run's frames in the run manifest (when caching) and writes
+    IMAGETYP headers to the generated masters.
+
+    Args:
+        plan: Plan of the completed run
+        input_dir: Input directory the plan was generated from
+        cache_dir: Cache directory holding the run manifest, or None
+    """
+    # Frames are only marked processed after a successful run
+    if cache_dir and plan.processed_files:
+        record_processed_files(cache_dir, input_dir, plan.processed_files)
+
+    # Write IMAGETYP headers to generated master files
+    if plan.master_files:
+        logger.debug("Writing IMAGETYP headers to master files...")
+        write_master_imagetyp_headers(plan.master_files)
+
+
+def _create_grouper(grouping_engine: str) -> Union[FrameGrouper, ColumnarGrouper]:
+    """Create the frame grouper for a grouping engine."""
+    if grouping_engine == "columnar":
+        return ColumnarGrouper()
+    return FrameGrouper()
+
+
 def generate_masters(
     input_dir: str,
     output_dir: str,
@@ -238,7 +436,18 @@ def generate_masters(
     debug: bool = False,
     dryrun: bool = False,
     quiet: bool = False,
-) -> Tuple[List[str], List[Tuple[str, str]]]:
+    cache_dir: Optional[str] = None,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    incremental: bool = False,
+    exclude: Optional[List[str]] = None,
+    skip_markers: Optional[List[str]] = None,
+    path_sample: Optional[int] = None,
+    script_manifest: bool = False,
+    parallel_instances: int = 1,
+    use_run_masters: bool = True,
+    memory_budget: Optional[int] = None,
+    grouping_engine: str = config.DEFAULT_GROUPING_ENGINE,
+) -> RunPlan:
     """
     Generate calibration masters from input directory.
 
@@ -252,12 +461,47 @@ def generate_masters(
         debug: Enable debug output
         dryrun: Show what would be done without writing scripts
         quiet: Suppress progress output
+        cache_dir: Directory for the persistent header index and master
+            library catalog (default: no cache). A dry run reads existing
+            caches but never creates or updates them
+        io_workers: Number of concurrent header reads during discovery and
+            master library scans
+        incremental: Only rebuild groups containing frames not recorded in
+            the run manifest (requires cache_dir)
+        exclude: Glob patterns for directories to skip during discovery
+        skip_markers: File names that mark a directory to skip during
+            discovery
+        path_sample: If set, build frame metadata from folder and file names
+            and read only this many headers per path group to verify it
+        script_manifest: Write the groups to a JSON script manifest run by a
+            fixed driver script, instead of inlining them in the script
+        parallel_instances: Split the groups into up to this many scripts of
+            similar work, one per PixInsight instance. Flats calibrated with
+            masters created in this run go to a second wave of scripts, each
+            started once the scripts creating its masters have finished
+        use_run_masters: Also calibrate flats with bias and dark masters
+            created by this run; the script creates them before calibrating
+        memory_budget: Bytes of RAM for all PixInsight instances together.
+            Groups are packed so their estimated working sets fit, and each
+            script gets a fixed ImageIntegration stack size from the budget
+            (default: PixInsight sizes memory automatically)
+        grouping_engine: "streaming" groups frames as discovery yields them;
+            "columnar" collects keyword columns and groups them with one
+            lexsort per frame type. Both produce identical groups
 
     Returns:
-        Tuple of (script_paths, master_files):
-        - script_paths: List of generated script file paths
-        - master_files: List of (master_file_path, frame_type) tuples
+        RunPlan with the generated script paths, master files, groups and
+        expected output files (empty RunPlan if no frames were found)
+
+    Raises:
+        ValueError: If incremental is set without a cache_dir, or
+            grouping_engine is unknown
     """
+    if incremental and not cache_dir:
+        raise ValueError("Incremental mode requires a cache directory")
+    if grouping_engine not in config.GROUPING_ENGINES:
+        raise ValueError(f"Unknown grouping engine: {grouping_engine}")
+
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
 
@@ -272,36 +516,77 @@ def generate_masters(
         script_dir = output_path / "logs"
     script_dir.mkdir(parents=True, exist_ok=True)
 
-    # Discover files using ap-common get_filtered_metadata
+    # Discover files with a single pass over the input directory
     logger.info(f"Discovering calibration files in: {input_dir}")
 
-    # Get files for each type using get_filtered_metadata
-    files_by_type = {}
-    for frame_type in ["bias", "dark", "flat"]:
-        try:
-            metadata = ap_common.get_filtered_metadata(
-                dirs=[input_dir],
-                filters={config.NORMALIZED_HEADER_TYPE: frame_type.upper()},
-                profileFromPath=False,
-                patterns=[DEFAULT_FITS_PATTERN],
-                recursive=True,
-                required_properties=config.REQUIRED_KEYWORDS[frame_type],
-                debug=debug,
-                printStatus=not quiet,
-            )
-            # Convert to list format expected by group_files
-            files_by_type[frame_type] = [
-                {"path": filename, "headers": headers}
-                for filename, headers in metadata.items()
-            ]
-        except Exception as e:
-            logger.warning(f"Failed to discover {frame_type} files: {e}")
-            files_by_type[frame_type] = []
+    header_index = None
+    if cache_dir:
+        header_index = _open_cache(Path(cache_dir) / HEADER_INDEX_FILENAME, dryrun)
+
+    # Never discover the tool's own output, even when it lives under input_dir
+    excluded_dirs = [
+        output_path,
+        master_dir,
+        output_path / "calibrated",
+        script_dir,
+    ]
+    if cache_dir:
+        excluded_dirs.append(Path(cache_dir))
+    prune = PruneRules(
+        exclude=list(exclude or []),
+        markers=list(skip_markers or []),
+        excluded_dirs=[str(d) for d in excluded_dirs],
+    )
+
+    # Frames are grouped as discovery streams them, without collecting
+    # per-type file lists first
+    grouper = _create_grouper(grouping_engine)
+    frame_counts = {bucket: 0 for bucket in [*config.FRAME_TYPES, IGNORED]}
+    processed_files: List[str] = []
+    try:
+        for bucket, file_info in iter_frames(
+            input_dir,
+            header_index=header_index,
+            quiet=quiet,
+            io_workers=io_workers,
+            prune=prune,
+            path_sample=path_sample,
+        ):
+            frame_counts[bucket] += 1
+            processed_files.append(file_info["path"])
+            # Keep only what grouping reads; the full header dict is not
+            # retained
+            if bucket != IGNORED:
+                grouper.add_headers(file_info["path"], file_info["headers"], bucket)
+    except Exception as e:
+        logger.warning(f"Failed to discover calibration files: {e}")
+        grouper = _create_grouper(grouping_engine)
+        frame_counts = {bucket: 0 for bucket in frame_counts}
+        processed_files = []
+    finally:
+        if header_index is not None:
+            header_index.close()
+
+    # Incremental runs only rebuild groups containing a frame that has not
+    # been processed before (according to the run manifest)
+    new_paths: Optional[Set[str]] = None
+    if incremental and cache_dir:
+        manifest_path = Path(cache_dir) / RUN_MANIFEST_FILENAME
+        if dryrun and not manifest_path.exists():
+            new_paths = set(processed_files)
+        else:
+            with RunManifest(str(manifest_path), read_only=dryrun) as manifest:
+                new_paths = manifest.unseen(input_dir, processed_files)
+        logger.info(
+            f"Incremental: {len(new_paths)} new of {len(processed_files)} file(s)"
+        )
+        processed_files = [p for p in processed_files if p in new_paths]
 
     logger.debug(
-        f"Found files: Bias: {len(files_by_type['bias'])}, "
-        f"Dark: {len(files_by_type['dark'])}, "
-        f"Flat: {len(files_by_type['flat'])}"
+        f"Found files: Bias: {frame_counts['bias']}, "
+        f"Dark: {frame_counts['dark']}, "
+        f"Flat: {frame_counts['flat']}, "
+        f"Ignored: {frame_counts[IGNORED]}"
     )
 
     # Collect all groups for combined script
@@ -311,84 +596,98 @@ def generate_masters(
 
     # Track master files for header updates
     master_files_list: List[Tuple[str, str]] = []
+    # Bias/dark masters created by this run, by type: {path: metadata}
+    run_masters: Dict[str, Dict[str, Dict]] = {"bias": {}, "dark": {}}
+    # Estimated frame sizes of each group, in bias, dark, flat group order
+    group_frame_sizes: List[List[Optional[int]]] = []
 
     # Process bias frames
-    if files_by_type["bias"]:
-        bias_groups = group_files(files_by_type["bias"], "bias")
+    if frame_counts["bias"]:
+        bias_groups = select_touched_groups(grouper.groups("bias"), new_paths)
 
         for group_key, group_files_list in bias_groups.items():
-            metadata = get_group_metadata(group_files_list[0]["headers"], "bias")
-            file_paths = [f["path"] for f in group_files_list]
+            metadata = get_group_metadata(group_files_list[0].headers, "bias")
+            file_paths = [f.path for f in group_files_list]
             bias_groups_list.append((metadata, file_paths))
+            group_frame_sizes.append([f.frame_bytes for f in group_files_list])
 
             # Track master file for header updates
             master_name = generate_master_filename(metadata, "bias")
             master_file_path = str(master_dir / f"{master_name}.xisf")
             master_files_list.append((master_file_path, "bias"))
+            run_masters["bias"][master_file_path] = metadata
 
             logger.debug(f"Bias group: {len(file_paths)} files -> {master_name}")
 
         logger.debug(f"\nProcessing {len(bias_groups_list)} bias group(s)")
 
     # Process dark frames
-    if files_by_type["dark"]:
-        dark_groups = group_files(files_by_type["dark"], "dark")
+    if frame_counts["dark"]:
+        dark_groups = select_touched_groups(grouper.groups("dark"), new_paths)
 
         for group_key, group_files_list in dark_groups.items():
-            metadata = get_group_metadata(group_files_list[0]["headers"], "dark")
-            file_paths = [f["path"] for f in group_files_list]
+            metadata = get_group_metadata(group_files_list[0].headers, "dark")
+            file_paths = [f.path for f in group_files_list]
             dark_groups_list.append((metadata, file_paths))
+            group_frame_sizes.append([f.frame_bytes for f in group_files_list])
 
             # Track master file for header updates
             master_name = generate_master_filename(metadata, "dark")
             master_file_path = str(master_dir / f"{master_name}.xisf")
             master_files_list.append((master_file_path, "dark"))
+            run_masters["dark"][master_file_path] = metadata
 
             logger.debug(f"Dark group: {len(file_paths)} files -> {master_name}")
 
         logger.debug(f"\nProcessing {len(dark_groups_list)} dark group(s)")
 
     # Process flat frames
-    if files_by_type["flat"]:
-        flat_groups = group_files(files_by_type["flat"], "flat")
+    if frame_counts["flat"]:
+        flat_groups = select_touched_groups(grouper.groups("flat"), new_paths)
         n_calibrated = 0
 
+        # Match every flat group against a single scan of each master library
+        master_catalog = None
+        if flat_groups and cache_dir and (bias_master_dir or dark_master_dir):
+            master_catalog = _open_cache(
+                Path(cache_dir) / MASTER_CATALOG_FILENAME, dryrun
+            )
+        try:
+            matches = match_masters_for_groups(
+                {
+                    group_key: (
+                        group_files_list[0].headers,
+                        [
+                            f.exposure
+                            for f in group_files_list
+                            if f.exposure is not None
+                        ],
+                    )
+                    for group_key, group_files_list in flat_groups.items()
+                },
+                bias_master_dir,
+                dark_master_dir,
+                catalog=master_catalog,
+                io_workers=io_workers,
+                # Masters this run creates are candidates alongside the libraries
+                run_masters=run_masters if use_run_masters else None,
+            )
+        finally:
+            if master_catalog is not None:
+                master_catalog.close()
+
         for group_key, group_files_list in flat_groups.items():
             first_file = group_files_list[0]
-            metadata = get_group_metadata(first_file["headers"], "flat")
-            file_paths = [f["path"] for f in group_files_list]
-
-            # Find matching masters
-            master_bias_xisf = None
-            master_dark_xisf = None
-
-            # Extract exposure times from all flats in group for dark matching
-            flat_exposure_times = []
-            for file_info in group_files_list:
-                headers = file_info["headers"]
-                exposure = headers.get(config.NORMALIZED_HEADER_EXPOSURESECONDS)
-                if exposure is not None:
-                    try:
-                        flat_exposure_times.append(float(exposure))
-                    except (ValueError, TypeError):
-                        pass
-
-            if bias_master_dir:
-                master_bias_xisf = find_matching_master_for_flat(
-                    bias_master_dir, first_file["headers"], "bias"
-                )
-
-            if dark_master_dir:
-                master_dark_xisf = find_matching_master_for_flat(
-                    dark_master_dir,
-                    first_file["headers"],
-                    "dark",
-                    flat_exposure_times if flat_exposure_times else None,
-                )
+            metadata = get_group_metadata(first_file.headers, "flat")
+            file_paths = [f.path for f in group_files_list]
+            match = matches[group_key]
+            master_bias_xisf = match.bias
+            master_dark_xisf = match.dark
 
             flat_groups_list.append(
                 (metadata, file_paths, master_bias_xisf, master_dark_xisf)
             )
+            group_frame_sizes.append([f.frame_bytes for f in group_files_list])
 
             # Track master file for header updates
             master_name = generate_master_filename(metadata, "flat")
@@ -401,10 +700,13 @@ def generate_masters(
 
             # Log details at debug level
             logger.debug(f"Flat group: {len(file_paths)} files -> {master_name}")
-            if master_bias_xisf:
-                logger.debug(f"  Using bias master: {Path(master_bias_xisf).name}")
-            if master_dark_xisf:
-                logger.debug(f"  Using dark master: {Path(master_dark_xisf).name}")
+            for kind, master, from_run in (
+                ("bias", master_bias_xisf, match.bias_from_run),
+                ("dark", master_dark_xisf, match.dark_from_run),
+            ):
+                if master:
+                    origin = " (created in this run)" if from_run else ""
+                    logger.debug(f"  Using {kind} master: {Path(master).name}{origin}")
 
         if not quiet:
             if n_calibrated > 0:
@@ -435,69 +737,166 @@ def generate_masters(
                     calibrated_dir = output_path / "calibrated" / master_name
                     calibrated_dir.mkdir(parents=True, exist_ok=True)
 
+        calibrated_files, expected_master_files = get_expected_output_files(
+            master_dir,
+            output_path,
+            bias_groups_list,
+            dark_groups_list,
+            flat_groups_list,
+        )
+        plan = RunPlan(
+            master_files=master_files_list,
+            bias_groups=bias_groups_list,
+            dark_groups=dark_groups_list,
+            flat_groups=flat_groups_list,
+            calibrated_files=calibrated_files,
+            expected_master_files=expected_master_files,
+            processed_files=processed_files,
+        )
+
         # Use timestamp for script filename (will match log timestamp)
         if not timestamp:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        # Define log file path (same directory, same timestamp)
-        log_file_path = script_dir / f"{timestamp}.log"
-        script_path = script_dir / f"{timestamp}_calibrate_masters.js"
+        # Frames of unknown size are assumed as large as the largest known
+        largest_frame = max(
+            (size for sizes in group_frame_sizes for size in sizes if size),
+            default=0,
+        )
+        if memory_budget is not None and not largest_frame:
+            logger.warning(
+                "Frame sizes are unknown; splitting the memory budget evenly"
+            )
+        shards = shard_groups(
+            bias_groups_list,
+            dark_groups_list,
+            flat_groups_list,
+            parallel_instances,
+            str(master_dir),
+            [group_working_set(sizes, largest_frame) for sizes in group_frame_sizes],
+            memory_budget,
+        )
+        for index, shard in enumerate(shards):
+            # Each instance gets its own script and log: <timestamp>_<n>
+            prefix = timestamp if len(shards) == 1 else f"{timestamp}_{index + 1}"
+
+            # Define log file path (same directory, same timestamp)
+            log_file_path = script_dir / f"{prefix}.log"
+            if script_manifest:
+                script_path = script_dir / DRIVER_SCRIPT_FILENAME
+                manifest_path = script_dir / f"{prefix}_calibrate_masters.json"
+            else:
+                script_path = script_dir / f"{prefix}_calibrate_masters.js"
+
+            if dryrun:
+                print(f"[DRYRUN] Would write script to: {script_path}")
+                if script_manifest:
+                    print(f"[DRYRUN] Would write script manifest to: {manifest_path}")
+                print(f"[DRYRUN] Would log to: {log_file_path}")
+                if len(shards) > 1:
+                    wave = f"wave {shard.wave + 1}"
+                    if shard.depends_on:
+                        wave += ", after instance(s) " + ", ".join(
+                            str(i + 1) for i in shard.depends_on
+                        )
+                    print(
+                        f"[DRYRUN] Instance {index + 1} ({wave}): "
+                        f"{len(shard.bias_groups)} bias, "
+                        f"{len(shard.dark_groups)} dark, "
+                        f"{len(shard.flat_groups)} flat groups"
+                    )
+                if shard.stack_size_mb is not None:
+                    print(
+                        f"[DRYRUN] Integration stack: {shard.stack_size_mb} MiB "
+                        f"(largest group ~{shard.working_set // MIB} MiB)"
+                    )
+                continue
+            elif script_manifest:
+                write_script_manifest(
+                    str(manifest_path),
+                    build_script_manifest(
+                        str(master_dir),
+                        shard.bias_groups,
+                        shard.dark_groups,
+                        shard.flat_groups,
+                        str(log_file_path),
+                        str(output_path),  # calibrated_base_dir
+                        shard.stack_size_mb,
+                    ),
+                )
+                write_driver_script(script_path)
+                logger.debug(
+                    f"Generated script manifest: {manifest_path.name}, "
+                    f"driver: {script_path.name}, console_log: {log_file_path.name}"
+                )
+                plan.script_paths.append(str(script_path))
+                plan.script_args.append([str(manifest_path.resolve())])
+                plan.script_waves.append(shard.wave)
+                plan.script_dependencies.append(shard.depends_on)
+                plan.script_stack_sizes.append(shard.stack_size_mb)
+            else:
+                # Stream the script to disk instead of rendering it into memory
+                with open(script_path, "w", encoding="utf-8") as script_file:
+                    script_file.writelines(
+                        stream_combined_script(
+                            str(master_dir),
+                            shard.bias_groups,
+                            shard.dark_groups,
+                            shard.flat_groups,
+                            str(log_file_path),
+                            str(output_path),  # calibrated_base_dir
+                            shard.stack_size_mb,
+                        )
+                    )
+                logger.debug(
+                    f"Generated script: {script_path.name}, "
+                    f"console_log: {log_file_path.name}"
+                )
+                plan.script_paths.append(str(script_path))
+                plan.script_args.append([])
+                plan.script_waves.append(shard.wave)
+                plan.script_dependencies.append(shard.depends_on)
+                plan.script_stack_sizes.append(shard.stack_size_mb)
+
+        plan.max_running = parallel_instances
+        if memory_budget is not None:
+            plan.memory_budget_mb = max(memory_budget // MIB, 1)
 
         if dryrun:
-            print(f"[DRYRUN] Would write script to: {script_path}")
-            print(f"[DRYRUN] Would log to: {log_file_path}")
             print(
                 f"[DRYRUN] Summary: "
                 f"{len(bias_groups_list)} bias, "
                 f"{len(dark_groups_list)} dark, "
                 f"{len(flat_groups_list)} flat groups"
             )
-            return ([], master_files_list)
-        else:
-            combined_script = generate_combined_script(
-                str(master_dir),
-                bias_groups_list,
-                dark_groups_list,
-                flat_groups_list,
-                str(log_file_path),
-                str(output_path),  # calibrated_base_dir
-            )
-
-            script_path.write_text(combined_script, encoding="utf-8")
-            logger.debug(
-                f"Generated script: {script_path.name}, "
-                f"console_log: {log_file_path.name}"
-            )
-            return ([str(script_path)], master_files_list)
+        return plan
 
-    return ([], [])
+    return RunPlan()
 
 
-def run_pixinsight(
+def build_pixinsight_command(
     pixinsight_binary: str,
     script_path: str,
-    calibrated_files: List[Path],
-    master_files: List[Path],
     instance_id: int = 123,
     force_exit: bool = True,
-    quiet: bool = False,
-    debug: bool = False,
-) -> int:
+    script_args: Sequence[str] = (),
+) -> List[str]:
     """
-    Execute PixInsight with the generated script.
+    Build the PixInsight command line for running a generated script.
 
     Args:
         pixinsight_binary: Path to PixInsight binary/executable
         script_path: Path to the JavaScript script to execute
-        calibrated_files: List of expected calibrated files (Phase 1)
-        master_files: List of expected master files (Phase 2)
         instance_id: PixInsight instance ID (default: 123)
         force_exit: Exit PixInsight after script completes (default: True)
-        quiet: Suppress progress output
-        debug: Show debug output including PixInsight stderr
+        script_args: Arguments for the script (available as jsArguments)
 
     Returns:
-        Exit code from PixInsight process
+        Command as a list of arguments
+
+    Raises:
+        FileNotFoundError: If the binary or script does not exist
+        ValueError: If a script argument contains a comma
     """
     script_path_obj = Path(script_path).resolve()
     pixinsight_binary_obj = Path(pixinsight_binary).resolve()
@@ -508,10 +907,15 @@ def run_pixinsight(
     if not script_path_obj.exists():
         raise FileNotFoundError(f"Script not found: {script_path_obj}")
 
-    # Extract log file path from script directory
+    # PixInsight separates script arguments with commas
+    for arg in script_args:
+        if "," in arg:
+            raise ValueError(f"Script argument cannot contain a comma: {arg}")
+
+    # Extract log file path from the script (or script manifest) name
+    log_source = Path(script_args[0]) if script_args else script_path_obj
     log_file = (
-        script_path_obj.parent
-        / f"{script_path_obj.stem.replace('_calibrate_masters', '')}.log"
+        log_source.parent / f"{log_source.stem.replace('_calibrate_masters', '')}.log"
     )
 
     logger.debug(
@@ -531,7 +935,7 @@ def run_pixinsight(
         str(pixinsight_binary_obj),
         "--automation-mode",
         f"-n={instance_id}",
-        f"-r={script_path_obj}",
+        f"-r={','.join([str(script_path_obj), *script_args])}",
     ]
 
     if force_exit:
@@ -539,6 +943,87 @@ def run_pixinsight(
         logger.debug("Force exit: enabled")
 
     logger.debug(f"Running: {' '.join(cmd)}")
+    return cmd
+
+
+def run_pixinsight(
+    pixinsight_binary: str,
+    script_path: str,
+    calibrated_files: List[Path],
+    master_files: List[Path],
+    instance_id: int = 123,
+    force_exit: bool = True,
+    quiet: bool = False,
+    debug: bool = False,
+    script_args: Sequence[str] = (),
+) -> int:
+    """
+    Execute PixInsight with the generated script.
+
+    Args:
+        pixinsight_binary: Path to PixInsight binary/executable
+        script_path: Path to the JavaScript script to execute
+        calibrated_files: List of expected calibrated files (Phase 1)
+        master_files: List of expected master files (Phase 2)
+        instance_id: PixInsight instance ID (default: 123)
+        force_exit: Exit PixInsight after script completes (default: True)
+        quiet: Suppress progress output
+        debug: Show debug output including PixInsight stderr
+        script_args: Arguments for the script (e.g. the script manifest path)
+
+    Returns:
+        Exit code from PixInsight process
+    """
+    return run_pixinsight_parallel(
+        pixinsight_binary,
+        [(script_path, script_args)],
+        calibrated_files,
+        master_files,
+        instance_id,
+        force_exit,
+        quiet,
+        debug,
+    )
+
+
+def run_pixinsight_parallel(
+    pixinsight_binary: str,
+    script_runs: Sequence[Tuple[str, Sequence[str]]],
+    calibrated_files: List[Path],
+    master_files: List[Path],
+    instance_id: int = 123,
+    force_exit: bool = True,
+    quiet: bool = False,
+    debug: bool = False,
+) -> int:
+    """
+    Execute one PixInsight instance per script, all at the same time.
+
+    The instance for script n (counting from 0) uses instance ID
+    instance_id + n. One progress monitor watches the expected outputs of
+    every instance, so progress is reported for the run as a whole.
+
+    Args:
+        pixinsight_binary: Path to PixInsight binary/executable
+        script_runs: (script_path, script_args) for each instance
+        calibrated_files: List of expected calibrated files (Phase 1)
+        master_files: List of expected master files (Phase 2)
+        instance_id: PixInsight instance ID of the first instance
+            (default: 123)
+        force_exit: Exit PixInsight after script completes (default: True)
+        quiet: Suppress progress output
+        debug: Show debug output including PixInsight stderr
+
+    Returns:
+        0 if every instance succeeded, else the exit code of the first
+        failing instance
+    """
+    commands = [
+        build_pixinsight_command(
+            pixinsight_binary, script_path, instance_id + index, force_exit, args
+        )
+        for index, (script_path, args) in enumerate(script_runs)
+    ]
 
     # Start two-phase progress monitoring in background thread
     stop_event = threading.Event()
@@ -551,22 +1036,91 @@ def run_pixinsight(
 
     # Execute and wait for completion
     # Console output is logged by PixInsight via
-    # Console.beginLog() in the script
+    # Console.beginLog() in each script
     try:
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL if not debug else subprocess.STDOUT,
-            check=False,
-            text=True,
+        if len(commands) == 1:
+            exit_codes = [_run_pixinsight_command(commands[0], debug)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(commands)) as executor:
+                exit_codes = list(
+                    executor.map(
+                        _run_pixinsight_command, commands, [debug] * len(commands)
+                    )
+                )
+    except Exception as e:
+        logger.error(f"Failed to execute PixInsight: {e}")
+        raise
+    finally:
+        stop_event.set()
+        monitor_thread.join(timeout=5)
+
+    return aggregate_exit_codes(
+        exit_codes, [script_path for script_path, _ in script_runs], instance_id
+    )
+
+
+def run_pixinsight_plan(
+    pixinsight_binary: str,
+    plan: RunPlan,
+    instance_id: int = 123,
+    force_exit: bool = True,
+    quiet: bool = False,
+    debug: bool = False,
+) -> int:
+    """
+    Execute the scripts of a plan, each as soon as it is ready.
+
+    Scripts start as RunPlan.ready_scripts allows: a flat script waits only
+    for the scripts creating its masters. Script n (counting from 0) runs
+    with instance ID instance_id + n under a single progress monitor for
+    the whole run. After a script fails, no further script is started.
+
+    Args:
+        pixinsight_binary: Path to PixInsight binary/executable
+        plan: Plan with the scripts to run
+        instance_id: PixInsight instance ID of the first script
+            (default: 123)
+        force_exit: Exit PixInsight after script completes (default: True)
+        quiet: Suppress progress output
+        debug: Show debug output including PixInsight stderr
+
+    Returns:
+        0 if every script succeeded, else the exit code of the first
+        failing script
+    """
+    script_runs = plan.script_runs()
+    commands = [
+        build_pixinsight_command(
+            pixinsight_binary, script_path, instance_id + index, force_exit, args
         )
+        for index, (script_path, args) in enumerate(script_runs)
+    ]
 
-        # Log any stderr/stdout from the process itself
-        # (e.g., GPU warnings) in debug mode
-        if result.stdout and debug:
-            logger.debug(result.stdout)
+    stop_event = threading.Event()
+    monitor_thread = threading.Thread(
+        target=monitor_pixinsight_progress_two_phase,
+        args=(plan.calibrated_files, plan.expected_master_files, stop_event, quiet),
+        daemon=True,
+    )
+    monitor_thread.start()
 
-        return result.returncode
+    exit_codes: Dict[int, int] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(commands), 1)) as executor:
+            running: Dict[Future, int] = {}
+            while True:
+                if not any(exit_codes.values()):
+                    started = set(running.values()) | set(exit_codes)
+                    for index in plan.ready_scripts(started, set(exit_codes)):
+                        future = executor.submit(
+                            _run_pixinsight_command, commands[index], debug
+                        )
+                        running[future] = index
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    exit_codes[running.pop(future)] = future.result()
     except Exception as e:
         logger.error(f"Failed to execute PixInsight: {e}")
         raise
@@ -574,6 +1128,65 @@ def run_pixinsight(
         stop_event.set()
         monitor_thread.join(timeout=5)
 
+    ran = sorted(exit_codes)
+    return aggregate_exit_codes(
+        [exit_codes[index] for index in ran],
+        [script_runs[index][0] for index in ran],
+        instance_id,
+        indices=ran,
+    )
+
+
+def _run_pixinsight_command(cmd: List[str], debug: bool) -> int:
+    """Run one PixInsight command and return its exit code."""
+    result = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL if not debug else subprocess.STDOUT,
+        check=False,
+        text=True,
+    )
+
+    # Log any stderr/stdout from the process itself
+    # (e.g., GPU warnings) in debug mode
+    if result.stdout and debug:
+        logger.debug(result.stdout)
+
+    return result.returncode
+
+
+def aggregate_exit_codes(
+    exit_codes: Sequence[int],
+    script_paths: Sequence[str],
+    instance_id: int,
+    indices: Optional[Sequence[int]] = None,
+) -> int:
+    """
+    Combine the exit codes of parallel PixInsight instances.
+
+    Each failing instance is logged with its instance ID and script.
+
+    Args:
+        exit_codes: Exit code of each instance, in script order
+        script_paths: Script run by each instance
+        instance_id: PixInsight instance ID of the first instance
+        indices: Offset of each instance's ID from instance_id, when only
+            some scripts of a plan ran (default: 0, 1, ...)
+
+    Returns:
+        0 if every instance succeeded, else the first non-zero exit code
+    """
+    if indices is None:
+        indices = range(len(exit_codes))
+    if len(exit_codes) > 1:
+        for index, exit_code, script_path in zip(indices, exit_codes, script_paths):
+            if exit_code != 0:
+                logger.warning(
+                    f"PixInsight instance {instance_id + index} "
+                    f"({Path(script_path).name}) exited with code {exit_code}"
+                )
+    return next((exit_code for exit_code in exit_codes if exit_code != 0), 0)
+
 
 def main() -> int:
     """Main entry point."""
@@ -603,6 +1216,97 @@ def main() -> int:
             " and logs (default: output_dir/logs)"
         ),
     )
+    parser.add_argument(
+        "--cache-dir",
+        help=(
+            "Directory for the header index and master catalog"
+            " (default: output_dir/cache)"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Read every header from disk instead of using the cache",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "Only rebuild groups containing frames not processed by a previous"
+            " successful run of this input directory"
+        ),
+    )
+    parser.add_argument(
+        "--grouping-engine",
+        choices=config.GROUPING_ENGINES,
+        default=config.DEFAULT_GROUPING_ENGINE,
+        help=(
+            "How frames are grouped: streaming as headers are read, or"
+            " columnar with one sort per frame type, faster for very large"
+            f" frame sets (default: {config.DEFAULT_GROUPING_ENGINE})"
+        ),
+    )
+    parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=config.DEFAULT_IO_WORKERS,
+        metavar="N",
+        help=(
+            "Number of concurrent header reads; use 8-16 on network storage"
+            f" (default: {config.DEFAULT_IO_WORKERS})"
+        ),
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help=(
+            "Skip directories whose name or path relative to input_dir matches"
+            " this glob (case-insensitive, repeatable), e.g. 'LIGHT*'"
+        ),
+    )
+    parser.add_argument(
+        "--skip-marker",
+        action="append",
+        default=[],
+        metavar="NAME",
+        help="Skip directories containing a file with this name (repeatable)",
+    )
+    parser.add_argument(
+        "--path-metadata",
+        action="store_true",
+        help=(
+            "Build frame metadata from KEYWORD_value tokens in folder and file"
+            " names, reading only a sample of headers per group to verify it"
+        ),
+    )
+    parser.add_argument(
+        "--path-sample",
+        type=int,
+        default=config.DEFAULT_PATH_SAMPLE_SIZE,
+        metavar="N",
+        help=(
+            "Headers read per path group with --path-metadata"
+            f" (default: {config.DEFAULT_PATH_SAMPLE_SIZE})"
+        ),
+    )
+    parser.add_argument(
+        "--script-manifest",
+        action="store_true",
+        help=(
+            "Write groups and file lists to a JSON manifest run by a fixed"
+            " driver script, instead of inlining them in the script"
+        ),
+    )
+    parser.add_argument(
+        "--no-run-masters",
+        action="store_true",
+        help=(
+            "Only calibrate flats with masters from --bias-master-dir and"
+            " --dark-master-dir, not with masters created in this run"
+        ),
+    )
     parser.add_argument(
         "--pixinsight-binary",
         help="Path to PixInsight binary (required for execution)",
@@ -613,6 +1317,26 @@ def main() -> int:
         default=123,
         help="PixInsight instance ID (default: 123)",
     )
+    parser.add_argument(
+        "--parallel-instances",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Split the groups across N PixInsight instances run at the same"
+            " time, using instance IDs from --instance-id upwards (default: 1)"
+        ),
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        metavar="GIB",
+        help=(
+            "RAM in GiB for all PixInsight instances together; groups are"
+            " packed to fit their estimated working sets and each script gets"
+            " a matching ImageIntegration stack size (default: automatic)"
+        ),
+    )
     parser.add_argument(
         "--no-force-exit",
         action="store_true",
@@ -644,6 +1368,16 @@ def main() -> int:
     )
 
     args = parser.parse_args()
+    if args.io_workers < 1:
+        parser.error("--io-workers must be at least 1")
+    if args.path_sample < 1:
+        parser.error("--path-sample must be at least 1")
+    if args.parallel_instances < 1:
+        parser.error("--parallel-instances must be at least 1")
+    if args.memory_budget is not None and args.memory_budget <= 0:
+        parser.error("--memory-budget must be positive")
+    if args.incremental and args.no_cache:
+        parser.error("--incremental cannot be used with --no-cache")
 
     # Setup logging
     logger = setup_logging(name="ap_create_master", debug=args.debug, quiet=args.quiet)
@@ -652,7 +1386,11 @@ def main() -> int:
         # Generate timestamp once to use for both script and log
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        scripts, master_files = generate_masters(
+        cache_dir = None
+        if not args.no_cache:
+            cache_dir = args.cache_dir or str(Path(args.output_dir) / "cache")
+
+        plan = generate_masters(
             args.input_dir,
             args.output_dir,
             args.bias_master_dir,
@@ -662,14 +1400,34 @@ def main() -> int:
             debug=args.debug,
             dryrun=args.dryrun,
             quiet=args.quiet,
+            cache_dir=cache_dir,
+            io_workers=args.io_workers,
+            incremental=args.incremental,
+            exclude=args.exclude,
+            skip_markers=args.skip_marker,
+            path_sample=args.path_sample if args.path_metadata else None,
+            script_manifest=args.script_manifest,
+            parallel_instances=args.parallel_instances,
+            use_run_masters=not args.no_run_masters,
+            memory_budget=(
+                int(args.memory_budget * 1024 * MIB)
+                if args.memory_budget is not None
+                else None
+            ),
+            grouping_engine=args.grouping_engine,
         )
+        scripts = plan.script_paths
+        master_files = plan.master_files
 
         if args.dryrun:
             # Dryrun mode: no scripts were written
             print("\n[DRYRUN] Completed. No scripts written, no execution performed.")
         elif scripts:
             if not args.quiet:
-                print(f"\nGenerated script: {Path(scripts[0]).name}")
+                if len(scripts) == 1:
+                    print(f"\nGenerated script: {Path(scripts[0]).name}")
+                else:
+                    print(f"\nGenerated {len(scripts)} scripts for parallel instances")
 
             # Execute PixInsight if requested
             if not args.script_only:
@@ -683,126 +1441,37 @@ def main() -> int:
                     print("Use --script-only or --dryrun to skip execution")
                     return EXIT_ERROR
 
-                # Calculate expected output files for progress monitoring
-                # Re-run group generation to get the lists we need
-                output_path = Path(args.output_dir)
-                master_dir = output_path / "master"
-
-                # Get files by type (same as in generate_masters)
-                files_by_type = {}
-                for frame_type in ["bias", "dark", "flat"]:
-                    try:
-                        metadata = ap_common.get_filtered_metadata(
-                            dirs=[args.input_dir],
-                            filters={config.NORMALIZED_HEADER_TYPE: frame_type.upper()},
-                            profileFromPath=False,
-                            patterns=[DEFAULT_FITS_PATTERN],
-                            recursive=True,
-                            required_properties=config.REQUIRED_KEYWORDS[frame_type],
-                            debug=False,
-                            printStatus=False,
-                        )
-                        files_by_type[frame_type] = [
-                            {"path": filename, "headers": headers}
-                            for filename, headers in metadata.items()
-                        ]
-                    except Exception:
-                        files_by_type[frame_type] = []
-
-                # Build group lists to calculate expected files
-                from .grouping import group_files, get_group_metadata
-                from .master_matching import find_matching_master_for_flat
-
-                bias_groups_list = []
-                dark_groups_list = []
-                flat_groups_list = []
-
-                if files_by_type["bias"]:
-                    bias_groups = group_files(files_by_type["bias"], "bias")
-                    for _, group_files_list in bias_groups.items():
-                        metadata = get_group_metadata(
-                            group_files_list[0]["headers"], "bias"
-                        )
-                        file_paths = [f["path"] for f in group_files_list]
-                        bias_groups_list.append((metadata, file_paths))
-
-                if files_by_type["dark"]:
-                    dark_groups = group_files(files_by_type["dark"], "dark")
-                    for _, group_files_list in dark_groups.items():
-                        metadata = get_group_metadata(
-                            group_files_list[0]["headers"], "dark"
-                        )
-                        file_paths = [f["path"] for f in group_files_list]
-                        dark_groups_list.append((metadata, file_paths))
-
-                if files_by_type["flat"]:
-                    flat_groups = group_files(files_by_type["flat"], "flat")
-                    for _, group_files_list in flat_groups.items():
-                        first_file = group_files_list[0]
-                        metadata = get_group_metadata(first_file["headers"], "flat")
-                        file_paths = [f["path"] for f in group_files_list]
-
-                        master_bias_xisf = None
-                        master_dark_xisf = None
-
-                        flat_exposure_times = []
-                        for file_info in group_files_list:
-                            headers = file_info["headers"]
-                            exposure = headers.get(
-                                config.NORMALIZED_HEADER_EXPOSURESECONDS
-                            )
-                            if exposure is not None:
-                                try:
-                                    flat_exposure_times.append(float(exposure))
-                                except (ValueError, TypeError):
-                                    pass
-
-                        if args.bias_master_dir:
-                            master_bias_xisf = find_matching_master_for_flat(
-                                args.bias_master_dir, first_file["headers"], "bias"
-                            )
-
-                        if args.dark_master_dir:
-                            master_dark_xisf = find_matching_master_for_flat(
-                                args.dark_master_dir,
-                                first_file["headers"],
-                                "dark",
-                                flat_exposure_times if flat_exposure_times else None,
-                            )
-
-                        flat_groups_list.append(
-                            (metadata, file_paths, master_bias_xisf, master_dark_xisf)
-                        )
-
-                calibrated_files, master_files_list = get_expected_output_files(
-                    master_dir,
-                    output_path,
-                    bias_groups_list,
-                    dark_groups_list,
-                    flat_groups_list,
-                )
-
-                exit_code = run_pixinsight(
-                    args.pixinsight_binary,
-                    scripts[0],
-                    calibrated_files,
-                    master_files_list,
-                    args.instance_id,
-                    not args.no_force_exit,
-                    args.quiet,
-                    args.debug,
-                )
+                if len(scripts) == 1:
+                    exit_code = run_pixinsight(
+                        args.pixinsight_binary,
+                        scripts[0],
+                        plan.calibrated_files,
+                        plan.expected_master_files,
+                        args.instance_id,
+                        not args.no_force_exit,
+                        args.quiet,
+                        args.debug,
+                        script_args=plan.script_runs()[0][1],
+                    )
+                else:
+                    # Flat scripts start once the scripts creating their
+                    # masters have finished
+                    exit_code = run_pixinsight_plan(
+                        args.pixinsight_binary,
+                        plan,
+                        args.instance_id,
+                        not args.no_force_exit,
+                        args.quiet,
+                        args.debug,
+                    )
 
                 if exit_code == 0:
                     if not args.quiet:
                         print("\nPixInsight execution completed successfully!")
 
-                    # Write IMAGETYP headers to generated master files
-                    if master_files:
-                        logger.debug("Writing IMAGETYP headers to master files...")
-                        write_master_imagetyp_headers(master_files)
-                        if not args.quiet:
-                            print(f"Updated {len(master_files)} master file(s)")
+                    complete_run(plan, args.input_dir, cache_dir)
+                    if master_files and not args.quiet:
+                        print(f"Updated {len(master_files)} master file(s)")
 
                     if not args.quiet:
                         print(f"Master files: {args.output_dir}/master")
@@ -814,13 +1483,25 @@ def main() -> int:
             else:
                 print("Script-only mode: PixInsight execution skipped")
                 binary = args.pixinsight_binary or "<pixinsight-binary>"
-                print(
-                    f"To execute: {binary}"
-                    f" --automation-mode"
-                    f" -n={args.instance_id}"
-                    f" -r={scripts[0]}"
-                    f" --force-exit"
-                )
+                script_runs = plan.script_runs()
+                waves = plan.script_waves or [0] * len(script_runs)
+                for wave in sorted(set(waves)):
+                    if len(set(waves)) > 1:
+                        print(
+                            f"Wave {wave + 1}"
+                            + (f" (run after wave {wave} completes)" if wave else "")
+                            + ":"
+                        )
+                    for index, (script, script_args) in enumerate(script_runs):
+                        if waves[index] != wave:
+                            continue
+                        print(
+                            f"To execute: {binary}"
+                            f" --automation-mode"
+                            f" -n={args.instance_id + index}"
+                            f" -r={','.join([script, *script_args])}"
+                            f" --force-exit"
+                        )
         else:
             print("No calibration frames found to process.")
 
@@ -0,0 +1,252 @@
+"""
+Sort-based grouping of calibration frames from keyword columns.
+
+An alternative to grouping.group_files for very large frame sets. Instead of
+building a key tuple per file, each required keyword column is factorized
+once into integer codes and group ids are derived with a single lexsort over
+the code arrays. The result is identical to group_files: groups appear in
+the order their first frame arrived and frames keep their input order.
+
+generate_masters uses it through ColumnarGrouper when the "columnar"
+grouping engine is selected.
+"""
+
+import sys
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import config
+from .grouping import FrameRecord, frame_bytes
+
+
+def _factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Factorize a keyword column into integer codes and normalized labels.
+
+    Values are normalized like create_group_key: None becomes "" and
+    everything else is converted to a string with whitespace stripped. Only
+    distinct values are normalized, so the per-frame cost is one dict lookup.
+
+    Args:
+        values: Keyword values, one per frame
+
+    Returns:
+        Tuple of (codes array, interned label per code)
+    """
+    index: Dict[Any, int] = {}
+    if all(value.__class__ is str for value in values):
+        raw_codes = [index.setdefault(value, len(index)) for value in values]
+        distinct = list(index)
+    else:
+        # 239, 239.0 and True compare equal but normalize differently
+        raw_codes = [
+            index.setdefault((value.__class__, value), len(index)) for value in values
+        ]
+        distinct = [value for _, value in index]
+
+    labels: Dict[str, int] = {}
+    remap = np.array(
+        [
+            labels.setdefault("" if value is None else str(value).strip(), len(labels))
+            for value in distinct
+        ],
+        dtype=np.intp,
+    )
+    codes = remap[np.array(raw_codes, dtype=np.intp)]
+    return codes, [sys.intern(label) for label in labels]
+
+
+def _parse_exposures(values: Sequence[Any]) -> List[Optional[float]]:
+    """Parse exposure values, converting each distinct value only once."""
+    parsed: Dict[Any, Optional[float]] = {}
+    exposures = []
+    for value in values:
+        if value not in parsed:
+            try:
+                parsed[value] = float(value) if value is not None else None
+            except (ValueError, TypeError):
+                parsed[value] = None
+        exposures.append(parsed[value])
+    return exposures
+
+
+def _parse_frame_bytes(
+    columns: Mapping[str, Sequence[Any]], count: int
+) -> List[Optional[int]]:
+    """Estimate frame sizes, once per distinct combination of size keywords."""
+    names = list(config.FRAME_SIZE_KEYWORDS.values())
+    missing = [None] * count
+    parsed: Dict[Tuple, Optional[int]] = {}
+    sizes = []
+    for values in zip(*(columns.get(name, missing) for name in names)):
+        if values not in parsed:
+            parsed[values] = frame_bytes(dict(zip(names, values)))
+        sizes.append(parsed[values])
+    return sizes
+
+
+def _column_keywords(frame_type: str) -> List[str]:
+    """Keywords grouping reads for a frame type, in a fixed order."""
+    keywords = list(config.REQUIRED_KEYWORDS[frame_type])
+    for keyword in [
+        config.NORMALIZED_HEADER_EXPOSURESECONDS,
+        *config.FRAME_SIZE_KEYWORDS.values(),
+    ]:
+        if keyword not in keywords:
+            keywords.append(keyword)
+    return keywords
+
+
+def group_columns(
+    paths: Sequence[str], columns: Mapping[str, Sequence[Any]], frame_type: str
+) -> Dict[Tuple, List[FrameRecord]]:
+    """
+    Group frames given as keyword columns.
+
+    Args:
+        paths: Frame paths
+        columns: Mapping of normalized keyword to a sequence of values aligned
+            with paths; missing keywords are treated as missing values
+        frame_type: Frame type ("bias", "dark", or "flat")
+
+    Returns:
+        Dictionary mapping group keys (tuples) to lists of frame records,
+        identical to group_files for the same frames
+
+    Raises:
+        ValueError: If frame_type is unknown
+    """
+    if frame_type not in config.REQUIRED_KEYWORDS:
+        raise ValueError(f"Unknown frame type: {frame_type}")
+
+    count = len(paths)
+    if count == 0:
+        return {}
+
+    missing = [None] * count
+    factorized = [
+        _factorize(columns.get(keyword, missing))
+        for keyword in config.REQUIRED_KEYWORDS[frame_type]
+    ]
+    codes = np.vstack([keyword_codes for keyword_codes, _ in factorized])
+
+    # lexsort uses the last row as the primary key; it is stable, so frames
+    # keep their input order within a group
+    order = np.lexsort(codes[::-1])
+    sorted_codes = codes[:, order]
+    changed = (sorted_codes[:, 1:] != sorted_codes[:, :-1]).any(axis=0)
+    starts = np.flatnonzero(np.concatenate(([True], changed)))
+    bounds = np.append(starts, count).tolist()
+
+    # The first sorted row of each group is its earliest frame
+    group_order = np.argsort(order[starts], kind="stable").tolist()
+
+    exposures = _parse_exposures(
+        columns.get(config.NORMALIZED_HEADER_EXPOSURESECONDS, missing)
+    )
+    sizes = _parse_frame_bytes(columns, count)
+    order_list = order.tolist()
+    code_rows = codes.T
+
+    groups: Dict[Tuple, List[FrameRecord]] = {}
+    for group in group_order:
+        rows = order_list[bounds[group] : bounds[group + 1]]
+        first_codes = code_rows[rows[0]]
+        key = tuple(
+            labels[code] for code, (_, labels) in zip(first_codes.tolist(), factorized)
+        )
+        groups[key] = [
+            FrameRecord(paths[row], frame_type, key, exposures[row], sizes[row])
+            for row in rows
+        ]
+    return groups
+
+
+def group_files_columnar(
+    files: Iterable[Dict], frame_type: str
+) -> Dict[Tuple, List[FrameRecord]]:
+    """
+    Group files by required keywords using the columnar engine.
+
+    Drop-in replacement for grouping.group_files.
+
+    Args:
+        files: File info dicts with "path" and "headers" keys
+        frame_type: Frame type ("bias", "dark", or "flat")
+
+    Returns:
+        Dictionary mapping group keys (tuples) to lists of frame records
+
+    Raises:
+        ValueError: If frame_type is unknown
+    """
+    if frame_type not in config.REQUIRED_KEYWORDS:
+        raise ValueError(f"Unknown frame type: {frame_type}")
+
+    files = list(files)
+    columns = {
+        keyword: [file_info["headers"].get(keyword) for file_info in files]
+        for keyword in _column_keywords(frame_type)
+    }
+    return group_columns(
+        [file_info["path"] for file_info in files], columns, frame_type
+    )
+
+
+class ColumnarGrouper:
+    """
+    Collect frames as keyword columns and group them on demand.
+
+    Same interface as grouping.FrameGrouper. Adding a frame only appends its
+    path and the keyword values grouping reads; each frame type is grouped
+    with group_columns the first time its groups are requested, so no
+    per-frame record or key tuple is built while discovery runs.
+    """
+
+    def __init__(self) -> None:
+        self._paths: Dict[str, List[str]] = {
+            frame_type: [] for frame_type in config.REQUIRED_KEYWORDS
+        }
+        self._columns: Dict[str, Dict[str, List[Any]]] = {
+            frame_type: {keyword: [] for keyword in _column_keywords(frame_type)}
+            for frame_type in config.REQUIRED_KEYWORDS
+        }
+        self._groups: Dict[str, Dict[Tuple, List[FrameRecord]]] = {}
+
+    def add_headers(self, path: str, headers: Dict, frame_type: str) -> None:
+        """
+        Add a frame from its normalized headers.
+
+        Args:
+            path: Path to the frame
+            headers: FITS headers dict (already normalized by ap-common)
+            frame_type: Frame type ("bias", "dark", or "flat")
+
+        Raises:
+            ValueError: If frame_type is unknown
+        """
+        if frame_type not in self._columns:
+            raise ValueError(f"Unknown frame type: {frame_type}")
+        self._paths[frame_type].append(path)
+        for keyword, column in self._columns[frame_type].items():
+            column.append(headers.get(keyword))
+        self._groups.pop(frame_type, None)
+
+    def groups(self, frame_type: str) -> Dict[Tuple, List[FrameRecord]]:
+        """
+        Get the groups collected so far for a frame type.
+
+        Args:
+            frame_type: Frame type ("bias", "dark", or "flat")
+
+        Returns:
+            Dictionary mapping group keys (tuples) to lists of frame records
+        """
+        if frame_type not in self._paths:
+            return {}
+        if frame_type not in self._groups:
+            self._groups[frame_type] = group_columns(
+                self._paths[frame_type], self._columns[frame_type], frame_type
+            )
+        return self._groups[frame_type]
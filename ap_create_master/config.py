@@ -71,6 +71,73 @@ MASTER_MATCH_KEYWORDS = [
     NORMALIZED_HEADER_READOUTMODE,
 ]
 
+# Raw keywords describing the image size, kept under these names by the
+# header readers for memory estimates
+FRAME_SIZE_KEYWORDS = {
+    "NAXIS1": "naxis1",
+    "NAXIS2": "naxis2",
+    "NAXIS3": "naxis3",
+    "BITPIX": "bitpix",
+}
+
+# Keywords kept per frame during discovery and in the persistent header index
+# (grouping keywords for every frame type, exposure for dark matching and the
+# image size for memory estimates)
+CACHED_KEYWORDS = sorted(
+    {keyword for keywords in REQUIRED_KEYWORDS.values() for keyword in keywords}
+    | {NORMALIZED_HEADER_EXPOSURESECONDS}
+    | set(FRAME_SIZE_KEYWORDS.values())
+)
+
+# Bytes ImageIntegration holds per pixel sample: data is integrated as 32-bit
+# floats, or 64-bit floats for 64-bit input
+MIN_INTEGRATION_SAMPLE_BYTES = 4
+
+# File extensions scanned during discovery (compared case-insensitively)
+FITS_EXTENSIONS = [".fit", ".fits"]
+
+# Concurrent header reads during discovery and master library scans
+# (1 = sequential; 8-16 suits network storage)
+DEFAULT_IO_WORKERS = 1
+
+# Grouping engines: "streaming" groups frames as discovery yields them,
+# "columnar" collects keyword columns and groups them with one lexsort
+GROUPING_ENGINES = ["streaming", "columnar"]
+DEFAULT_GROUPING_ENGINE = "streaming"
+
+# File extensions read with the XISF header reader
+XISF_EXTENSIONS = [".xisf"]
+
+# File extensions recorded in the master library catalog
+MASTER_EXTENSIONS = XISF_EXTENSIONS
+
+# Path tokens (KEYWORD_value in folder and file names) mapped to normalized
+# keywords, used when discovery builds metadata from paths
+PATH_KEYWORDS = {
+    "IMAGETYP": NORMALIZED_HEADER_TYPE,
+    "TYPE": NORMALIZED_HEADER_TYPE,
+    "INSTRUME": NORMALIZED_HEADER_CAMERA,
+    "CAMERA": NORMALIZED_HEADER_CAMERA,
+    "SETTEMP": NORMALIZED_HEADER_SETTEMP,
+    "SET-TEMP": NORMALIZED_HEADER_SETTEMP,
+    "GAIN": NORMALIZED_HEADER_GAIN,
+    "OFFSET": NORMALIZED_HEADER_OFFSET,
+    "READOUTM": NORMALIZED_HEADER_READOUTMODE,
+    "READOUTMODE": NORMALIZED_HEADER_READOUTMODE,
+    "EXPOSURE": NORMALIZED_HEADER_EXPOSURESECONDS,
+    "EXPTIME": NORMALIZED_HEADER_EXPOSURESECONDS,
+    "EXP": NORMALIZED_HEADER_EXPOSURESECONDS,
+    "FILTER": NORMALIZED_HEADER_FILTER,
+    "DATE": NORMALIZED_HEADER_DATE,
+    "DATE-OBS": NORMALIZED_HEADER_DATE,
+}
+
+# Frame types recognized as bare folder or file name tokens (e.g. "DARK")
+PATH_FRAME_TYPES = [TYPE_BIAS, TYPE_DARK, TYPE_FLAT, TYPE_LIGHT]
+
+# Real headers read per path group to verify metadata built from paths
+DEFAULT_PATH_SAMPLE_SIZE = 2
+
 # Frame types to ignore (e.g., lights)
 IGNORED_TYPES = [TYPE_LIGHT.lower()]
 
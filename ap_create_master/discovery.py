@@ -0,0 +1,631 @@
+"""
+Discover calibration frames in an input directory.
+
+Walks the input tree once, reads each header once, and streams the frames
+classified as bias, dark, flat or ignored. Headers can be served from a
+persistent HeaderIndex so unchanged files are never reopened.
+"""
+
+import fnmatch
+import logging
+import os
+import random
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import ap_common
+from ap_common.progress import ProgressTracker
+
+from . import config
+from .fits_header import FitsHeaderError, read_normalized_header
+from .header_index import HeaderIndex
+from .path_metadata import (
+    PathDiscoveryStats,
+    parse_path_keywords,
+    path_keywords_complete,
+    verify_samples,
+)
+from .xisf_header import XisfHeaderError, read_normalized_xisf_header
+
+logger = logging.getLogger(__name__)
+
+# Header reads queued per I/O worker while waiting for the oldest to finish
+READS_IN_FLIGHT_PER_WORKER = 4
+
+# Bucket for frames that are not processed (lights, unknown types,
+# or calibration frames missing required keywords)
+IGNORED = "ignored"
+
+
+def _suffixes(extensions: List[str]) -> Tuple[str, ...]:
+    """Lower-case extensions for case-insensitive endswith checks."""
+    return tuple(ext.lower() for ext in extensions)
+
+
+@dataclass
+class PruneRules:
+    """
+    Rules for skipping subtrees while walking an input directory.
+
+    Pruned directories are never listed, so nothing beneath them is stat'ed
+    or opened. The input directory itself is never pruned.
+
+    Attributes:
+        exclude: Glob patterns matched case-insensitively against a
+            directory's name and its path relative to the input directory
+            (with "/" separators), e.g. "LIGHT*" or "*/calibrated"
+        markers: File names that mark a directory to be skipped when
+            present in it
+        excluded_dirs: Directories to skip wherever they appear under the
+            input directory (e.g. the tool's own output tree)
+    """
+
+    exclude: List[str] = field(default_factory=list)
+    markers: List[str] = field(default_factory=list)
+    excluded_dirs: List[str] = field(default_factory=list)
+    _excluded_real: Set[str] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.exclude = [pattern.lower() for pattern in self.exclude]
+        self._excluded_real = {os.path.realpath(d) for d in self.excluded_dirs}
+
+    def prunes(self, input_dir: str, path: str) -> bool:
+        """
+        Check whether a directory under input_dir should be skipped.
+
+        Args:
+            input_dir: Root of the walk
+            path: Directory found under input_dir
+
+        Returns:
+            True if the directory and everything beneath it is skipped
+        """
+        name = os.path.basename(path).lower()
+        relative = os.path.relpath(path, input_dir).replace(os.sep, "/").lower()
+        for pattern in self.exclude:
+            if fnmatch.fnmatchcase(name, pattern) or fnmatch.fnmatchcase(
+                relative, pattern
+            ):
+                return True
+        if any(os.path.exists(os.path.join(path, m)) for m in self.markers):
+            return True
+        return bool(self._excluded_real) and (
+            os.path.realpath(path) in self._excluded_real
+        )
+
+
+def list_fits_files(
+    input_dir: str,
+    extensions: Optional[List[str]] = None,
+    prune: Optional[PruneRules] = None,
+) -> List[str]:
+    """
+    Recursively list FITS files under a directory in a stable order.
+
+    Paths are absolute, so header index entries do not depend on the working
+    directory or on how input_dir was spelled.
+
+    Args:
+        input_dir: Directory to scan
+        extensions: File extensions to include (default: FITS_EXTENSIONS)
+        prune: Optional rules for subtrees to skip
+
+    Returns:
+        Sorted list of absolute file paths with a matching extension
+    """
+    input_dir = os.path.abspath(input_dir)
+    suffixes = _suffixes(extensions or config.FITS_EXTENSIONS)
+    paths = []
+    for root, dirs, files in os.walk(input_dir):
+        if prune is not None:
+            kept = []
+            for dirname in dirs:
+                if prune.prunes(input_dir, os.path.join(root, dirname)):
+                    logger.debug(f"Pruned {os.path.join(root, dirname)}")
+                else:
+                    kept.append(dirname)
+            # os.walk only descends into the directories left in dirs
+            dirs[:] = kept
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(suffixes):
+                paths.append(os.path.join(root, filename))
+    return paths
+
+
+def read_frame_headers(path: str) -> Dict[str, Any]:
+    """
+    Read normalized headers for a single frame.
+
+    FITS and XISF files go through the minimal header readers, which never
+    read pixel data. Other formats, and files those readers cannot parse,
+    use ap-common.
+
+    Args:
+        path: Path to FITS or XISF file
+
+    Returns:
+        Normalized headers reduced to CACHED_KEYWORDS
+    """
+    lower_path = path.lower()
+    headers = None
+    try:
+        if lower_path.endswith(_suffixes(config.FITS_EXTENSIONS)):
+            headers = read_normalized_header(path)
+        elif lower_path.endswith(_suffixes(config.XISF_EXTENSIONS)):
+            headers = read_normalized_xisf_header(path)
+    except (FitsHeaderError, XisfHeaderError) as e:
+        logger.debug(f"Falling back to ap-common for {path}: {e}")
+    if headers is None:
+        headers = ap_common.get_file_headers(
+            path, profileFromPath=False, normalize=True
+        )
+    return select_keywords(headers)
+
+
+def select_keywords(headers: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep only the keywords discovery, grouping and matching need.
+
+    Args:
+        headers: Normalized FITS headers
+
+    Returns:
+        Dictionary with the CACHED_KEYWORDS present in headers
+    """
+    return {
+        keyword: headers[keyword]
+        for keyword in config.CACHED_KEYWORDS
+        if headers.get(keyword) is not None
+    }
+
+
+def _stat_file(path: str) -> Optional[os.stat_result]:
+    """Stat a file, returning None (and logging) if it cannot be accessed."""
+    try:
+        return os.stat(path)
+    except OSError as e:
+        logger.debug(f"Cannot stat {path}: {e}")
+        return None
+
+
+def _read_headers_or_none(path: str) -> Optional[Dict[str, Any]]:
+    """Read frame headers, returning None (and logging) if they are unreadable."""
+    try:
+        return read_frame_headers(path)
+    except Exception as e:
+        logger.debug(f"Cannot read headers from {path}: {e}")
+        return None
+
+
+@dataclass
+class _PendingFile:
+    """A file whose stat, index lookup and header read are in progress."""
+
+    path: str
+    stat_future: Future
+    checked: bool = False
+    stat: Optional[os.stat_result] = None
+    headers: Optional[Dict[str, Any]] = None
+    read_future: Optional[Future] = None
+
+
+def iter_file_headers(
+    paths: List[str],
+    header_index: Optional[HeaderIndex] = None,
+    quiet: bool = False,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream headers for a list of files as they are read.
+
+    Files whose size and mtime match an entry in header_index are served from
+    the index; everything else is opened and the index is updated (but not
+    committed). With more than one I/O worker, stats and header reads run on
+    a thread pool so network storage is not limited to one round trip at a
+    time; at most a few files per worker are in flight, counting both stats
+    and reads. Headers are always yielded in the order of paths.
+
+    Args:
+        paths: Files to read
+        header_index: Optional persistent header index
+        quiet: Suppress progress output
+        io_workers: Number of concurrent stat/header reads
+
+    Yields:
+        (path, normalized headers) tuples; unreadable files are skipped
+    """
+    tracker = ProgressTracker(
+        total=len(paths), desc="Loading metadata", unit="files", enabled=not quiet
+    )
+    tracker.start()
+
+    def cached(path: str, stat: os.stat_result) -> Optional[Dict[str, Any]]:
+        if header_index is None:
+            return None
+        return header_index.lookup(path, stat.st_size, stat.st_mtime_ns)
+
+    def store(path: str, stat: os.stat_result, headers: Dict[str, Any]) -> None:
+        # Index writes stay on this thread (SQLite connections are not shared)
+        if header_index is not None:
+            header_index.store(path, stat.st_size, stat.st_mtime_ns, headers)
+
+    if io_workers <= 1:
+        for path in paths:
+            tracker.update(n=1)
+            stat = _stat_file(path)
+            if stat is None:
+                continue
+            headers = cached(path, stat)
+            if headers is None:
+                headers = _read_headers_or_none(path)
+                if headers is None:
+                    continue
+                store(path, stat, headers)
+            yield path, headers
+        tracker.finish()
+        return
+
+    executor = ThreadPoolExecutor(max_workers=io_workers)
+    max_in_flight = io_workers * READS_IN_FLIGHT_PER_WORKER
+    pending: Deque[_PendingFile] = deque()
+
+    def check(entry: _PendingFile) -> None:
+        """Look up a stat'ed file in the index, or start reading it."""
+        entry.checked = True
+        entry.stat = entry.stat_future.result()
+        if entry.stat is None:
+            return
+        entry.headers = cached(entry.path, entry.stat)
+        if entry.headers is None:
+            entry.read_future = executor.submit(_read_headers_or_none, entry.path)
+
+    def advance() -> None:
+        """Check every file whose stat has finished."""
+        for entry in pending:
+            if not entry.checked and entry.stat_future.done():
+                check(entry)
+
+    def ready(entry: _PendingFile) -> bool:
+        return entry.checked and (entry.read_future is None or entry.read_future.done())
+
+    def resolve() -> Optional[Tuple[str, Dict[str, Any]]]:
+        entry = pending.popleft()
+        tracker.update(n=1)
+        if not entry.checked:
+            check(entry)
+        if entry.stat is None:
+            return None
+        if entry.read_future is None:
+            return entry.path, entry.headers or {}
+        headers = entry.read_future.result()
+        if headers is None:
+            return None
+        store(entry.path, entry.stat, headers)
+        return entry.path, headers
+
+    try:
+        for path in paths:
+            # Make room in the window before starting another stat
+            while len(pending) >= max_in_flight:
+                result = resolve()
+                if result is not None:
+                    yield result
+                advance()
+
+            pending.append(_PendingFile(path, executor.submit(_stat_file, path)))
+            advance()
+
+            # Yield in order as soon as the oldest entry is ready
+            while pending and ready(pending[0]):
+                result = resolve()
+                if result is not None:
+                    yield result
+                advance()
+
+        while pending:
+            result = resolve()
+            if result is not None:
+                yield result
+            advance()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    tracker.finish()
+
+
+def iter_headers(
+    input_dir: str,
+    header_index: Optional[HeaderIndex] = None,
+    quiet: bool = False,
+    extensions: Optional[List[str]] = None,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    prune: Optional[PruneRules] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream headers for every FITS file under input_dir as they are read.
+
+    See iter_file_headers for caching and concurrency behaviour. Headers are
+    yielded in sorted path order, and once the walk completes the index
+    forgets files that are no longer present and is committed.
+
+    Args:
+        input_dir: Directory to scan recursively
+        header_index: Optional persistent header index
+        quiet: Suppress progress output
+        extensions: File extensions to include (default: FITS_EXTENSIONS)
+        io_workers: Number of concurrent stat/header reads
+        prune: Optional rules for subtrees to skip
+
+    Yields:
+        (path, normalized headers) tuples; unreadable files are skipped
+    """
+    input_dir = os.path.abspath(input_dir)
+    paths = list_fits_files(input_dir, extensions, prune=prune)
+
+    yield from iter_file_headers(
+        paths, header_index=header_index, quiet=quiet, io_workers=io_workers
+    )
+
+    if header_index is not None:
+        # Drop entries for files that were removed or are now pruned
+        seen = set(paths)
+        removed = [p for p in header_index.paths_under(input_dir) if p not in seen]
+        header_index.forget(removed)
+        header_index.commit()
+        logger.debug(
+            f"Header index: {header_index.hits} cached, "
+            f"{header_index.misses} read, {len(removed)} removed"
+        )
+
+
+def iter_path_headers(
+    input_dir: str,
+    header_index: Optional[HeaderIndex] = None,
+    quiet: bool = False,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    prune: Optional[PruneRules] = None,
+    sample_size: int = config.DEFAULT_PATH_SAMPLE_SIZE,
+    stats: Optional[PathDiscoveryStats] = None,
+    rng: Optional[random.Random] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream headers built from folder and file names, verified by sampling.
+
+    Frames are grouped by the keywords parsed from their paths. For each
+    group whose paths supply every keyword its frame type is grouped by (see
+    path_keywords_complete), sample_size random frames are read; if their
+    headers agree with the path and with each other, the other frames get
+    the keywords from their paths without being opened. Otherwise every
+    header in the group is read. Discovery then costs roughly one open per
+    group instead of one per file.
+
+    Args:
+        input_dir: Directory to scan recursively
+        header_index: Optional persistent header index
+        quiet: Suppress progress output
+        io_workers: Number of concurrent stat/header reads
+        prune: Optional rules for subtrees to skip
+        sample_size: Headers read per path group to verify it
+        stats: Optional counters filled in with what was verified
+        rng: Random source for sampling (default: a new unseeded Random)
+
+    Yields:
+        (path, normalized headers) tuples in sorted path order; unreadable
+        files are skipped
+    """
+    input_dir = os.path.abspath(input_dir)
+    paths = list_fits_files(input_dir, prune=prune)
+    stats = stats if stats is not None else PathDiscoveryStats()
+    rng = rng or random.Random()
+
+    groups: Dict[Tuple, List[str]] = {}
+    for path in paths:
+        keywords = parse_path_keywords(path, input_dir)
+        groups.setdefault(tuple(sorted(keywords.items())), []).append(path)
+    stats.files = len(paths)
+    stats.groups = len(groups)
+
+    samples: Dict[Tuple, List[str]] = {}
+    for group, group_paths in groups.items():
+        if path_keywords_complete(dict(group)):
+            samples[group] = rng.sample(group_paths, min(sample_size, len(group_paths)))
+        else:
+            samples[group] = []
+    sample_paths = sorted(p for sample in samples.values() for p in sample)
+    read = dict(
+        iter_file_headers(
+            sample_paths, header_index=header_index, quiet=quiet, io_workers=io_workers
+        )
+    )
+    stats.sampled = len(sample_paths)
+
+    resolved: Dict[str, Dict[str, Any]] = {}
+    fallback_paths: List[str] = []
+    for group, group_paths in groups.items():
+        path_headers = verify_samples(
+            dict(group), [read.get(path) for path in samples[group]]
+        )
+        if path_headers is None:
+            stats.fallback_groups += 1
+            fallback_paths.extend(p for p in group_paths if p not in read)
+        else:
+            resolved.update(
+                (path, dict(path_headers)) for path in group_paths if path not in read
+            )
+        resolved.update((p, read[p]) for p in group_paths if p in read)
+
+    stats.fallback_files = len(fallback_paths)
+    resolved.update(
+        iter_file_headers(
+            sorted(fallback_paths),
+            header_index=header_index,
+            quiet=quiet,
+            io_workers=io_workers,
+        )
+    )
+    if header_index is not None:
+        header_index.commit()
+
+    logger.info(
+        f"Path metadata: {stats.groups} group(s), read {stats.headers_read} of "
+        f"{stats.files} header(s), {stats.fallback_groups} group(s) fell back "
+        f"to headers"
+    )
+
+    for path in paths:
+        if path in resolved:
+            yield path, resolved[path]
+
+
+def scan_headers(
+    input_dir: str,
+    header_index: Optional[HeaderIndex] = None,
+    quiet: bool = False,
+    extensions: Optional[List[str]] = None,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    prune: Optional[PruneRules] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Read headers for every FITS file under input_dir.
+
+    Collects iter_headers into a dictionary; see iter_headers for caching
+    and concurrency behaviour.
+
+    Args:
+        input_dir: Directory to scan recursively
+        header_index: Optional persistent header index
+        quiet: Suppress progress output
+        extensions: File extensions to include (default: FITS_EXTENSIONS)
+        io_workers: Number of concurrent stat/header reads
+        prune: Optional rules for subtrees to skip
+
+    Returns:
+        Dictionary mapping file path to normalized headers, in path order
+    """
+    return dict(
+        iter_headers(
+            input_dir,
+            header_index=header_index,
+            quiet=quiet,
+            extensions=extensions,
+            io_workers=io_workers,
+            prune=prune,
+        )
+    )
+
+
+def classify_frame(headers: Dict) -> str:
+    """
+    Determine which discovery bucket a frame belongs to.
+
+    A frame is only classified as bias, dark or flat when every keyword in
+    REQUIRED_KEYWORDS for that type is present.
+
+    Args:
+        headers: Normalized FITS headers for the frame
+
+    Returns:
+        "bias", "dark", "flat", or IGNORED
+    """
+    frame_type = str(headers.get(config.NORMALIZED_HEADER_TYPE) or "").strip()
+    frame_type = frame_type.lower()
+
+    if frame_type not in config.REQUIRED_KEYWORDS:
+        return IGNORED
+
+    for keyword in config.REQUIRED_KEYWORDS[frame_type]:
+        if headers.get(keyword) is None:
+            logger.debug(f"Ignoring {frame_type} frame missing {keyword}")
+            return IGNORED
+
+    return frame_type
+
+
+def iter_frames(
+    input_dir: str,
+    header_index: Optional[HeaderIndex] = None,
+    quiet: bool = False,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    prune: Optional[PruneRules] = None,
+    path_sample: Optional[int] = None,
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Stream classified frames from a single pass over the input directory.
+
+    Frames are yielded as their headers arrive, so callers can group them
+    without first collecting every header.
+
+    Args:
+        input_dir: Directory to scan recursively for FITS files
+        header_index: Optional persistent header index
+        quiet: Suppress progress output
+        io_workers: Number of concurrent header reads
+        prune: Optional rules for subtrees to skip
+        path_sample: If set, build metadata from folder and file names and
+            read this many headers per path group to verify it (see
+            iter_path_headers); otherwise read every header
+
+    Yields:
+        (bucket, file info) tuples, where bucket is "bias", "dark", "flat"
+        or IGNORED and file info is a dict with "path" and "headers" keys
+    """
+    if path_sample is not None:
+        headers_stream = iter_path_headers(
+            input_dir,
+            header_index=header_index,
+            quiet=quiet,
+            io_workers=io_workers,
+            prune=prune,
+            sample_size=path_sample,
+        )
+    else:
+        headers_stream = iter_headers(
+            input_dir,
+            header_index=header_index,
+            quiet=quiet,
+            io_workers=io_workers,
+            prune=prune,
+        )
+    for path, headers in headers_stream:
+        yield classify_frame(headers), {"path": path, "headers": headers}
+
+
+def discover_frames(
+    input_dir: str,
+    header_index: Optional[HeaderIndex] = None,
+    quiet: bool = False,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    prune: Optional[PruneRules] = None,
+) -> Dict[str, List[Dict]]:
+    """
+    Discover calibration frames with a single pass over the input directory.
+
+    Args:
+        input_dir: Directory to scan recursively for FITS files
+        header_index: Optional persistent header index
+        quiet: Suppress progress output
+        io_workers: Number of concurrent header reads
+        prune: Optional rules for subtrees to skip
+
+    Returns:
+        Dictionary mapping "bias", "dark", "flat" and IGNORED to lists of
+        file info dicts with "path" and "headers" keys
+    """
+    buckets: Dict[str, List[Dict]] = {
+        frame_type: [] for frame_type in config.FRAME_TYPES
+    }
+    buckets[IGNORED] = []
+
+    for bucket, file_info in iter_frames(
+        input_dir,
+        header_index=header_index,
+        quiet=quiet,
+        io_workers=io_workers,
+        prune=prune,
+    ):
+        buckets[bucket].append(file_info)
+
+    return buckets
@@ -0,0 +1,188 @@
+"""
+Minimal FITS primary header reader.
+
+Discovery only needs a handful of keywords, so this reader pulls whole
+2880-byte header blocks until the END card and never seeks into the data
+unit. Raw cards are normalized with ap-common so the result matches what
+ap_common.get_file_headers returns.
+"""
+
+from typing import Any, Dict, Optional, Union
+
+import ap_common
+
+from . import config
+
+FITS_BLOCK_SIZE = 2880
+FITS_CARD_SIZE = 80
+
+# Cards without a value indicator that carry no keyword data
+COMMENTARY_KEYWORDS = {"", "COMMENT", "HISTORY"}
+
+
+class FitsHeaderError(ValueError):
+    """Raised when a file does not start with a readable FITS primary header."""
+
+
+def read_primary_header(path: str) -> Dict[str, Any]:
+    """
+    Read the raw primary header of a FITS file.
+
+    Only header blocks are read; the file is closed as soon as the END card
+    is found, so pixel data is never touched.
+
+    Args:
+        path: Path to FITS file
+
+    Returns:
+        Dictionary mapping raw keyword names to parsed values
+
+    Raises:
+        FitsHeaderError: If the file is not FITS or the header has no END card
+    """
+    headers: Dict[str, Any] = {}
+    last_keyword: Optional[str] = None
+
+    with open(path, "rb") as f:
+        first_block = True
+        while True:
+            block = f.read(FITS_BLOCK_SIZE)
+            if len(block) < FITS_BLOCK_SIZE:
+                raise FitsHeaderError(f"No END card in FITS header: {path}")
+            if first_block and not block.startswith(b"SIMPLE  ="):
+                raise FitsHeaderError(f"Not a FITS file: {path}")
+            first_block = False
+
+            for offset in range(0, FITS_BLOCK_SIZE, FITS_CARD_SIZE):
+                card = block[offset : offset + FITS_CARD_SIZE].decode(
+                    "ascii", errors="replace"
+                )
+                keyword = card[:8].rstrip()
+
+                if keyword == "END":
+                    return headers
+
+                if keyword == "CONTINUE" and last_keyword is not None:
+                    _continue_string(headers, last_keyword, card[8:])
+                    continue
+
+                if keyword == "HIERARCH" and "=" in card:
+                    name, _, value = card[9:].partition("=")
+                    keyword = name.strip()
+                elif keyword in COMMENTARY_KEYWORDS or card[8:10] != "= ":
+                    last_keyword = None
+                    continue
+                else:
+                    value = card[10:]
+
+                # First occurrence wins, as with astropy's Header lookup
+                if keyword in headers:
+                    last_keyword = None
+                    continue
+                headers[keyword] = parse_value(value)
+                last_keyword = keyword
+
+
+def read_normalized_header(path: str) -> Dict[str, Any]:
+    """
+    Read the primary header of a FITS file and normalize it with ap-common.
+
+    Args:
+        path: Path to FITS file
+
+    Returns:
+        Dictionary of normalized headers
+
+    Raises:
+        FitsHeaderError: If the file is not FITS or the header has no END card
+    """
+    raw = read_primary_header(path)
+    return {**ap_common.normalize_headers(raw), **frame_size_headers(raw)}
+
+
+def frame_size_headers(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pick the image size keywords out of raw headers.
+
+    The header readers keep these under the names in FRAME_SIZE_KEYWORDS
+    rather than relying on ap-common to normalize them.
+
+    Args:
+        raw: Raw keyword names mapped to values
+
+    Returns:
+        Dictionary of the image size keywords present in raw
+    """
+    return {
+        name: raw[keyword]
+        for keyword, name in config.FRAME_SIZE_KEYWORDS.items()
+        if raw.get(keyword) is not None
+    }
+
+
+def parse_value(value: str) -> Union[str, bool, int, float, None]:
+    """
+    Parse the value field of a FITS card (everything after "= ").
+
+    Args:
+        value: Card text following the value indicator
+
+    Returns:
+        str for quoted strings (trailing spaces removed), bool for T/F,
+        int or float for numbers, None for an undefined value. Anything
+        else is returned as the stripped raw text.
+    """
+    text = value.lstrip()
+    if text.startswith("'"):
+        return parse_string(text)
+
+    text = text.split("/", 1)[0].strip()
+    if not text:
+        return None
+    if text == "T":
+        return True
+    if text == "F":
+        return False
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text.replace("D", "E"))
+    except ValueError:
+        return text
+
+
+def parse_string(text: str) -> str:
+    """
+    Parse a quoted FITS string, where '' is an escaped quote.
+
+    Args:
+        text: Text starting with the opening quote
+
+    Returns:
+        String contents with trailing spaces removed
+    """
+    chars = []
+    index = 1
+    while index < len(text):
+        char = text[index]
+        if char == "'":
+            if text[index + 1 : index + 2] == "'":
+                chars.append("'")
+                index += 2
+                continue
+            break
+        chars.append(char)
+        index += 1
+    return "".join(chars).rstrip()
+
+
+def _continue_string(headers: Dict[str, Any], keyword: str, value: str) -> None:
+    """Append a CONTINUE card to a long string value ending in '&'."""
+    current = headers.get(keyword)
+    if not isinstance(current, str) or not current.endswith("&"):
+        return
+    continued = value.lstrip()
+    if continued.startswith("'"):
+        headers[keyword] = current[:-1] + parse_string(continued)
@@ -4,7 +4,9 @@ Generated By: Cursor (Claude Sonnet 4.5)
 Group calibration frames by required FITS keywords.
 """
 
-from typing import Dict, List, Tuple
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from . import config
 
@@ -41,29 +43,168 @@ def create_group_key(headers: Dict, frame_type: str) -> Tuple:
     return tuple(key_values)
 
 
-def group_files(files: List[Dict], frame_type: str) -> Dict[Tuple, List[Dict]]:
+def frame_bytes(headers: Dict) -> Optional[int]:
     """
-    Group files by required keywords.
+    Estimate the memory ImageIntegration holds for one frame.
+
+    The size is NAXIS1 x NAXIS2 x NAXIS3 samples (NAXIS3 defaults to 1) of
+    |BITPIX| / 8 bytes, but at least MIN_INTEGRATION_SAMPLE_BYTES per sample
+    since frames are integrated as floating point.
 
     Args:
-        files: List of file info dicts with "path" and "headers" keys
-        frame_type: Frame type ("bias", "dark", or "flat")
+        headers: Normalized headers with the FRAME_SIZE_KEYWORDS names
 
     Returns:
-        Dictionary mapping group keys (tuples) to lists of file info dicts
+        Estimated bytes, or None if the image size is missing or invalid
+    """
+    names = config.FRAME_SIZE_KEYWORDS
+    try:
+        width = int(headers[names["NAXIS1"]])
+        height = int(headers[names["NAXIS2"]])
+        channels = int(headers.get(names["NAXIS3"]) or 1)
+        sample_bytes = abs(int(headers[names["BITPIX"]])) // 8
+    except (KeyError, ValueError, TypeError):
+        return None
+    if min(width, height, channels, sample_bytes) <= 0:
+        return None
+    sample_bytes = max(sample_bytes, config.MIN_INTEGRATION_SAMPLE_BYTES)
+    return width * height * channels * sample_bytes
+
+
+@dataclass(slots=True)
+class FrameRecord:
     """
-    groups: Dict[Tuple, List[Dict]] = {}
+    Compact record of a discovered frame.
 
-    for file_info in files:
-        headers = file_info["headers"]
-        group_key = create_group_key(headers, frame_type)
+    Holds only what grouping, master matching and scheduling use: the path,
+    the group key, the parsed exposure time and the estimated frame size.
+    Key values are interned, so frames in the same group share their
+    strings, and the full header dict can be dropped as soon as the record
+    is built.
+
+    Attributes:
+        path: Path to the frame
+        frame_type: Frame type ("bias", "dark", or "flat")
+        key: Group key (see create_group_key)
+        exposure: Exposure time in seconds, or None if missing or invalid
+        frame_bytes: Estimated integration memory (see frame_bytes), or None
+            if the image size is unknown
+    """
+
+    path: str
+    frame_type: str
+    key: Tuple[str, ...]
+    exposure: Optional[float] = None
+    frame_bytes: Optional[int] = None
+
+    @classmethod
+    def from_headers(cls, path: str, headers: Dict, frame_type: str) -> "FrameRecord":
+        """
+        Build a record from a frame's normalized headers.
+
+        Args:
+            path: Path to the frame
+            headers: FITS headers dict (already normalized by ap-common)
+            frame_type: Frame type ("bias", "dark", or "flat")
+
+        Returns:
+            FrameRecord for the frame
+
+        Raises:
+            ValueError: If frame_type is unknown
+        """
+        key = tuple(
+            sys.intern(value) for value in create_group_key(headers, frame_type)
+        )
+        exposure = headers.get(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+        try:
+            exposure = float(exposure) if exposure is not None else None
+        except (ValueError, TypeError):
+            exposure = None
+        return cls(path, frame_type, key, exposure, frame_bytes(headers))
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Normalized headers for the required keywords of this frame type."""
+        return dict(zip(config.REQUIRED_KEYWORDS[self.frame_type], self.key))
+
+
+class FrameGrouper:
+    """
+    Group frames incrementally as discovery streams them.
+
+    Frames are added one at a time, so grouping runs while headers are still
+    being read and no per-type file lists are built first. Group order is
+    the order in which each group's first frame arrived.
+    """
+
+    def __init__(self) -> None:
+        self._groups: Dict[str, Dict[Tuple, List[FrameRecord]]] = {
+            frame_type: {} for frame_type in config.REQUIRED_KEYWORDS
+        }
+
+    def add(self, frame: FrameRecord) -> Tuple:
+        """
+        Add a frame to its group.
+
+        Args:
+            frame: Frame record to add
 
-        if group_key not in groups:
-            groups[group_key] = []
+        Returns:
+            Group key the frame was added to
+        """
+        self._groups[frame.frame_type].setdefault(frame.key, []).append(frame)
+        return frame.key
 
-        groups[group_key].append(file_info)
+    def add_headers(self, path: str, headers: Dict, frame_type: str) -> None:
+        """
+        Add a frame from its normalized headers.
 
-    return groups
+        Args:
+            path: Path to the frame
+            headers: FITS headers dict (already normalized by ap-common)
+            frame_type: Frame type ("bias", "dark", or "flat")
+
+        Raises:
+            ValueError: If frame_type is unknown
+        """
+        self.add(FrameRecord.from_headers(path, headers, frame_type))
+
+    def groups(self, frame_type: str) -> Dict[Tuple, List[FrameRecord]]:
+        """
+        Get the groups collected so far for a frame type.
+
+        Args:
+            frame_type: Frame type ("bias", "dark", or "flat")
+
+        Returns:
+            Dictionary mapping group keys (tuples) to lists of frame records
+        """
+        return self._groups.get(frame_type, {})
+
+
+def group_files(
+    files: Iterable[Dict], frame_type: str
+) -> Dict[Tuple, List[FrameRecord]]:
+    """
+    Group files by required keywords.
+
+    Args:
+        files: File info dicts with "path" and "headers" keys (any iterable,
+            including a discovery stream)
+        frame_type: Frame type ("bias", "dark", or "flat")
+
+    Returns:
+        Dictionary mapping group keys (tuples) to lists of frame records
+    """
+    grouper = FrameGrouper()
+    for file_info in files:
+        grouper.add(
+            FrameRecord.from_headers(
+                file_info["path"], file_info["headers"], frame_type
+            )
+        )
+    return grouper.groups(frame_type)
 
 
 def get_group_metadata(headers: Dict, frame_type: str) -> Dict[str, str]:
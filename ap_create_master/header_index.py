@@ -0,0 +1,169 @@
+"""
+Persistent index of normalized FITS headers for input directories.
+
+Raw frames never change after capture, so the normalized keywords needed
+for grouping are stored in SQLite keyed by path, size and mtime. Later runs
+only open files that are new or whose size/mtime changed. The same format
+backs the master library catalog used for flat calibration matching.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+HEADER_INDEX_FILENAME = "header_index.sqlite"
+MASTER_CATALOG_FILENAME = "master_catalog.sqlite"
+
+
+class HeaderIndex:
+    """SQLite-backed cache of normalized headers keyed by (path, size, mtime)."""
+
+    def __init__(self, db_path: str, read_only: bool = False) -> None:
+        """
+        Open (or create) the header index.
+
+        Args:
+            db_path: Path to the SQLite database file
+            read_only: Open an existing index without ever writing to it
+                (for dry runs); store and forget then do nothing
+        """
+        self.db_path = Path(db_path)
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._stale = False
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True
+            )
+            self._check_keywords()
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS headers ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " headers TEXT NOT NULL)"
+        )
+        self._check_keywords()
+
+    def _check_keywords(self) -> None:
+        """Drop cached rows if the set of cached keywords has changed."""
+        signature = json.dumps(config.CACHED_KEYWORDS)
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'keywords'"
+        ).fetchone()
+        if row is not None and row[0] == signature:
+            return
+        if self.read_only:
+            # Rows cached for other keywords cannot be cleared; ignore them
+            self._stale = True
+            return
+        if row is not None:
+            logger.debug("Cached keywords changed, clearing header index")
+        self._conn.execute("DELETE FROM headers")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('keywords', ?)",
+            (signature,),
+        )
+        self._conn.commit()
+
+    def lookup(self, path: str, size: int, mtime_ns: int) -> Optional[Dict[str, Any]]:
+        """
+        Get cached headers for a file if its size and mtime are unchanged.
+
+        Args:
+            path: File path
+            size: Current file size in bytes
+            mtime_ns: Current modification time in nanoseconds
+
+        Returns:
+            Cached headers dict, or None if missing or stale
+        """
+        row = None
+        if not self._stale:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, headers FROM headers WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[2])
+
+    def store(
+        self, path: str, size: int, mtime_ns: int, headers: Dict[str, Any]
+    ) -> None:
+        """
+        Store headers for a file.
+
+        Args:
+            path: File path
+            size: File size in bytes
+            mtime_ns: Modification time in nanoseconds
+            headers: Normalized headers (only CACHED_KEYWORDS are kept)
+        """
+        if self.read_only:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO headers (path, size, mtime_ns, headers)"
+            " VALUES (?, ?, ?, ?)",
+            (path, size, mtime_ns, json.dumps(headers, default=str)),
+        )
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """
+        Remove entries for files that no longer exist.
+
+        Args:
+            paths: File paths to remove from the index
+        """
+        if self.read_only:
+            return
+        self._conn.executemany(
+            "DELETE FROM headers WHERE path = ?", ((p,) for p in paths)
+        )
+
+    def paths_under(self, directory: str) -> Iterable[str]:
+        """
+        List indexed paths under a directory.
+
+        Args:
+            directory: Directory prefix
+
+        Returns:
+            Iterable of indexed file paths below directory
+        """
+        prefix = os.path.join(str(Path(directory)), "")
+        rows = self._conn.execute(
+            "SELECT path FROM headers WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+        return [row[0] for row in rows]
+
+    def commit(self) -> None:
+        """Persist pending changes."""
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Commit pending changes and close the database."""
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self) -> "HeaderIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -4,7 +4,12 @@ Generated By: Cursor (Claude Sonnet 4.5)
 Find matching bias/dark masters for flat calibration.
 """
 
+import bisect
 import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
 import ap_common
 from ap_common.constants import (
     DEFAULT_CALIBRATION_PATTERNS,
@@ -13,19 +18,426 @@ from ap_common.constants import (
     TYPE_MASTER_FLAT,
 )
 from ap_common.metadata import build_normalized_filters
-from pathlib import Path
-from typing import Any, Dict, List, Optional, TypedDict
 
 from . import config
+from .discovery import scan_headers
+from .header_index import HeaderIndex
 
 logger = logging.getLogger(__name__)
 
 
-class DarkCandidate(TypedDict):
-    """Type definition for dark candidate dictionary."""
+MASTER_TYPE_CONSTANTS = {
+    "bias": TYPE_MASTER_BIAS,
+    "dark": TYPE_MASTER_DARK,
+    "flat": TYPE_MASTER_FLAT,
+}
+
+
+def create_match_key(headers: Dict) -> Tuple:
+    """
+    Create the instrument-settings key used to match masters to flats.
+
+    Values are normalized the same way ap-common normalizes filter values,
+    so flat headers and master metadata produce comparable keys.
+
+    Args:
+        headers: Normalized headers from a flat frame or master
+
+    Returns:
+        Tuple of values in MASTER_MATCH_KEYWORDS order
+    """
+    normalized = build_normalized_filters(headers, config.MASTER_MATCH_KEYWORDS)
+    key_values = []
+    for keyword in config.MASTER_MATCH_KEYWORDS:
+        value = normalized.get(keyword)
+        key_values.append("" if value is None else str(value).strip().lower())
+    return tuple(key_values)
+
+
+def _parse_exposure(value: Any) -> Optional[float]:
+    """Parse an exposure value, returning None if missing or invalid."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _scan_master_files(
+    master_dir: str,
+    catalog: Optional[HeaderIndex],
+    master_type_constant: str,
+    required_properties: List[str],
+    io_workers: int,
+) -> Dict[str, Dict]:
+    """
+    Read master headers file by file and select masters of one type.
+
+    Args:
+        master_dir: Directory containing master files
+        catalog: Optional persistent catalog of master headers (refreshed)
+        master_type_constant: TYPE value to select (e.g. "MASTER DARK")
+        required_properties: Keywords every selected master must have
+        io_workers: Number of concurrent header reads
+
+    Returns:
+        Dict mapping master path to normalized metadata
+    """
+    headers_by_path = scan_headers(
+        master_dir,
+        header_index=catalog,
+        quiet=True,
+        extensions=config.MASTER_EXTENSIONS,
+        io_workers=io_workers,
+    )
+
+    masters = {}
+    for path, headers in headers_by_path.items():
+        frame_type = str(headers.get(config.NORMALIZED_HEADER_TYPE) or "").strip()
+        if frame_type.upper() != master_type_constant.upper():
+            continue
+        if any(headers.get(keyword) is None for keyword in required_properties):
+            continue
+        masters[path] = headers
+    return masters
+
+
+class DarkIndex:
+    """
+    Dark masters for one set of instrument settings, sorted by exposure.
+
+    Only the first dark (in library order) of each distinct exposure is kept,
+    since ties always resolve to it. Selection follows one rule: the largest
+    exposure <= the target, else the nearest exposure above it.
+    """
+
+    __slots__ = ("exposures", "paths")
+
+    def __init__(self, candidates: Sequence[Tuple[float, str]]) -> None:
+        """
+        Build the index.
+
+        Args:
+            candidates: (exposure, path) pairs in library order
+        """
+        self.exposures: List[float] = []
+        self.paths: List[str] = []
+        # Stable sort keeps library order for equal exposures
+        for exposure, path in sorted(candidates, key=lambda c: c[0]):
+            if self.exposures and self.exposures[-1] == exposure:
+                continue
+            self.exposures.append(exposure)
+            self.paths.append(path)
+
+    def __len__(self) -> int:
+        return len(self.exposures)
+
+    def select(self, target: float) -> str:
+        """
+        Select the dark for a target exposure.
+
+        Args:
+            target: Flat exposure time in seconds
+
+        Returns:
+            Path to the selected dark master
+        """
+        index = bisect.bisect_right(self.exposures, target) - 1
+        return self.paths[max(index, 0)]
+
+    def select_many(self, targets: Sequence[float]) -> List[str]:
+        """
+        Select darks for many target exposures in one sweep.
+
+        The targets are visited in sorted order while a single cursor moves
+        forward through the sorted exposures.
+
+        Args:
+            targets: Flat exposure times in seconds
+
+        Returns:
+            Path to the selected dark for each target, in target order
+        """
+        selected: List[str] = [""] * len(targets)
+        exposures = self.exposures
+        cursor = 0
+        for position in sorted(range(len(targets)), key=targets.__getitem__):
+            target = targets[position]
+            while cursor + 1 < len(exposures) and exposures[cursor + 1] <= target:
+                cursor += 1
+            selected[position] = self.paths[cursor]
+        return selected
+
+
+class MasterLibrary:
+    """
+    In-memory index of a master library built from a single directory scan.
+
+    Masters are keyed by their MASTER_MATCH_KEYWORDS values. For darks, each
+    key has a DarkIndex so every lookup is a binary search.
+
+    Lookups are memoized by the flat's raw MASTER_MATCH_KEYWORDS values for the
+    life of the library, so flat groups with identical instrument settings
+    skip key normalization and reuse the resolved bias answer and dark
+    candidate list.
+
+    Attributes:
+        hits: Lookups answered from the memo
+        misses: Lookups that normalized a new set of instrument settings
+    """
+
+    def __init__(self, master_type: str, masters: Dict[str, Dict]) -> None:
+        """
+        Build the index.
+
+        Args:
+            master_type: "bias", "dark" or "flat"
+            masters: Dict mapping master path to normalized metadata
+        """
+        self.master_type = master_type
+        self._first_match: Dict[Tuple, str] = {}
+        self._darks: Dict[Tuple, DarkIndex] = {}
+        self._memo: Dict[Tuple, Tuple[Tuple, Optional[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+        candidates: Dict[Tuple, List[Tuple[float, str]]] = {}
+        for path, metadata in masters.items():
+            key = create_match_key(metadata)
+            self._first_match.setdefault(key, path)
+            exposure = _parse_exposure(
+                metadata.get(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+            )
+            if exposure is not None:
+                candidates.setdefault(key, []).append((exposure, path))
+
+        for key, key_candidates in candidates.items():
+            self._darks[key] = DarkIndex(key_candidates)
+
+        self.size = len(masters)
+
+    @classmethod
+    def scan(
+        cls,
+        master_dir: str,
+        master_type: str,
+        catalog: Optional[HeaderIndex] = None,
+        io_workers: int = config.DEFAULT_IO_WORKERS,
+        run_masters: Optional[Dict[str, Dict]] = None,
+    ) -> "MasterLibrary":
+        """
+        Scan a master directory once and index every master of a type.
+
+        With a catalog, only new or changed master files are opened; headers
+        for unchanged files come from the catalog. With a catalog or more than
+        one I/O worker, master headers are read file by file (concurrently
+        when io_workers > 1) instead of through ap-common's directory scan.
+
+        Args:
+            master_dir: Directory containing master files
+            master_type: "bias", "dark" or "flat"
+            catalog: Optional persistent catalog of master headers
+            io_workers: Number of concurrent header reads
+            run_masters: Masters created by the current run, mapping path to
+                group metadata. They are indexed ahead of the directory's
+                masters, so they win ties.
+
+        Returns:
+            MasterLibrary (with only run_masters if the directory is missing
+            or unreadable)
+        """
+        logger.debug(f"Indexing {master_type} masters in: {master_dir}")
+        masters = dict(run_masters or {})
+
+        master_path = Path(master_dir)
+        if not master_path.exists():
+            logger.debug(f"Master directory does not exist: {master_dir}")
+            return cls(master_type, masters)
+
+        # TYPE format: "MASTER BIAS", "MASTER DARK"
+        # These are written by ap-create-master after PixInsight generates masters
+        master_type_constant = MASTER_TYPE_CONSTANTS[master_type]
+
+        # TYPE + instrument settings + EXPOSURESECONDS for darks
+        required_properties = [config.NORMALIZED_HEADER_TYPE] + list(
+            config.MASTER_MATCH_KEYWORDS
+        )
+        if master_type == "dark":
+            required_properties.append(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+
+        try:
+            if catalog is not None or io_workers > 1:
+                scanned = _scan_master_files(
+                    str(master_path),
+                    catalog,
+                    master_type_constant,
+                    required_properties,
+                    io_workers,
+                )
+            else:
+                scanned = ap_common.get_filtered_metadata(
+                    dirs=[str(master_path)],
+                    filters={config.NORMALIZED_HEADER_TYPE: master_type_constant},
+                    profileFromPath=False,
+                    patterns=DEFAULT_CALIBRATION_PATTERNS,
+                    recursive=True,
+                    required_properties=required_properties,
+                    debug=False,
+                    printStatus=False,
+                )
+        except Exception as e:
+            # If ap-common can't process the directory, only run masters remain
+            logger.debug(f"Error scanning directory: {e}")
+            return cls(master_type, masters)
+
+        logger.debug(f"Indexed {len(scanned)} {master_type} master(s)")
+        # A run master rebuilds any library file at the same path
+        for path, metadata in scanned.items():
+            masters.setdefault(path, metadata)
+        return cls(master_type, masters)
+
+    def find(
+        self,
+        flat_headers: Dict,
+        flat_exposure_times: Optional[List[float]] = None,
+    ) -> Optional[str]:
+        """
+        Find the matching master for a flat group.
+
+        For bias: Returns the first master with matching instrument settings.
+        For dark: Selects the dark with the largest exposure <= the flat's
+        exposure, else the nearest exposure above it.
+
+        Args:
+            flat_headers: Headers from a representative flat of the group
+            flat_exposure_times: Exposure times for all flats in the group
+                (for dark matching). If None, uses EXPOSURE from flat_headers
+
+        Returns:
+            Path to matching master file, or None if not found
+        """
+        key, first_match = self.lookup(flat_headers)
+        if first_match is None:
+            logger.debug(f"No matching {self.master_type} master found")
+            return None
+
+        if self.master_type == "bias":
+            return first_match
+
+        if self.master_type == "dark":
+            return self._find_best_dark(
+                key, first_match, flat_headers, flat_exposure_times
+            )
+
+        return None
+
+    def lookup(self, flat_headers: Dict) -> Tuple[Tuple, Optional[str]]:
+        """
+        Resolve a flat's match key and first matching master, memoized.
+
+        Args:
+            flat_headers: Headers from a representative flat of the group
 
-    path: str
-    exposure: float
+        Returns:
+            Tuple of (match key, first matching master path or None)
+        """
+        settings = tuple(
+            flat_headers.get(keyword) for keyword in config.MASTER_MATCH_KEYWORDS
+        )
+        cached = self._memo.get(settings)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        key = create_match_key(flat_headers)
+        result = (key, self._first_match.get(key))
+        self._memo[settings] = result
+        return result
+
+    def _find_best_dark(
+        self,
+        key: Tuple,
+        first_match: str,
+        flat_headers: Dict,
+        flat_exposure_times: Optional[List[float]],
+    ) -> str:
+        """
+        Select a dark for an instrument key by exposure time.
+
+        Prefers darks with exposure time less than or equal to the flat's exposure
+        time. If no such dark exists, uses the closest dark with higher exposure.
+
+        Returns:
+            Path to best matching dark master (first match if no exposure
+            information is available)
+        """
+        if flat_exposure_times:
+            # Use minimum exposure time from the group (prefer scaling up)
+            target_exposure = min(flat_exposure_times)
+            logger.debug(
+                f"Target exposure: {target_exposure}s "
+                f"(min of flat group: {flat_exposure_times})"
+            )
+        else:
+            header_exposure = _parse_exposure(
+                flat_headers.get(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+            )
+            if header_exposure is None:
+                # No usable exposure time, return first match
+                logger.debug("No usable exposure time in flat headers, first match")
+                return first_match
+            target_exposure = header_exposure
+            logger.debug(f"Target exposure: {target_exposure}s (from flat headers)")
+
+        darks = self._darks.get(key)
+        if not darks:
+            # No valid exposure times, return first match
+            logger.debug("No valid dark exposure times found, using first match")
+            return first_match
+
+        path = darks.select(target_exposure)
+        logger.debug(f"Using: {Path(path).name}")
+        return path
+
+    def dark_exposures(self, flat_headers: Dict) -> List[float]:
+        """
+        List the distinct dark exposures matching a flat's instrument settings.
+
+        Args:
+            flat_headers: Headers carrying the instrument settings
+
+        Returns:
+            Exposure times in seconds, ascending (empty if no dark with a
+            usable exposure matches)
+        """
+        key, _ = self.lookup(flat_headers)
+        darks = self._darks.get(key)
+        return list(darks.exposures) if darks else []
+
+    def find_darks(
+        self, flat_headers: Dict, target_exposures: Sequence[float]
+    ) -> List[Optional[str]]:
+        """
+        Find the matching dark for many exposures with the same settings.
+
+        Useful for sky flats, whose exposures vary widely within a night.
+
+        Args:
+            flat_headers: Headers carrying the instrument settings
+            target_exposures: Flat exposure times in seconds
+
+        Returns:
+            Path to the matching dark for each exposure, in input order (all
+            None if no dark matches the instrument settings)
+        """
+        key, first_match = self.lookup(flat_headers)
+        if first_match is None:
+            return [None] * len(target_exposures)
+        darks = self._darks.get(key)
+        if not darks:
+            return [first_match] * len(target_exposures)
+        return list(darks.select_many(target_exposures))
 
 
 def find_matching_master_for_flat(
@@ -33,6 +445,7 @@ def find_matching_master_for_flat(
     flat_headers: Dict,
     master_type: str,
     flat_exposure_times: Optional[List[float]] = None,
+    library: Optional[MasterLibrary] = None,
 ) -> Optional[str]:
     """
     Find a matching master file for flat calibration.
@@ -48,162 +461,178 @@ def find_matching_master_for_flat(
         flat_exposure_times: List of exposure times for all
             flats in the group (for dark matching)
                              If None, uses EXPOSURE/EXPTIME from flat_headers
+        library: Pre-built MasterLibrary for master_dir. Pass one to match many
+            flat groups against a single library scan.
 
     Returns:
         Path to matching master file, or None if not found
     """
     logger.debug(f"Searching for {master_type} master in: {master_dir}")
 
-    master_path = Path(master_dir)
-    if not master_path.exists():
-        logger.debug(f"Master directory does not exist: {master_dir}")
-        return None
+    if library is None:
+        library = MasterLibrary.scan(master_dir, master_type)
 
-    # Build filters dict: TYPE and all instrument settings
-    # TYPE format: "MASTER BIAS", "MASTER DARK"
-    # These are written by ap-create-master after PixInsight generates masters
-    master_type_constants = {
-        "bias": TYPE_MASTER_BIAS,
-        "dark": TYPE_MASTER_DARK,
-        "flat": TYPE_MASTER_FLAT,
-    }
-    type_value = master_type_constants[master_type]
-    filters = build_normalized_filters(
-        flat_headers,
-        config.MASTER_MATCH_KEYWORDS,
-        overrides={config.NORMALIZED_HEADER_TYPE: type_value},
-    )
+    return library.find(flat_headers, flat_exposure_times)
 
-    logger.debug(f"Filters: {filters}")
 
-    # Build required_properties list
-    # (TYPE + instrument settings + EXPOSURESECONDS for darks)
-    required_properties = [config.NORMALIZED_HEADER_TYPE] + list(
-        config.MASTER_MATCH_KEYWORDS
-    )
-    if master_type == "dark":
-        required_properties.append(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+@dataclass
+class MasterMatch:
+    """
+    Masters chosen for one flat group, with matching diagnostics.
+
+    Attributes:
+        bias: Path to the matching bias master, or None
+        dark: Path to the matching dark master, or None
+        match_key: Normalized instrument settings the group was matched on
+        bias_matched: True if a bias master had the group's instrument settings
+        dark_matched: True if a dark master had the group's instrument settings
+        target_exposure: Exposure darks were selected for (minimum of the
+            group), or None if the group had no usable exposure
+        dark_exposures: Distinct dark exposures considered for the group
+        bias_from_run: True if the bias master is created by the current run
+        dark_from_run: True if the dark master is created by the current run
+    """
 
-    # Get filtered metadata using ap-common
-    try:
-        matching_masters = ap_common.get_filtered_metadata(
-            dirs=[str(master_path)],
-            filters=filters,
-            profileFromPath=False,
-            patterns=DEFAULT_CALIBRATION_PATTERNS,
-            recursive=True,
-            required_properties=required_properties,
-            debug=False,
-            printStatus=False,
-        )
-    except Exception as e:
-        # If ap-common can't process the directory, we're done
-        logger.debug(f"Error scanning directory: {e}")
-        return None
+    bias: Optional[str] = None
+    dark: Optional[str] = None
+    match_key: Tuple = ()
+    bias_matched: bool = False
+    dark_matched: bool = False
+    target_exposure: Optional[float] = None
+    dark_exposures: List[float] = field(default_factory=list)
+    bias_from_run: bool = False
+    dark_from_run: bool = False
+
+
+def match_masters_for_groups(
+    groups: Mapping[Hashable, Tuple[Dict, Sequence[float]]],
+    bias_dir: Optional[str],
+    dark_dir: Optional[str],
+    catalog: Optional[HeaderIndex] = None,
+    io_workers: int = config.DEFAULT_IO_WORKERS,
+    run_masters: Optional[Mapping[str, Dict[str, Dict]]] = None,
+) -> Dict[Hashable, MasterMatch]:
+    """
+    Match bias and dark masters for every flat group in one library pass.
 
-    logger.debug(f"Found {len(matching_masters)} matching {master_type} master(s)")
+    Each library is scanned once. Groups are resolved by instrument settings,
+    and all dark targets sharing settings are selected in one sorted sweep,
+    using the same rules as find_matching_master_for_flat.
 
-    if not matching_masters:
-        logger.debug(f"No matching {master_type} master found")
-        return None
+    Masters the current run will create are candidates alongside each
+    library (or on their own when no library directory is given). They are
+    preferred over library masters with the same settings and, for darks,
+    the same exposure.
 
-    # For bias, return first match (all should be equivalent)
-    if master_type == "bias":
-        return next(iter(matching_masters.keys()))
+    Args:
+        groups: Mapping of group id to (representative flat headers, exposure
+            times of the group's flats)
+        bias_dir: Directory containing bias masters, or None to skip bias
+        dark_dir: Directory containing dark masters, or None to skip darks
+        catalog: Optional persistent catalog of master headers
+        io_workers: Number of concurrent header reads while scanning
+        run_masters: Masters created by the current run, mapping "bias" and
+            "dark" to {master path: group metadata}
 
-    # For dark, need to match exposure time
-    if master_type == "dark":
-        return _find_best_dark_match(
-            matching_masters, flat_headers, flat_exposure_times
+    Returns:
+        Dictionary mapping each group id to its MasterMatch
+    """
+    planned = {
+        master_type: _usable_run_masters(
+            master_type, (run_masters or {}).get(master_type)
         )
+        for master_type in ("bias", "dark")
+    }
+    bias_library = _build_library(
+        groups, bias_dir, "bias", planned["bias"], catalog, io_workers
+    )
+    dark_library = _build_library(
+        groups, dark_dir, "dark", planned["dark"], catalog, io_workers
+    )
 
-    return None
-
+    matches: Dict[Hashable, MasterMatch] = {}
+    # Per match key: headers carrying the settings, and (match, target) pairs
+    pending: Dict[Tuple, Tuple[Dict, List[Tuple[MasterMatch, float]]]] = {}
+    for group_id, (headers, exposures) in groups.items():
+        match = MasterMatch()
+        matches[group_id] = match
+        if exposures:
+            match.target_exposure = min(exposures)
+        else:
+            match.target_exposure = _parse_exposure(
+                headers.get(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+            )
 
-def _find_best_dark_match(
-    matching_masters: Dict[str, Dict],
-    flat_headers: Dict,
-    flat_exposure_times: Optional[List[float]] = None,
-) -> Optional[str]:
-    """
-    Find the best matching dark master based on exposure time.
+        if bias_library is not None:
+            match.match_key, match.bias = bias_library.lookup(headers)
+            match.bias_matched = match.bias is not None
+
+        if dark_library is not None:
+            match.match_key, first_match = dark_library.lookup(headers)
+            match.dark_matched = first_match is not None
+            dark_exposures = dark_library.dark_exposures(headers)
+            if dark_exposures and match.target_exposure is not None:
+                match.dark_exposures = dark_exposures
+                pending.setdefault(match.match_key, (headers, []))[1].append(
+                    (match, match.target_exposure)
+                )
+            else:
+                # No usable exposure on either side, use the first match
+                match.dark = first_match
+
+        if not match.match_key:
+            match.match_key = create_match_key(headers)
+
+    if dark_library is not None:
+        for key_headers, targets in pending.values():
+            selected = dark_library.find_darks(
+                key_headers, [target for _, target in targets]
+            )
+            for (match, _), path in zip(targets, selected):
+                match.dark = path
+
+    for match in matches.values():
+        match.bias_from_run = match.bias is not None and match.bias in planned["bias"]
+        match.dark_from_run = match.dark is not None and match.dark in planned["dark"]
+
+    for library in (bias_library, dark_library):
+        if library is not None:
+            logger.debug(
+                f"{library.master_type.capitalize()} master lookups: "
+                f"{library.hits} memoized, {library.misses} resolved"
+            )
+    return matches
 
-    Prefers darks with exposure time less than or equal to the flat's exposure time.
-    If no such dark exists, uses the closest dark with higher exposure time.
 
-    Args:
-        matching_masters: Dict mapping filename to metadata dict
-        flat_headers: FITS headers from flat frame
-        flat_exposure_times: List of exposure times for all flats in group (optional)
+def _usable_run_masters(
+    master_type: str, run_masters: Optional[Dict[str, Dict]]
+) -> Dict[str, Dict]:
+    """Keep run masters whose metadata has every keyword needed to match."""
+    required = list(config.MASTER_MATCH_KEYWORDS)
+    if master_type == "dark":
+        required.append(config.NORMALIZED_HEADER_EXPOSURESECONDS)
+    return {
+        path: metadata
+        for path, metadata in (run_masters or {}).items()
+        if all(metadata.get(keyword) is not None for keyword in required)
+    }
 
-    Returns:
-        Path to best matching dark master, or None if no valid exposure time found
-    """
-    # Determine target exposure time
-    if flat_exposure_times:
-        # Use minimum exposure time from the group (prefer scaling up)
-        target_exposure = min(flat_exposure_times)
-        logger.debug(
-            f"Target exposure: {target_exposure}s "
-            f"(min of flat group: {flat_exposure_times})"
-        )
-    else:
-        # Use exposure from headers
-        target_exposure_raw: Any = flat_headers.get(
-            config.NORMALIZED_HEADER_EXPOSURESECONDS
-        )
-        if target_exposure_raw is None:
-            # No exposure time available, return first match
-            logger.debug("No exposure time in flat headers, using first match")
-            return next(iter(matching_masters.keys()))
-        try:
-            target_exposure = float(target_exposure_raw)
-            logger.debug(f"Target exposure: {target_exposure}s (from flat headers)")
-        except (ValueError, TypeError):
-            # Can't parse exposure time, return first match
-            logger.debug("Cannot parse exposure time, using first match")
-            return next(iter(matching_masters.keys()))
-
-    # Extract exposure times from masters
-    dark_candidates: list[DarkCandidate] = []
-    for filename, metadata in matching_masters.items():
-        exposure = metadata.get(config.NORMALIZED_HEADER_EXPOSURESECONDS)
-        if exposure is None:
-            continue
-        try:
-            exposure_float = float(exposure)
-            dark_candidates.append(
-                DarkCandidate(path=filename, exposure=exposure_float)
-            )
-        except (ValueError, TypeError):
-            continue
 
-    if not dark_candidates:
-        # No valid exposure times, return first match
-        logger.debug("No valid dark exposure times found, using first match")
-        return next(iter(matching_masters.keys()))
-
-    exposures_str = ", ".join([f"{d['exposure']}s" for d in dark_candidates])
-    logger.debug(f"Dark candidates with exposures: {exposures_str}")
-
-    # Prefer darks with exposure <= target (scaling up is better)
-    # If none exist, use the closest dark with higher exposure
-    suitable_darks = [d for d in dark_candidates if d["exposure"] <= target_exposure]
-
-    if suitable_darks:
-        # Find the one closest to target (prefer higher values, but still <= target)
-        best_dark = max(suitable_darks, key=lambda d: d["exposure"])
-        logger.debug(f"Selected dark with {best_dark['exposure']}s (closest <= target)")
-        logger.debug(f"Using: {Path(best_dark['path']).name}")
-        return best_dark["path"]
-    else:
-        # No dark with exposure <= target, use closest higher exposure
-        best_dark = min(
-            dark_candidates, key=lambda d: abs(d["exposure"] - target_exposure)
-        )
-        logger.debug(
-            f"Selected dark with {best_dark['exposure']}s "
-            f"(closest > target, will scale down)"
+def _build_library(
+    groups: Mapping[Hashable, Any],
+    master_dir: Optional[str],
+    master_type: str,
+    run_masters: Dict[str, Dict],
+    catalog: Optional[HeaderIndex],
+    io_workers: int,
+) -> Optional[MasterLibrary]:
+    """Scan a library with the run's masters, or None if there is nothing."""
+    if not groups:
+        return None
+    if master_dir:
+        return MasterLibrary.scan(
+            master_dir, master_type, catalog, io_workers, run_masters=run_masters
         )
-        logger.debug(f"Using: {Path(best_dark['path']).name}")
-        return best_dark["path"]
+    if run_masters:
+        return MasterLibrary(master_type, run_masters)
+    return None
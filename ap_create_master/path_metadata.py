@@ -0,0 +1,168 @@
+"""
+Build frame metadata from folder and file names.
+
+Acquisition software commonly encodes keywords in paths, for example
+DARK/EXPOSURE_60.00/GAIN_100_OFFSET_50_SETTEMP_-10.00_0001.fits. Frames whose
+paths parse to the same keywords form a path group. Discovery only opens a
+random sample of each group, and only when the path supplies every keyword
+frames of its type are grouped by (plus exposure for flats, which selects
+their darks). When the sampled headers agree with the path and with each
+other, the other frames are given the keywords from their paths. Groups
+whose paths leave out a grouping keyword, or that fail verification, fall
+back to reading every header.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from . import config
+
+_PATH_FRAME_TYPES = {frame_type.upper() for frame_type in config.PATH_FRAME_TYPES}
+
+# Keywords a path must supply for its frames to skip their headers, by frame
+# type; ignored types only need the type itself
+_PATH_REQUIRED_KEYWORDS = {
+    **{
+        frame_type: [config.NORMALIZED_HEADER_TYPE]
+        for frame_type in config.IGNORED_TYPES
+    },
+    **config.REQUIRED_KEYWORDS,
+    config.TYPE_FLAT.lower(): [
+        *config.REQUIRED_KEYWORDS[config.TYPE_FLAT.lower()],
+        config.NORMALIZED_HEADER_EXPOSURESECONDS,
+    ],
+}
+
+
+@dataclass
+class PathDiscoveryStats:
+    """
+    Counters describing how much of a path-based discovery was verified.
+
+    Attributes:
+        files: Files found under the input directory
+        groups: Path groups (frames with identical path keywords)
+        sampled: Headers read to verify path groups
+        fallback_groups: Path groups whose headers were all read
+        fallback_files: Headers read for fallback groups (beyond the sample)
+    """
+
+    files: int = 0
+    groups: int = 0
+    sampled: int = 0
+    fallback_groups: int = 0
+    fallback_files: int = 0
+
+    @property
+    def headers_read(self) -> int:
+        """Total number of headers read."""
+        return self.sampled + self.fallback_files
+
+
+def parse_path_keywords(path: str, input_dir: str) -> Dict[str, str]:
+    """
+    Parse normalized keywords from the folders and file name of a frame.
+
+    Each folder below input_dir and the file name (without extension) is
+    split on "_". A token listed in PATH_KEYWORDS takes the following token
+    as its value, and a bare frame type token such as "DARK" sets the type.
+    Later components override earlier ones, so the file name wins.
+
+    Args:
+        path: Path to the frame
+        input_dir: Root of the walk (folders above it are not parsed)
+
+    Returns:
+        Dictionary mapping normalized keywords to values from the path
+    """
+    relative = os.path.relpath(path, input_dir)
+    components = relative.split(os.sep)
+    components[-1] = os.path.splitext(components[-1])[0]
+
+    keywords: Dict[str, str] = {}
+    for component in components:
+        tokens = component.split("_")
+        index = 0
+        while index < len(tokens):
+            token = tokens[index].upper()
+            keyword = config.PATH_KEYWORDS.get(token)
+            if keyword is not None and index + 1 < len(tokens):
+                keywords[keyword] = _parse_token_value(keyword, tokens[index + 1])
+                index += 2
+                continue
+            if token in _PATH_FRAME_TYPES:
+                keywords[config.NORMALIZED_HEADER_TYPE] = token
+            index += 1
+    return keywords
+
+
+def path_keywords_complete(path_keywords: Dict[str, str]) -> bool:
+    """
+    Check whether path keywords are enough to classify and group a frame.
+
+    Args:
+        path_keywords: Keywords parsed from a frame's path
+
+    Returns:
+        True if the path supplies the frame type and every keyword that
+        frames of that type are grouped by (plus exposure for flats)
+    """
+    frame_type = path_keywords.get(config.NORMALIZED_HEADER_TYPE, "").lower()
+    required = _PATH_REQUIRED_KEYWORDS.get(frame_type)
+    return required is not None and all(k in path_keywords for k in required)
+
+
+def verify_samples(
+    path_keywords: Dict[str, str], sampled: List[Optional[Dict[str, Any]]]
+) -> Optional[Dict[str, Any]]:
+    """
+    Check sampled headers against the keywords parsed from their path group.
+
+    Every keyword from the path must match each sampled header (numbers are
+    compared numerically, text case-insensitively), and the sampled headers
+    must agree with each other on every CACHED_KEYWORDS keyword.
+
+    Only the keywords the path supplies are returned, so a frame that is not
+    read never inherits a keyword its own path does not state. Values keep
+    the sampled headers' formatting, so they group together with frames
+    whose headers were read.
+
+    Args:
+        path_keywords: Keywords parsed from the group's paths
+        sampled: Headers read for the sample (None for unreadable files)
+
+    Returns:
+        Keywords for the frames of the group that are not read, or None on a
+        mismatch
+    """
+    if not sampled or any(headers is None for headers in sampled):
+        return None
+    verified: List[Dict[str, Any]] = [h for h in sampled if h is not None]
+    canonical = verified[0]
+
+    for keyword, value in path_keywords.items():
+        if not all(_values_match(value, h.get(keyword)) for h in verified):
+            return None
+    for keyword in config.CACHED_KEYWORDS:
+        expected = canonical.get(keyword)
+        if not all(_values_match(expected, h.get(keyword)) for h in verified[1:]):
+            return None
+    return {keyword: canonical[keyword] for keyword in path_keywords}
+
+
+def _parse_token_value(keyword: str, value: str) -> str:
+    """Clean up a path token value (e.g. "60.00s" exposure -> "60.00")."""
+    if keyword == config.NORMALIZED_HEADER_EXPOSURESECONDS and value[-1:] in "sS":
+        return value[:-1]
+    return value
+
+
+def _values_match(expected: Any, actual: Any) -> bool:
+    """Compare keyword values numerically when possible, else as text."""
+    if expected is None or actual is None:
+        return expected is None and actual is None
+    try:
+        return float(expected) == float(actual)
+    except (ValueError, TypeError):
+        return str(expected).strip().lower() == str(actual).strip().lower()
@@ -0,0 +1,103 @@
+"""
+Manifest of frames already processed, recorded per input directory.
+
+Incremental runs against a growing inbox only consider frames that are not
+in the manifest. Frames are recorded once PixInsight has completed a run
+that included them, so a failed run is retried in full next time.
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+RUN_MANIFEST_FILENAME = "run_manifest.sqlite"
+
+
+class RunManifest:
+    """SQLite record of processed frame paths keyed by input directory."""
+
+    def __init__(self, db_path: str, read_only: bool = False) -> None:
+        """
+        Open (or create) the manifest.
+
+        Args:
+            db_path: Path to the SQLite database file
+            read_only: Open an existing manifest without ever writing to it
+                (for dry runs); record then does nothing
+        """
+        self.db_path = Path(db_path)
+        self.read_only = read_only
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True
+            )
+            return
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            " input_dir TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " processed_at TEXT NOT NULL,"
+            " PRIMARY KEY (input_dir, path))"
+        )
+
+    @staticmethod
+    def _key(input_dir: str) -> str:
+        """Manifest key for an input directory (absolute path)."""
+        return os.path.abspath(input_dir)
+
+    def unseen(self, input_dir: str, paths: Iterable[str]) -> Set[str]:
+        """
+        Get the paths that have not been processed for an input directory.
+
+        Args:
+            input_dir: Input directory the paths were discovered in
+            paths: Discovered file paths
+
+        Returns:
+            Set of paths not recorded in the manifest
+        """
+        rows = self._conn.execute(
+            "SELECT path FROM processed WHERE input_dir = ?", (self._key(input_dir),)
+        )
+        processed = {row[0] for row in rows}
+        return {path for path in paths if path not in processed}
+
+    def record(self, input_dir: str, paths: Iterable[str]) -> None:
+        """
+        Record paths as processed for an input directory.
+
+        Args:
+            input_dir: Input directory the paths were discovered in
+            paths: File paths included in a completed run
+        """
+        if self.read_only:
+            return
+        key = self._key(input_dir)
+        processed_at = datetime.now().isoformat(timespec="seconds")
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO processed (input_dir, path, processed_at)"
+            " VALUES (?, ?, ?)",
+            ((key, path, processed_at) for path in paths),
+        )
+
+    def commit(self) -> None:
+        """Persist pending changes."""
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Commit pending changes and close the database."""
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self) -> "RunManifest":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -4,33 +4,100 @@ Generated By: Cursor (Claude Sonnet 4.5)
 Generate PixInsight JavaScript scripts for calibration master generation.
 """
 
+import functools
+import json
+import logging
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 import ap_common
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import BaseLoader, Environment, FileSystemLoader, ModuleLoader
 
 from . import config
+from .template_env import (
+    COMPILED_TEMPLATE_ARCHIVE_NAME,
+    COMPILED_TEMPLATE_STAMP_NAME,
+    TEMPLATE_DIR,
+    compiled_templates_current,
+    create_template_env,
+    escape_js_string,
+)
 
+logger = logging.getLogger(__name__)
 
-def escape_js_string(path: str) -> str:
-    """Escape a file path for use in JavaScript string literal."""
-    # Replace backslashes with forward slashes (PixInsight accepts both)
-    # and escape any quotes
-    path = path.replace("\\", "/")
-    path = path.replace('"', '\\"')
-    return path
+# Fixed driver script that runs the groups of a JSON script manifest
+DRIVER_SCRIPT_FILENAME = "calibrate_masters_driver.js"
+SCRIPT_MANIFEST_VERSION = 1
 
+# Templates precompiled to Python modules when the package is built
+COMPILED_TEMPLATE_ARCHIVE = TEMPLATE_DIR / COMPILED_TEMPLATE_ARCHIVE_NAME
+COMPILED_TEMPLATE_MANIFEST = TEMPLATE_DIR / COMPILED_TEMPLATE_STAMP_NAME
 
+
+class _EscapedPaths:
+    """
+    Re-iterable view of file paths, escaped for JavaScript on demand.
+
+    Templates iterate it like a list, but no escaped copy of the paths is
+    kept, so rendering memory does not grow with the number of frames.
+    """
+
+    __slots__ = ("_paths", "_transform")
+
+    def __init__(
+        self,
+        paths: Sequence[str],
+        transform: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        """
+        Create the view.
+
+        Args:
+            paths: File paths
+            transform: Optional function applied to each path before escaping
+        """
+        self._paths = paths
+        self._transform = transform
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __iter__(self) -> Iterator[str]:
+        for path in self._paths:
+            if self._transform is not None:
+                path = self._transform(path)
+            yield escape_js_string(path)
+
+
+@functools.lru_cache(maxsize=None)
 def _get_template_env() -> Environment:
-    """Get Jinja2 template environment with custom filters."""
-    template_dir = Path(__file__).parent / "templates"
-    env = Environment(
-        loader=FileSystemLoader(str(template_dir)),
-        autoescape=select_autoescape([]),  # No auto-escaping for JS
-    )
-    env.filters["escape_js"] = escape_js_string
-    return env
+    """
+    Get the Jinja2 template environment, created once per process.
+
+    Uses the template modules precompiled by the build when they match the
+    running Jinja2, else parses the templates from source (once per process,
+    via the environment cache). Source checkouts and editable installs have
+    no precompiled modules.
+    """
+    loader: BaseLoader
+    if compiled_templates_current(
+        COMPILED_TEMPLATE_ARCHIVE, COMPILED_TEMPLATE_MANIFEST
+    ):
+        loader = ModuleLoader(str(COMPILED_TEMPLATE_ARCHIVE))
+    else:
+        logger.debug("No compiled templates for this Jinja2, loading from source")
+        loader = FileSystemLoader(str(TEMPLATE_DIR))
+    return create_template_env(loader)
 
 
 def generate_master_filename(metadata: Dict[str, str], frame_type: str) -> str:
@@ -84,35 +151,28 @@ def generate_master_filename(metadata: Dict[str, str], frame_type: str) -> str:
     return "_".join(sanitized)
 
 
-def generate_combined_script(
+def _calibrated_path(calibrated_dir: Path) -> Callable[[str], str]:
+    """Map a flat path to ImageCalibration's output: <basename>_c.xisf."""
+
+    def transform(file_path: str) -> str:
+        return str(calibrated_dir / f"{Path(file_path).stem}_c.xisf")
+
+    return transform
+
+
+def _script_context(
     master_output_dir: str,
     bias_groups: List[Tuple[Dict[str, str], List[str]]],
     dark_groups: List[Tuple[Dict[str, str], List[str]]],
     flat_groups: List[Tuple[Dict[str, str], List[str], Optional[str], Optional[str]]],
     log_file: str,
-    calibrated_base_dir: Optional[str] = None,
-) -> str:
-    """
-    Generate a single combined script that processes all groups sequentially.
-
-    Args:
-        master_output_dir: Output directory for master files
-        bias_groups: List of (metadata, file_paths) tuples for bias groups
-        dark_groups: List of (metadata, file_paths) tuples for dark groups
-        flat_groups: List of (metadata, file_paths,
-            master_bias_xisf, master_dark_xisf) tuples
-        log_file: Path to log file for Console.beginLog()
-        calibrated_base_dir: Base directory for calibrated flat
-            frames (default: same as master_output_dir)
-
-    Returns:
-        Combined JavaScript code as string
-    """
-    env = _get_template_env()
-    template = env.get_template("combined.j2")
-
+    calibrated_base_dir: Optional[str],
+    stack_size_mb: Optional[int],
+) -> Dict[str, Any]:
+    """Build the combined template context; file path lists are lazy views."""
     output_path = Path(master_output_dir)
     calibrated_path = Path(calibrated_base_dir) if calibrated_base_dir else output_path
+    calibration_masters = _calibration_masters(flat_groups)
 
     # Prepare template context for bias groups
     bias_contexts = []
@@ -121,9 +181,10 @@ def generate_combined_script(
         output_file = output_path / f"{master_name}.xisf"
         bias_contexts.append(
             {
-                "file_paths": [escape_js_string(p) for p in file_paths],
+                "file_paths": _EscapedPaths(file_paths),
                 "master_name": master_name,
                 "output_path": escape_js_string(str(output_file)),
+                "feeds_flats": output_file in calibration_masters,
             }
         )
 
@@ -134,9 +195,10 @@ def generate_combined_script(
         output_file = output_path / f"{master_name}.xisf"
         dark_contexts.append(
             {
-                "file_paths": [escape_js_string(p) for p in file_paths],
+                "file_paths": _EscapedPaths(file_paths),
                 "master_name": master_name,
                 "output_path": escape_js_string(str(output_file)),
+                "feeds_flats": output_file in calibration_masters,
             }
         )
 
@@ -147,23 +209,18 @@ def generate_combined_script(
         calibrated_dir = calibrated_path / "calibrated" / master_name
         master_output_path = output_path / f"{master_name}.xisf"
 
-        # Generate expected calibrated file paths
+        # Expected calibrated file paths
         # ImageCalibration creates: <input_basename>_c.xisf in calibrated_dir
-        calibrated_file_paths = []
-        if master_bias_xisf or master_dark_xisf:
-            for file_path in file_paths:
-                file_stem = Path(file_path).stem  # filename without extension
-                calibrated_file = calibrated_dir / f"{file_stem}_c.xisf"
-                calibrated_file_paths.append(str(calibrated_file))
+        calibrated_sources = file_paths if master_bias_xisf or master_dark_xisf else []
 
         flat_contexts.append(
             {
-                "file_paths": [escape_js_string(p) for p in file_paths],
+                "file_paths": _EscapedPaths(file_paths),
                 "master_name": master_name,
                 "calibrated_dir": escape_js_string(str(calibrated_dir)),
-                "calibrated_file_paths": [
-                    escape_js_string(p) for p in calibrated_file_paths
-                ],
+                "calibrated_file_paths": _EscapedPaths(
+                    calibrated_sources, _calibrated_path(calibrated_dir)
+                ),
                 "output_path": escape_js_string(str(master_output_path)),
                 "master_bias_path": (
                     escape_js_string(master_bias_xisf) if master_bias_xisf else ""
@@ -176,9 +233,335 @@ def generate_combined_script(
             }
         )
 
-    return template.render(
-        bias_groups=bias_contexts,
-        dark_groups=dark_contexts,
-        flat_groups=flat_contexts,
-        log_file=escape_js_string(log_file),
+    return {
+        "bias_groups": bias_contexts,
+        "dark_groups": dark_contexts,
+        "flat_groups": flat_contexts,
+        "log_file": escape_js_string(log_file),
+        "stack_size_mb": stack_size_mb,
+    }
+
+
+def _calibration_masters(
+    flat_groups: List[Tuple[Dict[str, str], List[str], Optional[str], Optional[str]]],
+) -> Set[Path]:
+    """Collect the bias and dark masters the flat groups are calibrated with."""
+    return {
+        Path(master)
+        for _, _, master_bias, master_dark in flat_groups
+        for master in (master_bias, master_dark)
+        if master
+    }
+
+
+def stream_combined_script(
+    master_output_dir: str,
+    bias_groups: List[Tuple[Dict[str, str], List[str]]],
+    dark_groups: List[Tuple[Dict[str, str], List[str]]],
+    flat_groups: List[Tuple[Dict[str, str], List[str], Optional[str], Optional[str]]],
+    log_file: str,
+    calibrated_base_dir: Optional[str] = None,
+    stack_size_mb: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Render the combined script as a stream of text chunks.
+
+    Chunks are produced as the template runs and file paths are escaped on
+    the fly, so writing the stream to a file keeps peak memory independent
+    of the number of frames.
+
+    Bias and dark groups whose masters calibrate flat groups of the same
+    script are integrated before the flats are calibrated.
+
+    Args:
+        master_output_dir: Output directory for master files
+        bias_groups: List of (metadata, file_paths) tuples for bias groups
+        dark_groups: List of (metadata, file_paths) tuples for dark groups
+        flat_groups: List of (metadata, file_paths,
+            master_bias_xisf, master_dark_xisf) tuples
+        log_file: Path to log file for Console.beginLog()
+        calibrated_base_dir: Base directory for calibrated flat
+            frames (default: same as master_output_dir)
+        stack_size_mb: ImageIntegration stack size in MiB, replacing
+            automatic memory sizing (default: automatic)
+
+    Returns:
+        Iterator over chunks of JavaScript code
+    """
+    template = _get_template_env().get_template("combined.j2")
+    return template.generate(
+        **_script_context(
+            master_output_dir,
+            bias_groups,
+            dark_groups,
+            flat_groups,
+            log_file,
+            calibrated_base_dir,
+            stack_size_mb,
+        )
     )
+
+
+def generate_combined_script(
+    master_output_dir: str,
+    bias_groups: List[Tuple[Dict[str, str], List[str]]],
+    dark_groups: List[Tuple[Dict[str, str], List[str]]],
+    flat_groups: List[Tuple[Dict[str, str], List[str], Optional[str], Optional[str]]],
+    log_file: str,
+    calibrated_base_dir: Optional[str] = None,
+    stack_size_mb: Optional[int] = None,
+) -> str:
+    """
+    Generate a single combined script that processes all groups sequentially.
+
+    Use stream_combined_script to write large scripts without holding them
+    in memory.
+
+    Args:
+        master_output_dir: Output directory for master files
+        bias_groups: List of (metadata, file_paths) tuples for bias groups
+        dark_groups: List of (metadata, file_paths) tuples for dark groups
+        flat_groups: List of (metadata, file_paths,
+            master_bias_xisf, master_dark_xisf) tuples
+        log_file: Path to log file for Console.beginLog()
+        calibrated_base_dir: Base directory for calibrated flat
+            frames (default: same as master_output_dir)
+        stack_size_mb: ImageIntegration stack size in MiB, replacing
+            automatic memory sizing (default: automatic)
+
+    Returns:
+        Combined JavaScript code as string
+    """
+    return "".join(
+        stream_combined_script(
+            master_output_dir,
+            bias_groups,
+            dark_groups,
+            flat_groups,
+            log_file,
+            calibrated_base_dir,
+            stack_size_mb,
+        )
+    )
+
+
+def _manifest_path(path: str) -> str:
+    """Normalize a path for the JSON manifest (PixInsight accepts "/")."""
+    return path.replace("\\", "/")
+
+
+def build_script_manifest(
+    master_output_dir: str,
+    bias_groups: List[Tuple[Dict[str, str], List[str]]],
+    dark_groups: List[Tuple[Dict[str, str], List[str]]],
+    flat_groups: List[Tuple[Dict[str, str], List[str], Optional[str], Optional[str]]],
+    log_file: str,
+    calibrated_base_dir: Optional[str] = None,
+    stack_size_mb: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Build the group definitions read by the driver script.
+
+    Each group is the data object passed to the driver's calibrateFlats and
+    integrateMaster functions, the same objects the combined script inlines.
+    Bias and dark groups whose masters calibrate flats of the same manifest
+    are marked feedsFlats, and the driver integrates them first.
+
+    Args:
+        master_output_dir: Output directory for master files
+        bias_groups: List of (metadata, file_paths) tuples for bias groups
+        dark_groups: List of (metadata, file_paths) tuples for dark groups
+        flat_groups: List of (metadata, file_paths,
+            master_bias_xisf, master_dark_xisf) tuples
+        log_file: Path to log file for Console.beginLog()
+        calibrated_base_dir: Base directory for calibrated flat
+            frames (default: same as master_output_dir)
+        stack_size_mb: ImageIntegration stack size in MiB, replacing
+            automatic memory sizing (default: automatic)
+
+    Returns:
+        Manifest dictionary, ready to be written as JSON
+    """
+    output_path = Path(master_output_dir)
+    calibrated_path = Path(calibrated_base_dir) if calibrated_base_dir else output_path
+    calibration_masters = _calibration_masters(flat_groups)
+
+    manifest: Dict[str, Any] = {
+        "version": SCRIPT_MANIFEST_VERSION,
+        "logFile": _manifest_path(log_file),
+        "stackSizeMB": stack_size_mb,
+        "bias": [],
+        "dark": [],
+        "flat": [],
+    }
+    for frame_type, groups in (("bias", bias_groups), ("dark", dark_groups)):
+        for metadata, file_paths in groups:
+            master_name = generate_master_filename(metadata, frame_type)
+            output_file = output_path / f"{master_name}.xisf"
+            manifest[frame_type].append(
+                {
+                    "name": master_name,
+                    "output": _manifest_path(str(output_file)),
+                    "feedsFlats": output_file in calibration_masters,
+                    "images": [_manifest_path(p) for p in file_paths],
+                }
+            )
+
+    for metadata, file_paths, master_bias_xisf, master_dark_xisf in flat_groups:
+        master_name = generate_master_filename(metadata, "flat")
+        calibrated_dir = calibrated_path / "calibrated" / master_name
+        calibrated = bool(master_bias_xisf or master_dark_xisf)
+        files = [_manifest_path(p) for p in file_paths]
+        if calibrated:
+            to_calibrated = _calibrated_path(calibrated_dir)
+            images = [_manifest_path(to_calibrated(p)) for p in file_paths]
+        else:
+            images = files
+        manifest["flat"].append(
+            {
+                "name": master_name,
+                "output": _manifest_path(str(output_path / f"{master_name}.xisf")),
+                "calibrated": calibrated,
+                "outputDirectory": _manifest_path(str(calibrated_dir)),
+                "masterBias": _manifest_path(master_bias_xisf or ""),
+                "masterDark": _manifest_path(master_dark_xisf or ""),
+                "files": files,
+                "images": images,
+            }
+        )
+    return manifest
+
+
+def write_script_manifest(manifest_path: str, manifest: Dict[str, Any]) -> None:
+    """
+    Validate a script manifest and write it as JSON.
+
+    Args:
+        manifest_path: Path of the JSON file to write
+        manifest: Manifest from build_script_manifest
+
+    Raises:
+        ValueError: If the manifest is not valid (nothing is written)
+    """
+    validate_script_manifest(manifest)
+    with open(manifest_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+
+
+def load_script_manifest(manifest_path: str) -> Dict[str, Any]:
+    """
+    Load and validate a script manifest.
+
+    Args:
+        manifest_path: Path of the JSON manifest
+
+    Returns:
+        Manifest dictionary
+
+    Raises:
+        ValueError: If the manifest is not valid JSON or not a valid manifest
+    """
+    try:
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Script manifest is not valid JSON: {e}") from e
+
+    validate_script_manifest(manifest)
+    return manifest
+
+
+def validate_script_manifest(manifest: Any) -> None:
+    """
+    Check that a manifest has everything the driver script reads.
+
+    Args:
+        manifest: Decoded manifest
+
+    Raises:
+        ValueError: If the manifest is not a valid script manifest
+    """
+    if not isinstance(manifest, dict):
+        raise ValueError("Script manifest must be a JSON object")
+    if manifest.get("version") != SCRIPT_MANIFEST_VERSION:
+        raise ValueError(
+            f"Unsupported script manifest version: {manifest.get('version')}"
+        )
+    if not isinstance(manifest.get("logFile"), str):
+        raise ValueError("Script manifest is missing logFile")
+    stack_size_mb = manifest.get("stackSizeMB", 0)
+    if stack_size_mb is not None and (
+        not isinstance(stack_size_mb, int) or stack_size_mb < 1
+    ):
+        raise ValueError(
+            "Script manifest stackSizeMB must be null or a positive integer"
+        )
+
+    required = {
+        "bias": ("name", "output", "feedsFlats", "images"),
+        "dark": ("name", "output", "feedsFlats", "images"),
+        "flat": (
+            "name",
+            "output",
+            "calibrated",
+            "outputDirectory",
+            "masterBias",
+            "masterDark",
+            "files",
+            "images",
+        ),
+    }
+    for frame_type, keys in required.items():
+        groups = manifest.get(frame_type)
+        if not isinstance(groups, list):
+            raise ValueError(f"Script manifest is missing {frame_type} groups")
+        for index, group in enumerate(groups):
+            if not isinstance(group, dict):
+                raise ValueError(f"{frame_type} group {index} must be an object")
+            missing = [key for key in keys if key not in group]
+            if missing:
+                raise ValueError(
+                    f"{frame_type} group {index} is missing: {', '.join(missing)}"
+                )
+            paths = group["images"] + group.get("files", [])
+            if not group["images"] or not all(isinstance(p, str) for p in paths):
+                raise ValueError(f"{frame_type} group {index} has invalid file lists")
+            if frame_type == "flat" and group["calibrated"]:
+                if not (group["masterBias"] or group["masterDark"]):
+                    raise ValueError(
+                        f"flat group {index} is calibrated without a master"
+                    )
+
+
+def generate_driver_script() -> str:
+    """
+    Generate the driver script that runs the groups of a script manifest.
+
+    The driver does not depend on the run; PixInsight passes it the manifest
+    path as a script argument.
+
+    Returns:
+        Driver JavaScript code as string
+    """
+    template = _get_template_env().get_template("driver.j2")
+    return template.render(manifest_version=SCRIPT_MANIFEST_VERSION)
+
+
+def write_driver_script(driver_path: Path) -> bool:
+    """
+    Write the driver script unless an identical one already exists.
+
+    Args:
+        driver_path: Path of the driver script
+
+    Returns:
+        True if the file was written, False if it was already current
+    """
+    driver = generate_driver_script()
+    try:
+        if driver_path.read_text(encoding="utf-8") == driver:
+            return False
+    except OSError:
+        pass
+    driver_path.write_text(driver, encoding="utf-8")
+    return True
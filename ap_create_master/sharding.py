@@ -0,0 +1,327 @@
+"""
+Split a run's groups across several PixInsight instances.
+
+Bias and dark masters are integrated from their own frames, so they are
+independent. A flat group depends on a bias or dark group only when it is
+calibrated with a master created in the same run. Each shard becomes its own
+script, run by its own PixInsight process. With several instances, such
+flats are scheduled in a second wave of shards. Each of those shards lists
+the first-wave shards that create its masters and can start as soon as
+they have finished, without waiting for the rest of the first wave.
+
+With a memory budget, shards are also packed by working set, the memory
+ImageIntegration needs to hold every frame of a group at once, and the
+budget is divided between shards packed together as their integration
+stack sizes. A shard released early only starts once the shards still
+running leave room for its stack.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .script_generator import generate_master_filename
+
+MIB = 2**20
+
+BiasDarkGroup = Tuple[Dict[str, Any], List[str]]
+FlatGroup = Tuple[Dict[str, Any], List[str], Optional[str], Optional[str]]
+
+
+@dataclass
+class Shard:
+    """
+    Groups run by one PixInsight instance.
+
+    Attributes:
+        bias_groups: List of (metadata, file_paths) for bias groups
+        dark_groups: List of (metadata, file_paths) for dark groups
+        flat_groups: List of (metadata, file_paths, master_bias, master_dark)
+            for flat groups
+        cost: Estimated work, in frames read (see group_cost)
+        working_set: Largest group working set in bytes (groups run one
+            after another, so this is the shard's peak)
+        stack_size_mb: ImageIntegration stack size in MiB from the memory
+            budget, or None to let PixInsight size it automatically
+        wave: Wave the shard belongs to: 0, or 1 for flats calibrated with
+            masters created by wave 0
+        depends_on: Indices of the shards that create the masters this
+            shard's flats are calibrated with; it starts once they finish
+    """
+
+    bias_groups: List[BiasDarkGroup] = field(default_factory=list)
+    dark_groups: List[BiasDarkGroup] = field(default_factory=list)
+    flat_groups: List[FlatGroup] = field(default_factory=list)
+    cost: int = 0
+    working_set: int = 0
+    stack_size_mb: Optional[int] = None
+    wave: int = 0
+    depends_on: List[int] = field(default_factory=list)
+
+
+def group_cost(file_paths: List[str], calibrated: bool = False) -> int:
+    """
+    Estimate the work of one group as the number of frames it reads.
+
+    Calibrated flats are read twice: once by ImageCalibration and again,
+    calibrated, by ImageIntegration.
+
+    Args:
+        file_paths: Frames in the group
+        calibrated: Whether the group is calibrated before integration
+
+    Returns:
+        Estimated cost
+    """
+    return len(file_paths) * (2 if calibrated else 1)
+
+
+def group_working_set(
+    frame_sizes: Sequence[Optional[int]], fallback_frame_bytes: int = 0
+) -> int:
+    """
+    Estimate the memory ImageIntegration needs to hold a whole group.
+
+    Args:
+        frame_sizes: Estimated bytes of each frame (see grouping.frame_bytes),
+            None where the image size is unknown
+        fallback_frame_bytes: Bytes assumed for frames of unknown size
+
+    Returns:
+        Estimated working set in bytes
+    """
+    return sum(
+        size if size is not None else fallback_frame_bytes for size in frame_sizes
+    )
+
+
+def shard_groups(
+    bias_groups: List[BiasDarkGroup],
+    dark_groups: List[BiasDarkGroup],
+    flat_groups: List[FlatGroup],
+    instances: int,
+    master_dir: Optional[str] = None,
+    working_sets: Optional[Sequence[int]] = None,
+    memory_budget: Optional[int] = None,
+) -> List[Shard]:
+    """
+    Split groups into at most `instances` shards of similar cost.
+
+    A flat group calibrated with a bias or dark master created in the same
+    run depends on that master's group. A single instance creates those
+    masters first in its one script. With more instances, every other group
+    is packed into a first wave of shards, and the dependent flats into a
+    second wave: flats waiting for the same first-wave shards are packed
+    together into shards that depend on exactly those shards. Many flats
+    sharing one master are still spread over every instance instead of
+    following it into one shard. Groups are assigned largest first to the
+    shard with the least work so far (longest processing time first).
+    Within a shard, groups keep their original order, so a single shard
+    produces the same script as an unsharded run. Shards that would receive
+    no group are dropped.
+
+    With a memory budget, a group only goes to a shard where the peak
+    working sets of the shards packed with it still fit in the budget; if
+    none fits, it goes where the total grows least, so large groups share an
+    instance instead of running side by side. The budget is then split
+    between those shards in proportion to their peaks, so they use the whole
+    budget and no more when they run together.
+
+    Args:
+        bias_groups: List of (metadata, file_paths) for bias groups
+        dark_groups: List of (metadata, file_paths) for dark groups
+        flat_groups: List of (metadata, file_paths, master_bias, master_dark)
+            for flat groups
+        instances: Maximum number of shards
+        master_dir: Directory the run writes masters to, used to recognize
+            masters created in the run (default: no dependencies)
+        working_sets: Working set in bytes of every group, bias groups
+            first, then dark, then flat (see group_working_set; default: 0)
+        memory_budget: Bytes of RAM for all instances together, or None to
+            leave memory to PixInsight
+
+    Returns:
+        Non-empty shards: the first wave in order of their first group,
+        then the second wave by the shards they depend on
+
+    Raises:
+        ValueError: If instances or memory_budget is less than 1, or
+            working_sets does not have one entry per group
+    """
+    if instances < 1:
+        raise ValueError(f"instances must be at least 1, got {instances}")
+    if memory_budget is not None and memory_budget < 1:
+        raise ValueError(f"memory_budget must be positive, got {memory_budget}")
+    group_count = len(bias_groups) + len(dark_groups) + len(flat_groups)
+    if working_sets is None:
+        working_sets = [0] * group_count
+    elif len(working_sets) != group_count:
+        raise ValueError(
+            f"Expected {group_count} working sets, got {len(working_sets)}"
+        )
+
+    # (cost, frame type, group) for every group in run order
+    items: List[Tuple[int, str, Any]] = []
+    for group in bias_groups:
+        items.append((group_cost(group[1]), "bias", group))
+    for group in dark_groups:
+        items.append((group_cost(group[1]), "dark", group))
+    for flat in flat_groups:
+        items.append((group_cost(flat[1], bool(flat[2] or flat[3])), "flat", flat))
+
+    requires = _required_producers(items, master_dir)
+    if instances == 1 or not requires:
+        return _build_shards(
+            items,
+            _pack(items, range(len(items)), instances, working_sets, memory_budget),
+            working_sets,
+            memory_budget,
+        )
+
+    first_wave = _pack(
+        items,
+        [order for order in range(len(items)) if order not in requires],
+        instances,
+        working_sets,
+        memory_budget,
+    )
+    shards = _build_shards(items, first_wave, working_sets, memory_budget)
+    shard_of = {
+        order: index for index, members in enumerate(first_wave) for order in members
+    }
+
+    # Flats waiting for the same shards are released together
+    waiting: Dict[Tuple[int, ...], List[int]] = {}
+    for order in sorted(requires):
+        depends_on = tuple(sorted({shard_of[producer] for producer in requires[order]}))
+        waiting.setdefault(depends_on, []).append(order)
+    for depends_on, orders in sorted(waiting.items()):
+        for shard in _build_shards(
+            items,
+            _pack(items, orders, instances, working_sets, memory_budget),
+            working_sets,
+            memory_budget,
+        ):
+            shard.wave = 1
+            shard.depends_on = list(depends_on)
+            shards.append(shard)
+    return shards
+
+
+def _pack(
+    items: List[Tuple[int, str, Any]],
+    orders: Iterable[int],
+    instances: int,
+    working_sets: Sequence[int],
+    memory_budget: Optional[int],
+) -> List[List[int]]:
+    """
+    Pack groups into at most `instances` shards that run side by side.
+
+    Args:
+        items: (cost, frame type, group) for every group in run order
+        orders: Indices of the items to pack
+        instances: Maximum number of shards
+        working_sets: Working set in bytes of every item
+        memory_budget: Bytes of RAM for the shards together, or None
+
+    Returns:
+        Item indices of each non-empty shard, ascending, in order of the
+        first index
+    """
+    orders = list(orders)
+    count = min(instances, len(orders))
+    loads = [0] * count
+    peaks = [0] * count
+    assigned: List[List[int]] = [[] for _ in range(count)]
+    for order in sorted(orders, key=lambda order: (-items[order][0], order)):
+        # Growth of the summed peaks if the group joins each shard
+        growth = [max(working_sets[order] - peak, 0) for peak in peaks]
+        candidates = list(range(count))
+        if memory_budget is not None:
+            fits = [i for i in candidates if sum(peaks) + growth[i] <= memory_budget]
+            candidates = fits or [i for i in candidates if growth[i] == min(growth)]
+        # Least loaded candidate; ties go to the lowest index
+        index = min(candidates, key=lambda i: (loads[i], i))
+        assigned[index].append(order)
+        loads[index] += items[order][0]
+        peaks[index] += growth[index]
+    return sorted((sorted(m) for m in assigned if m), key=lambda m: m[0])
+
+
+def _build_shards(
+    items: List[Tuple[int, str, Any]],
+    members: List[List[int]],
+    working_sets: Sequence[int],
+    memory_budget: Optional[int],
+) -> List[Shard]:
+    """
+    Build the shards of one packing and split the budget between them.
+
+    Args:
+        items: (cost, frame type, group) for every group in run order
+        members: Item indices of each shard (see _pack)
+        working_sets: Working set in bytes of every item
+        memory_budget: Bytes of RAM for the shards together, or None
+
+    Returns:
+        One shard per entry of members
+    """
+    shards = []
+    for orders in members:
+        shard = Shard()
+        for order in orders:
+            cost, frame_type, group = items[order]
+            getattr(shard, f"{frame_type}_groups").append(group)
+            shard.cost += cost
+            shard.working_set = max(shard.working_set, working_sets[order])
+        shards.append(shard)
+
+    if memory_budget is not None:
+        _split_memory_budget(shards, memory_budget)
+    return shards
+
+
+def _split_memory_budget(shards: List[Shard], memory_budget: int) -> None:
+    """Set each shard's stack size to its share of the budget."""
+    total = sum(shard.working_set for shard in shards)
+    for shard in shards:
+        if total:
+            share = memory_budget * shard.working_set // total
+        else:
+            share = memory_budget // len(shards)
+        shard.stack_size_mb = max(share // MIB, 1)
+
+
+def _required_producers(
+    items: List[Tuple[int, str, Any]], master_dir: Optional[str]
+) -> Dict[int, List[int]]:
+    """
+    Find the groups whose masters each flat group is calibrated with.
+
+    Args:
+        items: (cost, frame type, group) for every group in run order
+        master_dir: Directory the run writes masters to, or None
+
+    Returns:
+        Item indices of the producing groups, by index of each flat that
+        uses a master created in the run
+    """
+    if master_dir is None:
+        return {}
+
+    producers: Dict[Path, int] = {}
+    for order, (_, frame_type, group) in enumerate(items):
+        if frame_type != "flat":
+            master_name = generate_master_filename(group[0], frame_type)
+            producers[Path(master_dir) / f"{master_name}.xisf"] = order
+
+    requires: Dict[int, List[int]] = {}
+    for order, (_, frame_type, group) in enumerate(items):
+        if frame_type != "flat":
+            continue
+        for master in group[2:]:
+            producer = producers.get(Path(master)) if master else None
+            if producer is not None:
+                requires.setdefault(order, []).append(producer)
+    return requires
@@ -0,0 +1,74 @@
+"""
+Jinja2 environment for the PixInsight script templates.
+
+Kept free of the package's runtime dependencies (only Jinja2), so the build
+can import it to precompile the templates into the wheel (see setup.py).
+"""
+
+import json
+from pathlib import Path
+
+import jinja2
+from jinja2 import BaseLoader, Environment, FileSystemLoader, select_autoescape
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+# Written next to the templates by the build, never at runtime
+COMPILED_TEMPLATE_ARCHIVE_NAME = "compiled.zip"
+COMPILED_TEMPLATE_STAMP_NAME = "compiled.json"
+
+
+def escape_js_string(path: str) -> str:
+    """Escape a file path for use in JavaScript string literal."""
+    # Replace backslashes with forward slashes (PixInsight accepts both)
+    # and escape any quotes
+    path = path.replace("\\", "/")
+    path = path.replace('"', '\\"')
+    return path
+
+
+def create_template_env(loader: BaseLoader) -> Environment:
+    """Create a Jinja2 template environment with custom filters."""
+    env = Environment(
+        loader=loader,
+        autoescape=select_autoescape([]),  # No auto-escaping for JS
+        trim_blocks=True,
+        lstrip_blocks=True,
+        keep_trailing_newline=True,
+    )
+    env.filters["escape_js"] = escape_js_string
+    return env
+
+
+def compile_templates(archive: Path, stamp: Path) -> None:
+    """
+    Precompile the script templates into a zip archive of Python modules.
+
+    The archive is loaded with Jinja2's ModuleLoader, so template parsing is
+    skipped at runtime. The stamp records the Jinja2 version the modules
+    were compiled with; a different Jinja2 at runtime ignores the archive.
+
+    Args:
+        archive: Path of the zip archive to write
+        stamp: Path of the stamp to write
+    """
+    env = create_template_env(FileSystemLoader(str(TEMPLATE_DIR)))
+    env.compile_templates(
+        str(archive), extensions=["j2"], zip="deflated", ignore_errors=False
+    )
+    stamp.write_text(
+        json.dumps({"jinja2": jinja2.__version__}, indent=2), encoding="utf-8"
+    )
+
+
+def compiled_templates_current(archive: Path, stamp: Path) -> bool:
+    """Check that compiled templates exist and match the running Jinja2."""
+    try:
+        compiled_with = json.loads(stamp.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return (
+        isinstance(compiled_with, dict)
+        and compiled_with.get("jinja2") == jinja2.__version__
+        and archive.exists()
+    )
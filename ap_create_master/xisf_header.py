@@ -0,0 +1,135 @@
+"""
+Minimal XISF header reader.
+
+An XISF file starts with an 8-byte signature, a 4-byte little-endian header
+length, 4 reserved bytes and the XML header. Masters are several hundred MB
+of float32 pixels, but matching only needs a few FITS keywords, so this
+reader stops after the XML header and never reads the data blocks. Raw
+keywords are normalized with ap-common like ap_common.get_file_headers.
+"""
+
+import struct
+import xml.etree.ElementTree as ET
+from typing import Any, Dict
+
+import ap_common
+
+from .fits_header import frame_size_headers, parse_string
+
+XISF_SIGNATURE = b"XISF0100"
+XISF_PREAMBLE_SIZE = 16
+XISF_NAMESPACE = "{http://www.pixinsight.com/xisf}"
+
+# XISF properties used when the equivalent FITS keyword is missing
+PROPERTY_KEYWORDS = {
+    "Instrument:Camera:Name": "INSTRUME",
+    "Instrument:ExposureTime": "EXPOSURE",
+    "Instrument:Sensor:TargetTemperature": "SET-TEMP",
+}
+
+# FITS BITPIX equivalent of each XISF sample format
+SAMPLE_FORMAT_BITPIX = {
+    "UInt8": 8,
+    "UInt16": 16,
+    "UInt32": 32,
+    "Float32": -32,
+    "Float64": -64,
+}
+
+
+class XisfHeaderError(ValueError):
+    """Raised when a file does not start with a readable XISF header."""
+
+
+def read_xisf_header(path: str) -> Dict[str, Any]:
+    """
+    Read the raw FITS keywords of the first image in an XISF file.
+
+    Only the preamble and XML header are read. Keyword values are returned
+    as strings with FITS quoting removed, the same form the xisf library
+    reports. Selected XISF properties, and the image geometry and sample
+    format, fill in missing keywords.
+
+    Args:
+        path: Path to XISF file
+
+    Returns:
+        Dictionary mapping raw keyword names to values
+
+    Raises:
+        XisfHeaderError: If the file is not XISF or the header is malformed
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(XISF_PREAMBLE_SIZE)
+        if len(preamble) < XISF_PREAMBLE_SIZE or not preamble.startswith(
+            XISF_SIGNATURE
+        ):
+            raise XisfHeaderError(f"Not an XISF file: {path}")
+        (header_length,) = struct.unpack("<I", preamble[8:12])
+        xml_header = f.read(header_length)
+
+    if len(xml_header) < header_length:
+        raise XisfHeaderError(f"Truncated XISF header: {path}")
+
+    try:
+        root = ET.fromstring(xml_header)
+    except ET.ParseError as e:
+        raise XisfHeaderError(f"Invalid XISF header in {path}: {e}") from e
+
+    headers: Dict[str, Any] = {}
+    image = root.find(f"{XISF_NAMESPACE}Image")
+    if image is not None:
+        for keyword in image.iter(f"{XISF_NAMESPACE}FITSKeyword"):
+            name = keyword.get("name")
+            # First occurrence wins, as with the FITS reader
+            if name and name not in headers:
+                headers[name] = _parse_keyword_value(keyword.get("value", ""))
+        _add_image_size(headers, image)
+
+    for prop in root.iter(f"{XISF_NAMESPACE}Property"):
+        name = PROPERTY_KEYWORDS.get(prop.get("id", ""))
+        if name is None or name in headers:
+            continue
+        value = prop.get("value", prop.text)
+        if value is not None:
+            headers[name] = value.strip()
+
+    return headers
+
+
+def read_normalized_xisf_header(path: str) -> Dict[str, Any]:
+    """
+    Read the FITS keywords of an XISF file and normalize them with ap-common.
+
+    Args:
+        path: Path to XISF file
+
+    Returns:
+        Dictionary of normalized headers
+
+    Raises:
+        XisfHeaderError: If the file is not XISF or the header is malformed
+    """
+    raw = read_xisf_header(path)
+    return {**ap_common.normalize_headers(raw), **frame_size_headers(raw)}
+
+
+def _add_image_size(headers: Dict[str, Any], image: ET.Element) -> None:
+    """Fill in NAXIS and BITPIX from an Image element's geometry and format."""
+    # geometry is "width:height:channels"
+    for keyword, size in zip(
+        ("NAXIS1", "NAXIS2", "NAXIS3"), image.get("geometry", "").split(":")
+    ):
+        if keyword not in headers and size.strip().isdigit():
+            headers[keyword] = int(size)
+    bitpix = SAMPLE_FORMAT_BITPIX.get(image.get("sampleFormat", ""))
+    if "BITPIX" not in headers and bitpix is not None:
+        headers["BITPIX"] = bitpix
+
+
+def _parse_keyword_value(value: str) -> str:
+    """Strip FITS string quoting from an XISF FITSKeyword value."""
+    text = value.strip()
+    if text.startswith("'"):
+        return parse_string(text)
+    return text
@@ -0,0 +1,110 @@
+"""
+Benchmark grouping engines on synthetic frame sets.
+
+Compares grouping.group_files (a key tuple per file) with the columnar
+engine, both from file info dicts and from prebuilt keyword columns, and
+the two groupers generate_masters selects with --grouping-engine.
+Frames are spread over a realistic number of groups: a few cameras,
+temperatures, gains and exposures.
+
+Usage:
+    python benchmarks/bench_grouping.py [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import itertools
+import random
+import time
+from typing import Callable, Dict, List
+
+from ap_create_master import config
+from ap_create_master.columnar_grouping import (
+    ColumnarGrouper,
+    group_columns,
+    group_files_columnar,
+)
+from ap_create_master.grouping import FrameGrouper, group_files
+
+KEYWORD_CHOICES = {
+    config.NORMALIZED_HEADER_TYPE: ["dark"],
+    config.NORMALIZED_HEADER_CAMERA: ["ATR585M", "ASI2600MM"],
+    config.NORMALIZED_HEADER_SETTEMP: ["-10.00", "-20.00", 0.0],
+    config.NORMALIZED_HEADER_GAIN: ["0", "100", 239],
+    config.NORMALIZED_HEADER_OFFSET: ["150", "50"],
+    config.NORMALIZED_HEADER_READOUTMODE: ["Low Conversion Gain", "High Gain"],
+    config.NORMALIZED_HEADER_EXPOSURESECONDS: ["30.0", "60.0", "120.0", "300.0"],
+}
+
+
+def make_files(count: int, seed: int = 0) -> List[Dict]:
+    """Build file info dicts; header dicts are shared between equal frames."""
+    keywords = list(KEYWORD_CHOICES)
+    combinations = [
+        dict(zip(keywords, values))
+        for values in itertools.product(*KEYWORD_CHOICES.values())
+    ]
+    rng = random.Random(seed)
+    return [
+        {"path": f"dark_{index:07d}.fits", "headers": rng.choice(combinations)}
+        for index in range(count)
+    ]
+
+
+def run_grouper(grouper, files: List[Dict]) -> Dict:
+    """Add frames one at a time, as discovery does, then group them."""
+    for file_info in files:
+        grouper.add_headers(file_info["path"], file_info["headers"], "dark")
+    return grouper.groups("dark")
+
+
+def time_engine(name: str, engine: Callable[[], Dict]) -> Dict:
+    """Run a grouping engine once and print its wall time."""
+    start = time.perf_counter()
+    groups = engine()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<30} {elapsed * 1000:10.1f} ms  ({len(groups)} groups)")
+    return groups
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="number of synthetic frames per run",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        files = make_files(size)
+        paths = [file_info["path"] for file_info in files]
+        columns = {
+            keyword: [file_info["headers"][keyword] for file_info in files]
+            for keyword in KEYWORD_CHOICES
+        }
+        print(f"{size} frame(s)")
+
+        expected = time_engine("group_files", lambda: group_files(files, "dark"))
+        columnar = time_engine(
+            "group_files_columnar", lambda: group_files_columnar(files, "dark")
+        )
+        time_engine(
+            "group_columns (prebuilt)", lambda: group_columns(paths, columns, "dark")
+        )
+
+        streaming = time_engine(
+            "FrameGrouper (streaming)", lambda: run_grouper(FrameGrouper(), files)
+        )
+        grouper = time_engine(
+            "ColumnarGrouper (columnar)", lambda: run_grouper(ColumnarGrouper(), files)
+        )
+
+        for groups in [columnar, streaming, grouper]:
+            if list(groups.items()) != list(expected.items()):
+                raise SystemExit("grouping engines differ from group_files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark per-file header read cost for discovery.
+
+Compares the minimal FITS header reader against ap-common's
+get_file_headers (the previous discovery path) and astropy's getheader.
+By default it writes synthetic frames with a full-size data unit (sparse on
+disk) so the cost of touching pixel data shows up; pass --dir to measure
+real frames instead.
+
+Usage:
+    python benchmarks/bench_header_reader.py [--files N] [--size-mb MB]
+    python benchmarks/bench_header_reader.py --dir /path/to/frames
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import ap_common
+from astropy.io import fits
+
+from ap_create_master.discovery import list_fits_files
+from ap_create_master.fits_header import read_normalized_header
+
+FRAME_CARDS = {
+    "IMAGETYP": "FLAT",
+    "INSTRUME": "ATR585M",
+    "SET-TEMP": -10.0,
+    "GAIN": 239,
+    "OFFSET": 150,
+    "READOUTM": "Low Conversion Gain",
+    "EXPOSURE": 1.5,
+    "FILTER": "B",
+    "DATE-OBS": "2026-01-15T20:00:00.000",
+}
+
+
+def write_frames(directory: Path, count: int, size_mb: int) -> List[str]:
+    """Write synthetic uint16 FITS frames of roughly size_mb megabytes."""
+    width = 6000
+    height = max(1, size_mb * 1024 * 1024 // (width * 2))
+    header = fits.Header()
+    header["SIMPLE"] = True
+    header["BITPIX"] = 16
+    header["NAXIS"] = 2
+    header["NAXIS1"] = width
+    header["NAXIS2"] = height
+    for keyword, value in FRAME_CARDS.items():
+        header[keyword] = value
+    header_bytes = header.tostring().encode("ascii")
+    data_size = width * height * 2
+    padded_size = -(-data_size // 2880) * 2880
+
+    paths = []
+    for index in range(count):
+        path = directory / f"flat_{index:04d}.fits"
+        with open(path, "wb") as f:
+            f.write(header_bytes)
+            f.truncate(len(header_bytes) + padded_size)
+        paths.append(str(path))
+    return paths
+
+
+def time_reader(name: str, reader: Callable[[str], object], paths: List[str]) -> None:
+    """Read every path once and print per-file timing statistics."""
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        reader(path)
+        timings.append((time.perf_counter() - start) * 1000)
+    print(
+        f"{name:<28} mean {statistics.mean(timings):8.3f} ms"
+        f"  median {statistics.median(timings):8.3f} ms"
+        f"  total {sum(timings) / 1000:7.2f} s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50, help="synthetic frames")
+    parser.add_argument("--size-mb", type=int, default=62, help="frame size in MB")
+    parser.add_argument("--dir", help="benchmark existing FITS files instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.dir:
+            paths = list_fits_files(args.dir)
+        else:
+            paths = write_frames(Path(tmp), args.files, args.size_mb)
+        print(f"{len(paths)} file(s)")
+
+        time_reader("fits_header (fast)", read_normalized_header, paths)
+        time_reader(
+            "ap_common.get_file_headers",
+            lambda p: ap_common.get_file_headers(
+                p, profileFromPath=False, normalize=True
+            ),
+            paths,
+        )
+        time_reader("astropy getheader", fits.getheader, paths)
+
+
+if __name__ == "__main__":
+    main()
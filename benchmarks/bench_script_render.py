@@ -0,0 +1,97 @@
+"""
+Benchmark rendering the combined PixInsight script for a large plan.
+
+Compares rendering the whole script into a string and writing it with
+write_text against streaming template chunks straight to the file. Peak
+memory is measured with tracemalloc over the render and write only; the
+synthetic plan itself is built beforehand. Run with --groups 1 to check
+that a single large group also streams its file list.
+
+Usage:
+    python benchmarks/bench_script_render.py [--frames 50000] [--groups 40]
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ap_create_master import config
+from ap_create_master.script_generator import (
+    generate_combined_script,
+    stream_combined_script,
+)
+
+FLAT_DIR = "/mnt/astro/data/2026-01-15/ATR585M/FLAT/FILTER_{filter}"
+FILTERS = ["L", "R", "G", "B", "Ha", "OIII", "SII"]
+
+FlatGroup = Tuple[Dict[str, str], List[str], Optional[str], Optional[str]]
+
+
+def make_plan(frames: int, groups: int) -> List[FlatGroup]:
+    """Build calibrated flat groups with frames spread evenly across them."""
+    per_group = max(frames // groups, 1)
+    plan = []
+    for index in range(groups):
+        flt = FILTERS[index % len(FILTERS)]
+        metadata = {
+            config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+            config.NORMALIZED_HEADER_FILTER: f"{flt}{index}",
+            config.NORMALIZED_HEADER_DATE: "2026-01-15",
+        }
+        directory = FLAT_DIR.format(filter=flt)
+        paths = [
+            f"{directory}/FLAT_{flt}_GAIN_100_{index:03d}_{frame:06d}.fits"
+            for frame in range(per_group)
+        ]
+        plan.append((metadata, paths, "/masters/bias.xisf", "/masters/dark.xisf"))
+    return plan
+
+
+def measure(name: str, render: Callable[[Path], None], script_path: Path) -> None:
+    """Run a render once and print wall time, peak memory and file size."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    render(script_path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size = script_path.stat().st_size
+    print(
+        f"  {name:<20} {elapsed * 1000:10.1f} ms  "
+        f"peak {peak / 2**20:8.1f} MiB  script {size / 2**20:8.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=50_000, help="flat frames")
+    parser.add_argument("--groups", type=int, default=40, help="flat groups")
+    args = parser.parse_args()
+
+    plan = make_plan(args.frames, args.groups)
+    render_args = ("/masters", [], [], plan, "/logs/run.log", "/output")
+    print(f"{args.frames} frame(s) in {args.groups} flat group(s)")
+
+    def render_string(path: Path) -> None:
+        path.write_text(generate_combined_script(*render_args), encoding="utf-8")
+
+    def render_stream(path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as script_file:
+            script_file.writelines(stream_combined_script(*render_args))
+
+    # Warm the template cache so neither run pays for parsing
+    generate_combined_script("/masters", [], [], [], "/logs/run.log")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        string_path = Path(tmp) / "string.js"
+        stream_path = Path(tmp) / "stream.js"
+        measure("render + write_text", render_string, string_path)
+        measure("stream to file", render_stream, stream_path)
+        assert string_path.read_bytes() == stream_path.read_bytes()
+
+
+if __name__ == "__main__":
+    main()
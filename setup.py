@@ -0,0 +1,40 @@
+"""
+Build hook that precompiles the PixInsight script templates into the wheel.
+
+Project metadata lives in pyproject.toml. build_py writes the compiled
+template modules next to the built templates, so installed packages never
+parse templates at runtime and never write into their own directory.
+Editable installs run from source and skip the step.
+"""
+
+import sys
+from pathlib import Path
+
+from setuptools import setup
+from setuptools.command.build_py import build_py
+
+# template_env only needs Jinja2, which the build requires
+sys.path.insert(0, str(Path(__file__).parent))
+from ap_create_master.template_env import (  # noqa: E402
+    COMPILED_TEMPLATE_ARCHIVE_NAME,
+    COMPILED_TEMPLATE_STAMP_NAME,
+    compile_templates,
+)
+
+
+class BuildPyWithTemplates(build_py):
+    """build_py that also precompiles the script templates."""
+
+    def run(self) -> None:
+        super().run()
+        if getattr(self, "editable_mode", False):
+            return
+        template_dir = Path(self.build_lib) / "ap_create_master" / "templates"
+        template_dir.mkdir(parents=True, exist_ok=True)
+        compile_templates(
+            template_dir / COMPILED_TEMPLATE_ARCHIVE_NAME,
+            template_dir / COMPILED_TEMPLATE_STAMP_NAME,
+        )
+
+
+setup(cmdclass={"build_py": BuildPyWithTemplates})
@@ -0,0 +1,220 @@
+"""
+Unit tests for ap_create_master.async_api module.
+"""
+
+import asyncio
+import stat
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ap_create_master.async_api import (
+    async_execute_plan,
+    async_generate_masters,
+    async_run_pixinsight,
+)
+from ap_create_master.calibrate_masters import RunPlan
+
+
+def _fake_pixinsight(tmp_path, body):
+    """Write an executable shell script standing in for PixInsight."""
+    binary = tmp_path / "PixInsight"
+    binary.write_text(f"#!/bin/sh\n{body}\n")
+    binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+    script = tmp_path / "20260115_calibrate_masters.js"
+    script.write_text("// script")
+    return str(binary), str(script)
+
+
+class TestAsyncGenerateMasters:
+    """Tests for async_generate_masters function."""
+
+    @patch("ap_create_master.async_api.generate_masters")
+    def test_runs_off_the_event_loop_thread(self, mock_generate, tmp_path):
+        """Test that planning runs in an executor thread with its arguments."""
+        threads = []
+
+        def generate(*args, **kwargs):
+            threads.append(threading.get_ident())
+            return RunPlan()
+
+        mock_generate.side_effect = generate
+
+        async def run():
+            return await async_generate_masters("in", "out", io_workers=4)
+
+        plan = asyncio.run(run())
+
+        assert isinstance(plan, RunPlan)
+        assert threads and threads[0] != threading.get_ident()
+        mock_generate.assert_called_once_with("in", "out", io_workers=4)
+
+    @patch("ap_create_master.async_api.generate_masters")
+    def test_sessions_are_planned_concurrently(self, mock_generate):
+        """Test that gathered sessions overlap instead of running in turn."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def generate(input_dir, output_dir, **kwargs):
+            # Both sessions must be inside generate_masters at the same time
+            barrier.wait()
+            return RunPlan(processed_files=[input_dir])
+
+        mock_generate.side_effect = generate
+
+        async def run():
+            return await asyncio.gather(
+                async_generate_masters("night1", "out1"),
+                async_generate_masters("night2", "out2"),
+            )
+
+        plans = asyncio.run(run())
+
+        assert [plan.processed_files for plan in plans] == [["night1"], ["night2"]]
+
+
+class TestAsyncRunPixinsight:
+    """Tests for async_run_pixinsight function."""
+
+    def test_returns_exit_code_without_blocking(self, tmp_path):
+        """Test that the loop keeps running while PixInsight runs."""
+        binary, script = _fake_pixinsight(tmp_path, "sleep 0.3\nexit 3")
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            tick_task = asyncio.create_task(ticker())
+            exit_code = await async_run_pixinsight(binary, script, [], [], quiet=True)
+            tick_task.cancel()
+            return exit_code
+
+        assert asyncio.run(run()) == 3
+        assert len(ticks) > 5
+
+    def test_cancellation_kills_pixinsight(self, tmp_path):
+        """Test that cancelling the task terminates the subprocess."""
+        binary, script = _fake_pixinsight(tmp_path, "exec sleep 30")
+
+        async def run():
+            task = asyncio.create_task(
+                async_run_pixinsight(binary, script, [], [], quiet=True)
+            )
+            await asyncio.sleep(0.2)
+            start = time.monotonic()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return time.monotonic() - start
+
+        assert asyncio.run(run()) < 5
+
+    def test_missing_binary_raises(self, tmp_path):
+        """Test that a missing binary raises FileNotFoundError."""
+        _, script = _fake_pixinsight(tmp_path, "exit 0")
+
+        with pytest.raises(FileNotFoundError):
+            asyncio.run(async_run_pixinsight(str(tmp_path / "missing"), script, [], []))
+
+
+class TestAsyncExecutePlan:
+    """Tests for async_execute_plan function."""
+
+    @patch("ap_create_master.async_api.complete_run")
+    def test_completes_run_on_success(self, mock_complete, tmp_path):
+        """Test that a successful run records frames and writes headers."""
+        binary, script = _fake_pixinsight(tmp_path, "exit 0")
+        plan = RunPlan(script_paths=[script], processed_files=["bias1.fits"])
+
+        exit_code = asyncio.run(
+            async_execute_plan(plan, "in", binary, cache_dir="cache", quiet=True)
+        )
+
+        assert exit_code == 0
+        mock_complete.assert_called_once_with(plan, "in", "cache")
+
+    @patch("ap_create_master.async_api.complete_run")
+    def test_failed_run_is_not_completed(self, mock_complete, tmp_path):
+        """Test that a failing PixInsight run leaves the manifest alone."""
+        binary, script = _fake_pixinsight(tmp_path, "exit 1")
+        plan = RunPlan(script_paths=[script])
+
+        assert asyncio.run(async_execute_plan(plan, "in", binary, quiet=True)) == 1
+        mock_complete.assert_not_called()
+
+    @patch("ap_create_master.async_api.complete_run")
+    def test_runs_parallel_scripts_concurrently(self, mock_complete, tmp_path):
+        """Test that every script runs at once and failures are aggregated."""
+        # $2 is -n=<instance id>; instances must overlap to finish in time
+        binary, script = _fake_pixinsight(
+            tmp_path, 'sleep 0.5\n[ "$2" = "-n=8" ] && exit 2\nexit 0'
+        )
+        second = tmp_path / "20260115_2_calibrate_masters.js"
+        second.write_text("// script")
+        plan = RunPlan(script_paths=[script, str(second), script])
+
+        start = time.monotonic()
+        exit_code = asyncio.run(
+            async_execute_plan(plan, "in", binary, instance_id=7, quiet=True)
+        )
+
+        assert exit_code == 2
+        assert time.monotonic() - start < 1.4
+        mock_complete.assert_not_called()
+
+    @patch("ap_create_master.async_api.complete_run")
+    def test_failed_script_stops_its_dependents(self, mock_complete, tmp_path):
+        """Test that no script starts after a script fails."""
+        runs = tmp_path / "runs.txt"
+        binary, script = _fake_pixinsight(tmp_path, f'echo "$2" >> {runs}\nexit 3')
+        plan = RunPlan(
+            script_paths=[script, script],
+            script_waves=[0, 1],
+            script_dependencies=[[], [0]],
+        )
+
+        exit_code = asyncio.run(
+            async_execute_plan(plan, "in", binary, instance_id=7, quiet=True)
+        )
+
+        assert exit_code == 3
+        assert runs.read_text().split() == ["-n=7"]
+        mock_complete.assert_not_called()
+
+    @patch("ap_create_master.async_api.complete_run")
+    def test_dependent_script_starts_when_its_masters_exist(
+        self, mock_complete, tmp_path
+    ):
+        """Test that a flat script does not wait for unrelated scripts."""
+        runs = tmp_path / "runs.txt"
+        binary, script = _fake_pixinsight(
+            tmp_path,
+            f'echo "start $2" >> {runs}\n'
+            f'[ "$2" = "-n=8" ] && sleep 0.5\n'
+            f'echo "end $2" >> {runs}',
+        )
+        plan = RunPlan(
+            script_paths=[script, script, script],
+            script_waves=[0, 0, 1],
+            script_dependencies=[[], [], [0]],
+            max_running=2,
+        )
+
+        exit_code = asyncio.run(
+            async_execute_plan(plan, "in", binary, instance_id=7, quiet=True)
+        )
+
+        assert exit_code == 0
+        events = runs.read_text().splitlines()
+        assert events.index("start -n=9") > events.index("end -n=7")
+        assert events.index("start -n=9") < events.index("end -n=8")
+        mock_complete.assert_called_once()
+
+    def test_plan_without_script_raises(self):
+        """Test that a plan without a script is rejected."""
+        with pytest.raises(ValueError):
+            asyncio.run(async_execute_plan(RunPlan(), "in", "PixInsight"))
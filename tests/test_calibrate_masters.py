@@ -14,26 +14,38 @@ from xisf import XISF
 import ap_common
 from ap_create_master import config
 from ap_create_master.calibrate_masters import (
+    RunPlan,
     generate_masters,
+    select_touched_groups,
     write_master_imagetyp_headers,
 )
+from ap_create_master.grouping import FrameRecord
+from ap_create_master.master_matching import MasterMatch
+from ap_create_master.script_generator import load_script_manifest
+
+
+def _fixed_matches(bias=None, dark=None):
+    """Build a match_masters_for_groups stand-in returning fixed masters."""
+
+    def match(groups, *args, **kwargs):
+        return {key: MasterMatch(bias=bias, dark=dark) for key in groups}
+
+    return match
 
 
 class TestGenerateMasters:
     """Tests for generate_masters function."""
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_generates_script_for_bias_frames(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that script is generated for bias frames."""
@@ -42,7 +54,7 @@ class TestGenerateMasters:
         os.makedirs(input_dir, exist_ok=True)
 
         # Mock file discovery
-        mock_get_filtered.return_value = {
+        mock_iter_headers.return_value = {
             "bias1.fits": {
                 config.NORMALIZED_HEADER_TYPE: "bias",
                 config.NORMALIZED_HEADER_CAMERA: "ATR585M",
@@ -59,21 +71,7 @@ class TestGenerateMasters:
                 config.NORMALIZED_HEADER_OFFSET: "150",
                 config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
             },
-        }
-
-        # Mock grouping
-        mock_group_files.return_value = {
-            ("bias", "ATR585M", "-10.00", "239", "150", "Low Conversion Gain"): [
-                {
-                    "path": "bias1.fits",
-                    "headers": mock_get_filtered.return_value["bias1.fits"],
-                },
-                {
-                    "path": "bias2.fits",
-                    "headers": mock_get_filtered.return_value["bias2.fits"],
-                },
-            ]
-        }
+        }.items()
 
         # Mock metadata extraction
         mock_get_metadata.return_value = {
@@ -87,24 +85,23 @@ class TestGenerateMasters:
         # Mock script generation
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         assert scripts[0].endswith("calibrate_masters.js")
         mock_generate_script.assert_called_once()
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_handles_no_files_gracefully(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that function handles case with no calibration files."""
@@ -113,25 +110,24 @@ class TestGenerateMasters:
         os.makedirs(input_dir, exist_ok=True)
 
         # Mock empty file discovery
-        mock_get_filtered.return_value = {}
+        mock_iter_headers.return_value = []
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert scripts == []
         mock_generate_script.assert_not_called()
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_finds_masters_for_flats(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that function finds matching masters for flat calibration."""
@@ -142,7 +138,7 @@ class TestGenerateMasters:
         os.makedirs(input_dir, exist_ok=True)
 
         # Mock flat file discovery
-        mock_get_filtered.return_value = {
+        mock_iter_headers.return_value = {
             "flat1.fits": {
                 config.NORMALIZED_HEADER_TYPE: "flat",
                 config.NORMALIZED_HEADER_CAMERA: "ATR585M",
@@ -154,26 +150,7 @@ class TestGenerateMasters:
                 config.NORMALIZED_HEADER_FILTER: "B",
                 config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5",
             }
-        }
-
-        # Mock grouping
-        mock_group_files.return_value = {
-            (
-                "flat",
-                "ATR585M",
-                "-10.00",
-                "239",
-                "150",
-                "Low Conversion Gain",
-                "2026-01-15",
-                "B",
-            ): [
-                {
-                    "path": "flat1.fits",
-                    "headers": mock_get_filtered.return_value["flat1.fits"],
-                }
-            ]
-        }
+        }.items()
 
         # Mock metadata extraction
         mock_get_metadata.return_value = {
@@ -187,32 +164,30 @@ class TestGenerateMasters:
         }
 
         # Mock master finding
-        mock_find_master.side_effect = [
-            "bias_master.xisf",  # For bias
-            "dark_master.xisf",  # For dark
-        ]
+        mock_find_master.side_effect = _fixed_matches(
+            "bias_master.xisf", "dark_master.xisf"
+        )
 
         # Mock script generation
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
-            input_dir, output_dir, bias_master_dir, dark_master_dir
-        )
+        plan = generate_masters(input_dir, output_dir, bias_master_dir, dark_master_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
-        # Should have called find_matching_master_for_flat for both bias and dark
-        assert mock_find_master.call_count == 2
+        # All flat groups are matched in one call against both libraries
+        mock_find_master.assert_called_once()
+        assert mock_find_master.call_args[0][1:] == (bias_master_dir, dark_master_dir)
+        assert plan.flat_groups[0][2:] == ("bias_master.xisf", "dark_master.xisf")
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_uses_custom_script_output_dir(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that custom script_output_dir is used when provided."""
@@ -221,7 +196,7 @@ class TestGenerateMasters:
         custom_script_dir = str(tmp_path / "custom_scripts")
         os.makedirs(input_dir, exist_ok=True)
 
-        mock_get_filtered.return_value = {
+        mock_iter_headers.return_value = {
             "bias1.fits": {
                 config.NORMALIZED_HEADER_TYPE: "bias",
                 config.NORMALIZED_HEADER_CAMERA: "ATR585M",
@@ -230,16 +205,7 @@ class TestGenerateMasters:
                 config.NORMALIZED_HEADER_OFFSET: "150",
                 config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
             }
-        }
-
-        mock_group_files.return_value = {
-            ("bias", "ATR585M", "-10.00", "239", "150", "Low Conversion Gain"): [
-                {
-                    "path": "bias1.fits",
-                    "headers": mock_get_filtered.return_value["bias1.fits"],
-                }
-            ]
-        }
+        }.items()
 
         mock_get_metadata.return_value = {
             config.NORMALIZED_HEADER_CAMERA: "ATR585M",
@@ -251,9 +217,10 @@ class TestGenerateMasters:
 
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
+        plan = generate_masters(
             input_dir, output_dir, script_output_dir=custom_script_dir
         )
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         # Script should be in custom directory, not default output_dir/scripts
@@ -262,49 +229,248 @@ class TestGenerateMasters:
         # Verify custom directory was created
         assert Path(custom_script_dir).exists()
 
-    @patch("ap_common.get_filtered_metadata")
-    def test_handles_ap_common_exception_gracefully(
-        self, mock_get_filtered, tmp_path, caplog
+    @patch("ap_create_master.discovery.iter_headers")
+    @patch("ap_create_master.calibrate_masters.get_group_metadata")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
+    def test_script_manifest_writes_driver_and_manifest(
+        self,
+        mock_generate_script,
+        mock_get_metadata,
+        mock_iter_headers,
+        tmp_path,
     ):
-        """Test that exceptions from ap-common are handled gracefully."""
+        """Test that manifest mode runs the driver with the manifest as argument."""
         input_dir = str(tmp_path / "input")
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        # Simulate ap-common failure for one frame type
-        def side_effect(*args, **kwargs):
-            frame_type = (
-                kwargs.get("filters", {}).get(config.NORMALIZED_HEADER_TYPE, "").lower()
-            )
-            if frame_type == "dark":
-                raise PermissionError("Access denied to directory")
-            return {}
+        metadata = {
+            config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+            config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+            config.NORMALIZED_HEADER_GAIN: "239",
+            config.NORMALIZED_HEADER_OFFSET: "150",
+            config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+        }
+        mock_iter_headers.return_value = {
+            "bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias", **metadata}
+        }.items()
+        mock_get_metadata.return_value = metadata
+
+        plan = generate_masters(input_dir, output_dir, script_manifest=True)
+
+        assert len(plan.script_paths) == 1
+        assert plan.script_paths[0].endswith("calibrate_masters_driver.js")
+        assert len(plan.script_args) == 1
+        assert plan.script_args[0][0].endswith("_calibrate_masters.json")
+        manifest = load_script_manifest(plan.script_args[0][0])
+        assert manifest["bias"][0]["images"] == ["bias1.fits"]
+        assert Path(plan.script_paths[0]).exists()
+        mock_generate_script.assert_not_called()
+
+    @patch("ap_create_master.discovery.iter_headers")
+    @patch("ap_create_master.calibrate_masters.get_group_metadata")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
+    def test_parallel_instances_write_one_script_per_shard(
+        self,
+        mock_generate_script,
+        mock_get_metadata,
+        mock_iter_headers,
+        tmp_path,
+    ):
+        """Test that groups are split into numbered scripts and logs."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        os.makedirs(input_dir, exist_ok=True)
+
+        headers = {}
+        for gain in ("100", "200", "300"):
+            headers[f"bias_{gain}.fits"] = {
+                config.NORMALIZED_HEADER_TYPE: "bias",
+                config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+                config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+                config.NORMALIZED_HEADER_GAIN: gain,
+                config.NORMALIZED_HEADER_OFFSET: "150",
+                config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+            }
+        mock_iter_headers.return_value = headers.items()
+        mock_get_metadata.side_effect = lambda frame_headers, frame_type: {
+            key: value
+            for key, value in frame_headers.items()
+            if key != config.NORMALIZED_HEADER_TYPE
+        }
+        mock_generate_script.return_value = ["// Generated script"]
+
+        plan = generate_masters(
+            input_dir, output_dir, timestamp="20260115", parallel_instances=2
+        )
 
-        mock_get_filtered.side_effect = side_effect
+        assert [Path(script).name for script in plan.script_paths] == [
+            "20260115_1_calibrate_masters.js",
+            "20260115_2_calibrate_masters.js",
+        ]
+        assert plan.script_args == [[], []]
+        log_files = [call.args[4] for call in mock_generate_script.call_args_list]
+        assert [Path(log).name for log in log_files] == [
+            "20260115_1.log",
+            "20260115_2.log",
+        ]
+        shard_sizes = [
+            len(call.args[1]) for call in mock_generate_script.call_args_list
+        ]
+        assert sorted(shard_sizes) == [1, 2]
+        assert len(plan.expected_master_files) == 3
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_memory_budget_sets_script_stack_sizes(self, mock_iter_headers, tmp_path):
+        """Test that each script gets its share of the memory budget."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        os.makedirs(input_dir, exist_ok=True)
 
-        # Should still complete successfully, just with no dark files
+        headers = {}
+        for gain in ("100", "200"):
+            headers[f"bias_{gain}.fits"] = {
+                config.NORMALIZED_HEADER_TYPE: "bias",
+                config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+                config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+                config.NORMALIZED_HEADER_GAIN: gain,
+                config.NORMALIZED_HEADER_OFFSET: "150",
+                config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+            }
+        # The second frame's size is unknown and assumed as large as the first
+        headers["bias_100.fits"].update(naxis1=1024, naxis2=1024, bitpix=16)
+        mock_iter_headers.return_value = headers.items()
+
+        plan = generate_masters(
+            input_dir,
+            output_dir,
+            parallel_instances=2,
+            memory_budget=16 * 2**20,
+        )
+
+        assert len(plan.script_paths) == 2
+        for script_path in plan.script_paths:
+            script = Path(script_path).read_text(encoding="utf-8")
+            assert "INTEGRATION_MEMORY.stackSizeMB = 8;" in script
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_flats_use_bias_masters_created_in_the_same_run(
+        self, mock_iter_headers, tmp_path
+    ):
+        """Test that a new bias master calibrates flats without a library."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        os.makedirs(input_dir, exist_ok=True)
+
+        instrument = {
+            config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+            config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+            config.NORMALIZED_HEADER_GAIN: "239",
+            config.NORMALIZED_HEADER_OFFSET: "150",
+            config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+        }
+        flat = {
+            config.NORMALIZED_HEADER_TYPE: "flat",
+            **instrument,
+            config.NORMALIZED_HEADER_DATE: "2026-01-15",
+            config.NORMALIZED_HEADER_FILTER: "L",
+            config.NORMALIZED_HEADER_EXPOSURESECONDS: "2.0",
+        }
+        headers = {
+            "bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias", **instrument},
+            "flat1.fits": flat,
+        }
+
+        mock_iter_headers.return_value = headers.items()
+        plan = generate_masters(input_dir, output_dir)
+
+        bias_master = plan.master_files[0][0]
+        assert plan.flat_groups[0][2] == bias_master
+        assert plan.flat_groups[0][3] is None
+        assert len(plan.calibrated_files) == 1
+        script = Path(plan.script_paths[0]).read_text(encoding="utf-8")
+        assert script.index("Creating Calibration Masters") < script.index(
+            "calibrateFlats({"
+        )
+
+        mock_iter_headers.return_value = headers.items()
+        plan = generate_masters(input_dir, output_dir, use_run_masters=False)
+
+        assert plan.flat_groups[0][2:] == (None, None)
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_parallel_flats_wait_for_run_masters(self, mock_iter_headers, tmp_path):
+        """Test that flats calibrated with run masters wait for their script."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        os.makedirs(input_dir, exist_ok=True)
+
+        instrument = {
+            config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+            config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+            config.NORMALIZED_HEADER_GAIN: "239",
+            config.NORMALIZED_HEADER_OFFSET: "150",
+            config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+        }
+        headers = {"bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias", **instrument}}
+        for flt in ("L", "R"):
+            headers[f"flat_{flt}.fits"] = {
+                config.NORMALIZED_HEADER_TYPE: "flat",
+                **instrument,
+                config.NORMALIZED_HEADER_DATE: "2026-01-15",
+                config.NORMALIZED_HEADER_FILTER: flt,
+                config.NORMALIZED_HEADER_EXPOSURESECONDS: "2.0",
+            }
+        mock_iter_headers.return_value = headers.items()
+
+        plan = generate_masters(
+            input_dir, output_dir, timestamp="20260115", parallel_instances=2
+        )
+
+        bias_master = Path(plan.master_files[0][0])
+        assert plan.script_waves == [0, 1, 1]
+        assert plan.script_dependencies == [[], [0], [0]]
+        assert plan.max_running == 2
+        assert plan.expected_master_files[0] == bias_master
+        for script_path in plan.script_paths[1:]:
+            script = Path(script_path).read_text(encoding="utf-8")
+            assert "Creating Calibration Masters" not in script
+            assert f'masterBias: "{bias_master.as_posix()}"' in script
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_handles_discovery_exception_gracefully(
+        self, mock_iter_headers, tmp_path, caplog
+    ):
+        """Test that discovery exceptions are handled gracefully."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        os.makedirs(input_dir, exist_ok=True)
+
+        # Simulate a failure during the discovery pass
+        mock_iter_headers.side_effect = PermissionError("Access denied to directory")
+
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
+
+        # Should still complete successfully, just with no files
         assert scripts == []
         # Should log warning about failed discovery
         assert any(
-            "Failed to discover dark files" in record.message
+            "Failed to discover calibration files" in record.message
             and record.levelname == "WARNING"
             for record in caplog.records
         )
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_handles_invalid_exposure_time_in_flats(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that invalid exposure times in flat headers are handled gracefully."""
@@ -314,7 +480,7 @@ class TestGenerateMasters:
         os.makedirs(input_dir, exist_ok=True)
 
         # Flat with invalid exposure time (non-numeric string)
-        mock_get_filtered.return_value = {
+        mock_iter_headers.return_value = {
             "flat1.fits": {
                 config.NORMALIZED_HEADER_TYPE: "flat",
                 config.NORMALIZED_HEADER_CAMERA: "ATR585M",
@@ -337,29 +503,7 @@ class TestGenerateMasters:
                 config.NORMALIZED_HEADER_FILTER: "B",
                 config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5",  # Valid
             },
-        }
-
-        mock_group_files.return_value = {
-            (
-                "flat",
-                "ATR585M",
-                "-10.00",
-                "239",
-                "150",
-                "Low Conversion Gain",
-                "2026-01-15",
-                "B",
-            ): [
-                {
-                    "path": "flat1.fits",
-                    "headers": mock_get_filtered.return_value["flat1.fits"],
-                },
-                {
-                    "path": "flat2.fits",
-                    "headers": mock_get_filtered.return_value["flat2.fits"],
-                },
-            ]
-        }
+        }.items()
 
         mock_get_metadata.return_value = {
             config.NORMALIZED_HEADER_CAMERA: "ATR585M",
@@ -371,22 +515,20 @@ class TestGenerateMasters:
             config.NORMALIZED_HEADER_FILTER: "B",
         }
 
-        mock_find_master.return_value = "dark_master.xisf"
+        mock_find_master.side_effect = _fixed_matches(dark="dark_master.xisf")
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
-            input_dir, output_dir, dark_master_dir=dark_master_dir
-        )
+        plan = generate_masters(input_dir, output_dir, dark_master_dir=dark_master_dir)
+        scripts = plan.script_paths
 
         # Should still generate script successfully
         assert len(scripts) == 1
-        # Should have called find_matching_master_for_flat
-        # with valid exposure time (1.5)
+        # Should have matched the group with valid exposure time (1.5)
         # Invalid exposure should be skipped
         assert mock_find_master.call_count == 1
-        call_args = mock_find_master.call_args
-        # flat_exposure_times is the 4th positional argument (index 0, 1, 2, 3)
-        assert call_args[0][3] == [1.5]  # Only valid exposure included
+        groups = mock_find_master.call_args[0][0]
+        # Each group is passed as (representative headers, exposure times)
+        assert [exposures for _, exposures in groups.values()] == [[1.5]]
 
 
 class TestWriteMasterImagetypHeaders:
@@ -553,3 +695,76 @@ class TestWriteMasterImagetypHeaders:
         header_key = ap_common.denormalize_header(config.NORMALIZED_HEADER_TYPE)
         comment = image_metadata["FITSKeywords"][header_key][0]["comment"]
         assert "master" in comment.lower() or "calibration" in comment.lower()
+
+
+class TestSelectTouchedGroups:
+    """Tests for select_touched_groups function."""
+
+    GROUPS = {
+        ("B",): [
+            FrameRecord("flat_b1.fits", "flat", ("B",)),
+            FrameRecord("flat_b2.fits", "flat", ("B",)),
+        ],
+        ("R",): [FrameRecord("flat_r1.fits", "flat", ("R",))],
+    }
+
+    def test_keeps_all_groups_without_new_paths(self):
+        """Test that a full (non-incremental) run keeps every group."""
+        assert select_touched_groups(self.GROUPS, None) is self.GROUPS
+
+    def test_keeps_touched_groups_with_all_files(self):
+        """Test that a touched group keeps its old and new files."""
+        selected = select_touched_groups(self.GROUPS, {"flat_b2.fits"})
+
+        assert list(selected) == [("B",)]
+        assert len(selected[("B",)]) == 2
+
+    def test_no_new_paths_selects_nothing(self):
+        """Test that nothing is rebuilt when no file is new."""
+        assert select_touched_groups(self.GROUPS, set()) == {}
+
+
+class TestRunPlanReadyScripts:
+    """Tests for RunPlan.ready_scripts method."""
+
+    @staticmethod
+    def _plan(**kwargs):
+        return RunPlan(
+            script_paths=[f"run_{n}_calibrate_masters.js" for n in range(4)], **kwargs
+        )
+
+    def test_scripts_wait_only_for_their_dependencies(self):
+        """Test that a script starts once the scripts it needs finished."""
+        plan = self._plan(script_dependencies=[[], [], [0], [0, 1]])
+
+        assert plan.ready_scripts(set(), set()) == [0, 1]
+        assert plan.ready_scripts({0, 1}, {0}) == [2]
+        assert plan.ready_scripts({0, 1, 2}, {0, 1}) == [3]
+
+    def test_running_scripts_are_limited(self):
+        """Test that no more than max_running scripts run at once."""
+        plan = self._plan(max_running=2)
+
+        assert plan.ready_scripts(set(), set()) == [0, 1]
+        assert plan.ready_scripts({0, 1}, set()) == []
+        assert plan.ready_scripts({0, 1}, {1}) == [2]
+
+    def test_stack_sizes_stay_within_the_memory_budget(self):
+        """Test that a script waits until running scripts leave room."""
+        plan = self._plan(
+            script_stack_sizes=[6, 2, 4, 4],
+            script_dependencies=[[], [], [1], [1]],
+            memory_budget_mb=8,
+        )
+
+        assert plan.ready_scripts(set(), set()) == [0, 1]
+        # Script 1 finished, but script 0 still holds 6 of the 8 MiB
+        assert plan.ready_scripts({0, 1}, {1}) == []
+        assert plan.ready_scripts({0, 1}, {0, 1}) == [2, 3]
+
+    def test_oversized_script_runs_alone(self):
+        """Test that a script larger than the budget still runs by itself."""
+        plan = RunPlan(script_paths=["run.js"], script_stack_sizes=[16])
+        plan.memory_budget_mb = 8
+
+        assert plan.ready_scripts(set(), set()) == [0]
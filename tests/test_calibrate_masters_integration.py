@@ -12,22 +12,55 @@ from unittest.mock import patch, MagicMock
 import pytest
 
 from ap_create_master import config
-from ap_create_master.calibrate_masters import generate_masters, main
+from ap_create_master.calibrate_masters import (
+    RunPlan,
+    generate_masters,
+    main,
+    record_processed_files,
+)
+from ap_create_master.master_matching import MasterMatch
+
+
+def _frame_headers(frame_type, **overrides):
+    """Build normalized headers with every required keyword for frame_type."""
+    headers = {
+        config.NORMALIZED_HEADER_TYPE: frame_type,
+        config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+        config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+        config.NORMALIZED_HEADER_GAIN: "239",
+        config.NORMALIZED_HEADER_OFFSET: "150",
+        config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+    }
+    if frame_type == "dark":
+        headers[config.NORMALIZED_HEADER_EXPOSURESECONDS] = "60.0"
+    if frame_type == "flat":
+        headers[config.NORMALIZED_HEADER_FILTER] = "B"
+        headers[config.NORMALIZED_HEADER_DATE] = "2026-01-15"
+        headers[config.NORMALIZED_HEADER_EXPOSURESECONDS] = "1.5"
+    headers.update(overrides)
+    return headers
+
+
+def _fixed_matches(bias=None, dark=None):
+    """Build a match_masters_for_groups stand-in returning fixed masters."""
+
+    def match(groups, *args, **kwargs):
+        return {key: MasterMatch(bias=bias, dark=dark) for key in groups}
+
+    return match
 
 
 class TestRealWorldWorkflows:
     """Test real-world usage scenarios."""
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_darks_only(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating dark masters only."""
@@ -35,38 +68,8 @@ class TestRealWorldWorkflows:
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        # Mock dark file discovery only
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "DARK":
-                return {
-                    "dark1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "dark",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
-                        config.NORMALIZED_HEADER_CAMERA: "ATR585M",
-                        config.NORMALIZED_HEADER_SETTEMP: "-10.00",
-                        config.NORMALIZED_HEADER_GAIN: "239",
-                        config.NORMALIZED_HEADER_OFFSET: "150",
-                        config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
-                    }
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-
-        mock_group_files.return_value = {
-            (
-                "dark",
-                "60.0",
-                "-10.00",
-                "239",
-                "150",
-                "ATR585M",
-                "Low Conversion Gain",
-            ): [{"path": "dark1.fits", "headers": {}}]
-        }
+        # Mock dark file discovery only (single discovery pass)
+        mock_iter_headers.return_value = {"dark1.fits": _frame_headers("dark")}.items()
 
         mock_get_metadata.return_value = {
             config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
@@ -79,7 +82,8 @@ class TestRealWorldWorkflows:
 
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         # Verify script generation was called with empty bias and flat lists
@@ -88,16 +92,14 @@ class TestRealWorldWorkflows:
         assert len(call_args[0][2]) == 1  # dark_groups
         assert call_args[0][3] == []  # flat_groups
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_bias_and_darks(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating bias and dark masters together."""
@@ -105,32 +107,11 @@ class TestRealWorldWorkflows:
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        # Mock both bias and dark discovery
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "BIAS":
-                return {"bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias"}}
-            elif frame_type == "DARK":
-                return {
-                    "dark1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "dark",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
-                    }
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-
-        def group_side_effect(files, frame_type):
-            if frame_type == "bias":
-                return {("bias",): [{"path": "bias1.fits", "headers": {}}]}
-            elif frame_type == "dark":
-                return {("dark", "60.0"): [{"path": "dark1.fits", "headers": {}}]}
-            return {}
-
-        mock_group_files.side_effect = group_side_effect
+        # Mock both bias and dark discovery (single discovery pass)
+        mock_iter_headers.return_value = {
+            "bias1.fits": _frame_headers("bias"),
+            "dark1.fits": _frame_headers("dark"),
+        }.items()
 
         mock_get_metadata.side_effect = [
             {config.NORMALIZED_HEADER_CAMERA: "ATR585M"},  # bias metadata
@@ -142,7 +123,8 @@ class TestRealWorldWorkflows:
 
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         # Verify both bias and dark groups were passed
@@ -151,18 +133,16 @@ class TestRealWorldWorkflows:
         assert len(call_args[0][2]) == 1  # dark_groups
         assert call_args[0][3] == []  # flat_groups
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_all_three_frame_types(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating bias, dark, and flat masters together."""
@@ -172,52 +152,12 @@ class TestRealWorldWorkflows:
         dark_master_dir = str(tmp_path / "dark_masters")
         os.makedirs(input_dir, exist_ok=True)
 
-        # Mock all three frame types
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "BIAS":
-                return {"bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias"}}
-            elif frame_type == "DARK":
-                return {
-                    "dark1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "dark",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
-                    }
-                }
-            elif frame_type == "FLAT":
-                return {
-                    "flat1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "flat",
-                        config.NORMALIZED_HEADER_FILTER: "B",
-                        config.NORMALIZED_HEADER_DATE: "2026-01-15",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5",
-                    }
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-
-        def group_side_effect(files, frame_type):
-            if frame_type == "bias":
-                return {("bias",): [{"path": "bias1.fits", "headers": {}}]}
-            elif frame_type == "dark":
-                return {("dark", "60.0"): [{"path": "dark1.fits", "headers": {}}]}
-            elif frame_type == "flat":
-                return {
-                    ("flat", "B", "2026-01-15"): [
-                        {
-                            "path": "flat1.fits",
-                            "headers": {
-                                config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5"
-                            },
-                        }
-                    ]
-                }
-            return {}
-
-        mock_group_files.side_effect = group_side_effect
+        # Mock all three frame types (single discovery pass)
+        mock_iter_headers.return_value = {
+            "bias1.fits": _frame_headers("bias"),
+            "dark1.fits": _frame_headers("dark"),
+            "flat1.fits": _frame_headers("flat"),
+        }.items()
 
         mock_get_metadata.side_effect = [
             {config.NORMALIZED_HEADER_CAMERA: "ATR585M"},  # bias metadata
@@ -228,12 +168,13 @@ class TestRealWorldWorkflows:
             },  # flat metadata
         ]
 
-        mock_find_master.side_effect = ["bias_master.xisf", "dark_master.xisf"]
+        mock_find_master.side_effect = _fixed_matches(
+            "bias_master.xisf", "dark_master.xisf"
+        )
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
-            input_dir, output_dir, bias_master_dir, dark_master_dir
-        )
+        plan = generate_masters(input_dir, output_dir, bias_master_dir, dark_master_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         # Verify all three frame types were processed
@@ -242,16 +183,14 @@ class TestRealWorldWorkflows:
         assert len(call_args[0][2]) == 1  # dark_groups
         assert len(call_args[0][3]) == 1  # flat_groups
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_multiple_dark_groups(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating darks with multiple exposure times."""
@@ -260,34 +199,15 @@ class TestRealWorldWorkflows:
         os.makedirs(input_dir, exist_ok=True)
 
         # Mock darks with different exposures
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "DARK":
-                return {
-                    "dark_60s.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "dark",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
-                    },
-                    "dark_120s.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "dark",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "120.0",
-                    },
-                    "dark_300s.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "dark",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "300.0",
-                    },
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-
-        mock_group_files.return_value = {
-            ("dark", "60.0"): [{"path": "dark_60s.fits", "headers": {}}],
-            ("dark", "120.0"): [{"path": "dark_120s.fits", "headers": {}}],
-            ("dark", "300.0"): [{"path": "dark_300s.fits", "headers": {}}],
-        }
+        mock_iter_headers.return_value = {
+            "dark_60s.fits": _frame_headers("dark"),
+            "dark_120s.fits": _frame_headers(
+                "dark", **{config.NORMALIZED_HEADER_EXPOSURESECONDS: "120.0"}
+            ),
+            "dark_300s.fits": _frame_headers(
+                "dark", **{config.NORMALIZED_HEADER_EXPOSURESECONDS: "300.0"}
+            ),
+        }.items()
 
         mock_get_metadata.side_effect = [
             {config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0"},
@@ -297,23 +217,22 @@ class TestRealWorldWorkflows:
 
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         # Verify three dark groups were created
         call_args = mock_generate_script.call_args
         assert len(call_args[0][2]) == 3  # dark_groups with 3 different exposures
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_bias_only(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating bias masters only."""
@@ -321,22 +240,12 @@ class TestRealWorldWorkflows:
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "BIAS":
-                return {"bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias"}}
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-        mock_group_files.return_value = {
-            ("bias",): [{"path": "bias1.fits", "headers": {}}]
-        }
+        mock_iter_headers.return_value = {"bias1.fits": _frame_headers("bias")}.items()
         mock_get_metadata.return_value = {config.NORMALIZED_HEADER_CAMERA: "ATR585M"}
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         call_args = mock_generate_script.call_args
@@ -344,18 +253,16 @@ class TestRealWorldWorkflows:
         assert len(call_args[0][2]) == 0  # no dark_groups
         assert len(call_args[0][3]) == 0  # no flat_groups
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_flats_only_with_masters(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating flat masters using existing bias/dark library."""
@@ -365,40 +272,18 @@ class TestRealWorldWorkflows:
         dark_master_dir = str(tmp_path / "dark_masters")
         os.makedirs(input_dir, exist_ok=True)
 
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "FLAT":
-                return {
-                    "flat1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "flat",
-                        config.NORMALIZED_HEADER_FILTER: "B",
-                        config.NORMALIZED_HEADER_DATE: "2026-01-15",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5",
-                    }
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-        mock_group_files.return_value = {
-            ("flat", "B", "2026-01-15"): [
-                {
-                    "path": "flat1.fits",
-                    "headers": {config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5"},
-                }
-            ]
-        }
+        mock_iter_headers.return_value = {"flat1.fits": _frame_headers("flat")}.items()
         mock_get_metadata.return_value = {
             config.NORMALIZED_HEADER_FILTER: "B",
             config.NORMALIZED_HEADER_DATE: "2026-01-15",
         }
-        mock_find_master.side_effect = ["bias_master.xisf", "dark_master.xisf"]
+        mock_find_master.side_effect = _fixed_matches(
+            "bias_master.xisf", "dark_master.xisf"
+        )
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
-            input_dir, output_dir, bias_master_dir, dark_master_dir
-        )
+        plan = generate_masters(input_dir, output_dir, bias_master_dir, dark_master_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         call_args = mock_generate_script.call_args
@@ -410,16 +295,14 @@ class TestRealWorldWorkflows:
         assert flat_group[2] == "bias_master.xisf"
         assert flat_group[3] == "dark_master.xisf"
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_flats_only_uncalibrated(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating flat masters without calibration (no bias/dark)."""
@@ -427,37 +310,15 @@ class TestRealWorldWorkflows:
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "FLAT":
-                return {
-                    "flat1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "flat",
-                        config.NORMALIZED_HEADER_FILTER: "B",
-                        config.NORMALIZED_HEADER_DATE: "2026-01-15",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5",
-                    }
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-        mock_group_files.return_value = {
-            ("flat", "B", "2026-01-15"): [
-                {
-                    "path": "flat1.fits",
-                    "headers": {config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5"},
-                }
-            ]
-        }
+        mock_iter_headers.return_value = {"flat1.fits": _frame_headers("flat")}.items()
         mock_get_metadata.return_value = {
             config.NORMALIZED_HEADER_FILTER: "B",
             config.NORMALIZED_HEADER_DATE: "2026-01-15",
         }
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         call_args = mock_generate_script.call_args
@@ -467,18 +328,16 @@ class TestRealWorldWorkflows:
         assert flat_group[2] is None  # no bias master
         assert flat_group[3] is None  # no dark master
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.find_matching_master_for_flat")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.match_masters_for_groups")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_workflow_bias_and_flats(
         self,
         mock_generate_script,
         mock_find_master,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test generating bias and flat masters together (using dark library)."""
@@ -488,42 +347,10 @@ class TestRealWorldWorkflows:
         dark_master_dir = str(tmp_path / "dark_masters")
         os.makedirs(input_dir, exist_ok=True)
 
-        def side_effect(*args, **kwargs):
-            frame_type = kwargs.get("filters", {}).get(
-                config.NORMALIZED_HEADER_TYPE, ""
-            )
-            if frame_type == "BIAS":
-                return {"bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias"}}
-            elif frame_type == "FLAT":
-                return {
-                    "flat1.fits": {
-                        config.NORMALIZED_HEADER_TYPE: "flat",
-                        config.NORMALIZED_HEADER_FILTER: "B",
-                        config.NORMALIZED_HEADER_DATE: "2026-01-15",
-                        config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5",
-                    }
-                }
-            return {}
-
-        mock_get_filtered.side_effect = side_effect
-
-        def group_side_effect(files, frame_type):
-            if frame_type == "bias":
-                return {("bias",): [{"path": "bias1.fits", "headers": {}}]}
-            elif frame_type == "flat":
-                return {
-                    ("flat", "B", "2026-01-15"): [
-                        {
-                            "path": "flat1.fits",
-                            "headers": {
-                                config.NORMALIZED_HEADER_EXPOSURESECONDS: "1.5"
-                            },
-                        }
-                    ]
-                }
-            return {}
-
-        mock_group_files.side_effect = group_side_effect
+        mock_iter_headers.return_value = {
+            "bias1.fits": _frame_headers("bias"),
+            "flat1.fits": _frame_headers("flat"),
+        }.items()
 
         mock_get_metadata.side_effect = [
             {config.NORMALIZED_HEADER_CAMERA: "ATR585M"},  # bias metadata
@@ -533,12 +360,13 @@ class TestRealWorldWorkflows:
             },  # flat metadata
         ]
 
-        mock_find_master.side_effect = ["bias_master.xisf", "dark_master.xisf"]
+        mock_find_master.side_effect = _fixed_matches(
+            "bias_master.xisf", "dark_master.xisf"
+        )
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
-            input_dir, output_dir, bias_master_dir, dark_master_dir
-        )
+        plan = generate_masters(input_dir, output_dir, bias_master_dir, dark_master_dir)
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         call_args = mock_generate_script.call_args
@@ -546,20 +374,245 @@ class TestRealWorldWorkflows:
         assert len(call_args[0][2]) == 0  # no dark_groups
         assert len(call_args[0][3]) == 1  # flat_groups
 
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_run_plan_contains_groups_and_expected_outputs(
+        self, mock_iter_headers, tmp_path
+    ):
+        """Test that the returned plan describes groups, masters and outputs."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        os.makedirs(input_dir, exist_ok=True)
+
+        mock_iter_headers.return_value = {
+            "bias1.fits": _frame_headers("bias"),
+            "flat1.fits": _frame_headers("flat"),
+            "flat2.fits": _frame_headers("flat"),
+        }.items()
+
+        with patch(
+            "ap_create_master.calibrate_masters.match_masters_for_groups",
+            side_effect=_fixed_matches("bias_master.xisf"),
+        ):
+            plan = generate_masters(
+                input_dir, output_dir, bias_master_dir=str(tmp_path / "lib")
+            )
+
+        assert len(plan.script_paths) == 1
+        assert len(plan.bias_groups) == 1
+        assert plan.dark_groups == []
+        assert len(plan.flat_groups) == 1
+        assert plan.flat_groups[0][2] == "bias_master.xisf"
+        assert [frame_type for _, frame_type in plan.master_files] == ["bias", "flat"]
+        assert plan.expected_master_files == [
+            Path(path) for path, _ in plan.master_files
+        ]
+        assert [p.name for p in plan.calibrated_files] == [
+            "flat1_c.xisf",
+            "flat2_c.xisf",
+        ]
+
+    @patch("ap_common.get_filtered_metadata")
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_master_libraries_scanned_once_for_all_flat_groups(
+        self, mock_iter_headers, mock_get_filtered_metadata, tmp_path
+    ):
+        """Test that bias/dark libraries are indexed once, not per flat group."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        bias_master_dir = tmp_path / "bias_masters"
+        dark_master_dir = tmp_path / "dark_masters"
+        for directory in [input_dir, bias_master_dir, dark_master_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+        mock_iter_headers.return_value = {
+            f"flat_{flt}.fits": _frame_headers(
+                "flat", **{config.NORMALIZED_HEADER_FILTER: flt}
+            )
+            for flt in ["B", "G", "R", "L"]
+        }.items()
+
+        def library_side_effect(dirs, filters, **kwargs):
+            if filters[config.NORMALIZED_HEADER_TYPE] == "MASTER BIAS":
+                return {"bias.xisf": _frame_headers("MASTER BIAS")}
+            return {"dark.xisf": _frame_headers("MASTER DARK")}
+
+        mock_get_filtered_metadata.side_effect = library_side_effect
+
+        plan = generate_masters(
+            input_dir, output_dir, str(bias_master_dir), str(dark_master_dir)
+        )
+
+        assert mock_get_filtered_metadata.call_count == 2
+        assert len(plan.flat_groups) == 4
+        assert all(group[2] == "bias.xisf" for group in plan.flat_groups)
+        assert all(group[3] == "dark.xisf" for group in plan.flat_groups)
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_incremental_run_rebuilds_only_touched_groups(
+        self, mock_iter_headers, tmp_path
+    ):
+        """Test that incremental runs only rebuild groups with new frames."""
+        input_dir = str(tmp_path / "input")
+        output_dir = str(tmp_path / "output")
+        cache_dir = str(tmp_path / "cache")
+        os.makedirs(input_dir, exist_ok=True)
+        blue = _frame_headers("flat")
+        red = _frame_headers("flat", **{config.NORMALIZED_HEADER_FILTER: "R"})
+        frames = {
+            "dark1.fits": _frame_headers("dark"),
+            "flat_b1.fits": blue,
+            "flat_r1.fits": red,
+        }
+
+        def run():
+            mock_iter_headers.return_value = list(frames.items())
+            return generate_masters(
+                input_dir, output_dir, cache_dir=cache_dir, incremental=True
+            )
+
+        first = run()
+        assert len(first.flat_groups) == 2
+        assert len(first.dark_groups) == 1
+        record_processed_files(cache_dir, input_dir, first.processed_files)
+
+        # Nothing new: nothing to rebuild
+        assert run().script_paths == []
+
+        # A new blue flat rebuilds only the blue group, with both frames
+        frames["flat_b2.fits"] = blue
+        second = run()
+        assert second.dark_groups == []
+        assert [group[1] for group in second.flat_groups] == [
+            ["flat_b1.fits", "flat_b2.fits"]
+        ]
+        assert second.processed_files == ["flat_b2.fits"]
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_columnar_grouping_engine_plans_the_same_groups(
+        self, mock_iter_headers, tmp_path
+    ):
+        """Test that both grouping engines produce the same plan."""
+        input_dir = str(tmp_path / "input")
+        os.makedirs(input_dir, exist_ok=True)
+
+        headers = {
+            "bias1.fits": _frame_headers("bias"),
+            "dark1.fits": _frame_headers("dark"),
+            "dark2.fits": _frame_headers(
+                "dark", **{config.NORMALIZED_HEADER_EXPOSURESECONDS: "300.0"}
+            ),
+            "dark3.fits": _frame_headers("dark"),
+            "flat1.fits": _frame_headers("flat"),
+            "flat2.fits": _frame_headers(
+                "flat", **{config.NORMALIZED_HEADER_FILTER: "R"}
+            ),
+        }
+
+        plans = {}
+        for engine in config.GROUPING_ENGINES:
+            mock_iter_headers.return_value = headers.items()
+            plans[engine] = generate_masters(
+                input_dir,
+                str(tmp_path / "output"),
+                timestamp="20260115_120000",
+                grouping_engine=engine,
+            )
+
+        streaming, columnar = plans["streaming"], plans["columnar"]
+        assert len(columnar.dark_groups) == 2
+        assert columnar.bias_groups == streaming.bias_groups
+        assert columnar.dark_groups == streaming.dark_groups
+        assert columnar.flat_groups == streaming.flat_groups
+
+    def test_unknown_grouping_engine_raises_error(self, tmp_path):
+        """Test that an unknown grouping engine is rejected."""
+        with pytest.raises(ValueError, match="Unknown grouping engine"):
+            generate_masters(
+                str(tmp_path / "input"),
+                str(tmp_path / "output"),
+                grouping_engine="hashed",
+            )
+
+    def test_incremental_requires_cache_dir(self, tmp_path):
+        """Test that incremental mode without a cache directory is rejected."""
+        with pytest.raises(ValueError):
+            generate_masters(
+                str(tmp_path / "input"), str(tmp_path / "output"), incremental=True
+            )
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_discovery_skips_output_tree_and_pruned_directories(
+        self, mock_read_frame_headers, tmp_path
+    ):
+        """Test that output under input_dir and excluded dirs are never read."""
+        input_dir = tmp_path / "session"
+        output_dir = input_dir / "processed"
+        for name in [
+            "BIAS/bias1.fits",
+            "LIGHT/light1.fits",
+            "processed/master/old_master.fits",
+            "processed/calibrated/flat1_c.fits",
+            "processed/cache/frame.fits",
+        ]:
+            (input_dir / name).parent.mkdir(parents=True, exist_ok=True)
+            (input_dir / name).write_bytes(b"")
+        mock_read_frame_headers.return_value = _frame_headers("bias")
+
+        plan = generate_masters(
+            str(input_dir),
+            str(output_dir),
+            cache_dir=str(output_dir / "cache"),
+            dryrun=True,
+            quiet=True,
+            exclude=["light*"],
+        )
+
+        read_paths = [call.args[0] for call in mock_read_frame_headers.call_args_list]
+        assert read_paths == [str(input_dir / "BIAS" / "bias1.fits")]
+        assert plan.processed_files == read_paths
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_dryrun_never_writes_the_cache(self, mock_read_frame_headers, tmp_path):
+        """Test that a dry run reads an existing cache but never writes one."""
+        input_dir = tmp_path / "input"
+        (input_dir / "BIAS").mkdir(parents=True)
+        (input_dir / "BIAS" / "bias1.fits").write_bytes(b"")
+        cache_dir = tmp_path / "cache"
+        mock_read_frame_headers.return_value = _frame_headers("bias")
+        kwargs = dict(cache_dir=str(cache_dir), quiet=True, incremental=True)
+
+        dry = generate_masters(
+            str(input_dir), str(tmp_path / "output"), dryrun=True, **kwargs
+        )
+
+        assert not cache_dir.exists()
+        assert len(dry.bias_groups) == 1
+
+        generate_masters(str(input_dir), str(tmp_path / "output"), **kwargs)
+        cached = {path: path.stat().st_mtime_ns for path in cache_dir.iterdir()}
+        (input_dir / "BIAS" / "bias2.fits").write_bytes(b"")
+        mock_read_frame_headers.reset_mock()
+
+        generate_masters(
+            str(input_dir), str(tmp_path / "output"), dryrun=True, **kwargs
+        )
+
+        # Only the new file is read; the cache files are left untouched
+        assert mock_read_frame_headers.call_count == 1
+        assert {p: p.stat().st_mtime_ns for p in cache_dir.iterdir()} == cached
+
 
 class TestOutputStructure:
     """Test output directory structure and file naming."""
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_creates_correct_directory_structure(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that correct output directories are created."""
@@ -567,16 +620,12 @@ class TestOutputStructure:
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        mock_get_filtered.return_value = {
-            "bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias"}
-        }
-        mock_group_files.return_value = {
-            ("bias",): [{"path": "bias1.fits", "headers": {}}]
-        }
+        mock_iter_headers.return_value = {"bias1.fits": _frame_headers("bias")}.items()
         mock_get_metadata.return_value = {config.NORMALIZED_HEADER_CAMERA: "ATR585M"}
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(input_dir, output_dir)
+        plan = generate_masters(input_dir, output_dir)
+        scripts = plan.script_paths
 
         # Verify directory structure
         output_path = Path(output_dir)
@@ -588,16 +637,14 @@ class TestOutputStructure:
         assert "logs" in scripts[0]
         assert scripts[0].endswith("calibrate_masters.js")
 
-    @patch("ap_common.get_filtered_metadata")
-    @patch("ap_create_master.calibrate_masters.group_files")
+    @patch("ap_create_master.discovery.iter_headers")
     @patch("ap_create_master.calibrate_masters.get_group_metadata")
-    @patch("ap_create_master.calibrate_masters.generate_combined_script")
+    @patch("ap_create_master.calibrate_masters.stream_combined_script")
     def test_script_and_log_have_matching_timestamps(
         self,
         mock_generate_script,
         mock_get_metadata,
-        mock_group_files,
-        mock_get_filtered,
+        mock_iter_headers,
         tmp_path,
     ):
         """Test that script and log file have matching timestamps."""
@@ -605,18 +652,12 @@ class TestOutputStructure:
         output_dir = str(tmp_path / "output")
         os.makedirs(input_dir, exist_ok=True)
 
-        mock_get_filtered.return_value = {
-            "bias1.fits": {config.NORMALIZED_HEADER_TYPE: "bias"}
-        }
-        mock_group_files.return_value = {
-            ("bias",): [{"path": "bias1.fits", "headers": {}}]
-        }
+        mock_iter_headers.return_value = {"bias1.fits": _frame_headers("bias")}.items()
         mock_get_metadata.return_value = {config.NORMALIZED_HEADER_CAMERA: "ATR585M"}
         mock_generate_script.return_value = "// Generated script"
 
-        scripts, _ = generate_masters(
-            input_dir, output_dir, timestamp="20260127_120000"
-        )
+        plan = generate_masters(input_dir, output_dir, timestamp="20260127_120000")
+        scripts = plan.script_paths
 
         assert len(scripts) == 1
         script_path = Path(scripts[0])
@@ -625,7 +666,7 @@ class TestOutputStructure:
         assert script_path.name.startswith("20260127_120000")
         assert "_calibrate_masters.js" in script_path.name
 
-        # Log file path should be passed to generate_combined_script
+        # Log file path should be passed to stream_combined_script
         call_args = mock_generate_script.call_args
         log_file_arg = call_args[0][4]  # 5th positional argument is log_file
         assert "20260127_120000.log" in log_file_arg
@@ -638,7 +679,7 @@ class TestCLI:
     @patch("ap_create_master.calibrate_masters.run_pixinsight")
     def test_cli_script_only_mode(self, mock_run_pi, mock_generate, capsys):
         """Test --script-only flag skips PixInsight execution."""
-        mock_generate.return_value = (["/tmp/script.js"], [])
+        mock_generate.return_value = RunPlan(script_paths=["/tmp/script.js"])
 
         test_args = [
             "ap-create-master",
@@ -657,7 +698,7 @@ class TestCLI:
     @patch("ap_create_master.calibrate_masters.generate_masters")
     def test_cli_requires_pixinsight_binary_for_execution(self, mock_generate, capsys):
         """Test that --pixinsight-binary is required without --script-only."""
-        mock_generate.return_value = (["/tmp/script.js"], [])
+        mock_generate.return_value = RunPlan(script_paths=["/tmp/script.js"])
 
         test_args = [
             "ap-create-master",
@@ -681,7 +722,7 @@ class TestCLI:
     ):
         """Test that PixInsight is executed when binary is provided."""
         script_path = str(tmp_path / "logs" / "20260127_120000_calibrate_masters.js")
-        mock_generate.return_value = ([script_path], [])
+        mock_generate.return_value = RunPlan(script_paths=[script_path])
         mock_run_pi.return_value = 0
         mock_exists.return_value = True
 
@@ -700,6 +741,42 @@ class TestCLI:
         mock_generate.assert_called_once()
         mock_run_pi.assert_called_once()
 
+    @patch("ap_create_master.discovery.iter_headers")
+    @patch("ap_create_master.calibrate_masters.generate_masters")
+    @patch("ap_create_master.calibrate_masters.run_pixinsight")
+    @patch("pathlib.Path.exists")
+    def test_cli_reuses_run_plan_for_execution(
+        self, mock_exists, mock_run_pi, mock_generate, mock_iter_headers, tmp_path
+    ):
+        """Test that main() uses the plan's expected outputs without rescanning."""
+        script_path = str(tmp_path / "logs" / "20260127_120000_calibrate_masters.js")
+        calibrated = [tmp_path / "calibrated" / "flat1_c.xisf"]
+        masters = [tmp_path / "master" / "masterFlat.xisf"]
+        mock_generate.return_value = RunPlan(
+            script_paths=[script_path],
+            calibrated_files=calibrated,
+            expected_master_files=masters,
+        )
+        mock_run_pi.return_value = 0
+        mock_exists.return_value = True
+
+        test_args = [
+            "ap-create-master",
+            "/input",
+            "/output",
+            "--pixinsight-binary",
+            "/opt/PixInsight/bin/PixInsight",
+        ]
+
+        with patch.object(sys, "argv", test_args):
+            exit_code = main()
+
+        assert exit_code == 0
+        mock_iter_headers.assert_not_called()
+        call_args = mock_run_pi.call_args
+        assert call_args[0][2] == calibrated
+        assert call_args[0][3] == masters
+
     @patch("ap_create_master.calibrate_masters.generate_masters")
     @patch("ap_create_master.calibrate_masters.run_pixinsight")
     @patch("pathlib.Path.exists")
@@ -708,7 +785,7 @@ class TestCLI:
     ):
         """Test that --bias-master-dir and --dark-master-dir are passed through."""
         script_path = str(tmp_path / "logs" / "20260127_120000_calibrate_masters.js")
-        mock_generate.return_value = ([script_path], [])
+        mock_generate.return_value = RunPlan(script_paths=[script_path])
         mock_run_pi.return_value = 0
         mock_exists.return_value = True
 
@@ -738,7 +815,7 @@ class TestCLI:
     @patch("ap_create_master.calibrate_masters.generate_masters")
     def test_cli_handles_no_frames_found(self, mock_generate, capsys):
         """Test CLI handles case where no frames are found."""
-        mock_generate.return_value = ([], [])
+        mock_generate.return_value = RunPlan()
 
         test_args = [
             "ap-create-master",
@@ -762,7 +839,7 @@ class TestCLI:
     ):
         """Test that CLI returns PixInsight's exit code on failure."""
         script_path = str(tmp_path / "logs" / "20260127_120000_calibrate_masters.js")
-        mock_generate.return_value = ([script_path], [])
+        mock_generate.return_value = RunPlan(script_paths=[script_path])
         mock_run_pi.return_value = 1  # PixInsight failed
         mock_exists.return_value = True
 
@@ -933,6 +1010,147 @@ class TestPixInsightExecution:
                 master_files=[],
             )
 
+    @patch("subprocess.run")
+    def test_run_pixinsight_passes_script_args(self, mock_subprocess, tmp_path):
+        """Test that script arguments follow the script in the -r option."""
+        from ap_create_master.calibrate_masters import run_pixinsight
+
+        script_path = tmp_path / "logs" / "calibrate_masters_driver.js"
+        script_path.parent.mkdir(parents=True, exist_ok=True)
+        script_path.write_text("// Driver script")
+        manifest_path = tmp_path / "logs" / "20260115_calibrate_masters.json"
+
+        pixinsight_binary = tmp_path / "bin" / "PixInsight.exe"
+        pixinsight_binary.parent.mkdir(parents=True, exist_ok=True)
+        pixinsight_binary.write_text("fake binary")
+
+        mock_result = MagicMock()
+        mock_result.returncode = 0
+        mock_result.stdout = ""
+        mock_subprocess.return_value = mock_result
+
+        run_pixinsight(
+            str(pixinsight_binary),
+            str(script_path),
+            calibrated_files=[],
+            master_files=[],
+            script_args=[str(manifest_path)],
+        )
+
+        cmd = mock_subprocess.call_args[0][0]
+        assert f"-r={script_path},{manifest_path}" in cmd
+
+    def test_run_pixinsight_rejects_comma_in_script_args(self, tmp_path):
+        """Test that a script argument with a comma is rejected."""
+        from ap_create_master.calibrate_masters import run_pixinsight
+
+        script_path = tmp_path / "logs" / "calibrate_masters_driver.js"
+        script_path.parent.mkdir(parents=True, exist_ok=True)
+        script_path.write_text("// Driver script")
+
+        pixinsight_binary = tmp_path / "bin" / "PixInsight.exe"
+        pixinsight_binary.parent.mkdir(parents=True, exist_ok=True)
+        pixinsight_binary.write_text("fake binary")
+
+        with pytest.raises(ValueError, match="comma"):
+            run_pixinsight(
+                str(pixinsight_binary),
+                str(script_path),
+                calibrated_files=[],
+                master_files=[],
+                script_args=[str(tmp_path / "a,b.json")],
+            )
+
+    @patch("subprocess.run")
+    def test_run_pixinsight_parallel_aggregates_instances(
+        self, mock_subprocess, tmp_path
+    ):
+        """Test one instance per script with distinct IDs and a merged exit code."""
+        from ap_create_master.calibrate_masters import run_pixinsight_parallel
+
+        scripts = []
+        for index in (1, 2, 3):
+            script_path = tmp_path / "logs" / f"20260115_{index}_calibrate_masters.js"
+            script_path.parent.mkdir(parents=True, exist_ok=True)
+            script_path.write_text("// Test script")
+            scripts.append((str(script_path), []))
+
+        pixinsight_binary = tmp_path / "bin" / "PixInsight.exe"
+        pixinsight_binary.parent.mkdir(parents=True, exist_ok=True)
+        pixinsight_binary.write_text("fake binary")
+
+        exit_codes = {"-n=10": 0, "-n=11": 3, "-n=12": 5}
+        mock_subprocess.side_effect = lambda cmd, **kwargs: MagicMock(
+            returncode=exit_codes[cmd[2]], stdout=""
+        )
+
+        exit_code = run_pixinsight_parallel(
+            str(pixinsight_binary),
+            scripts,
+            calibrated_files=[],
+            master_files=[],
+            instance_id=10,
+            quiet=True,
+        )
+
+        assert exit_code == 3
+        commands = sorted(call.args[0] for call in mock_subprocess.call_args_list)
+        assert [cmd[2] for cmd in commands] == ["-n=10", "-n=11", "-n=12"]
+        assert [cmd[3] for cmd in commands] == [f"-r={path}" for path, _ in scripts]
+
+    @patch("subprocess.run")
+    def test_run_pixinsight_plan_stops_after_a_failure(self, mock_subprocess, tmp_path):
+        """Test that dependents of a failed script never start."""
+        from ap_create_master.calibrate_masters import run_pixinsight_plan
+
+        script_path = tmp_path / "logs" / "20260115_1_calibrate_masters.js"
+        script_path.parent.mkdir(parents=True, exist_ok=True)
+        script_path.write_text("// Test script")
+
+        pixinsight_binary = tmp_path / "bin" / "PixInsight.exe"
+        pixinsight_binary.parent.mkdir(parents=True, exist_ok=True)
+        pixinsight_binary.write_text("fake binary")
+
+        exit_codes = {"-n=10": 4, "-n=11": 0}
+        mock_subprocess.side_effect = lambda cmd, **kwargs: MagicMock(
+            returncode=exit_codes[cmd[2]], stdout=""
+        )
+        plan = RunPlan(
+            script_paths=[str(script_path)] * 3,
+            script_waves=[0, 0, 1],
+            script_dependencies=[[], [], [0]],
+        )
+
+        exit_code = run_pixinsight_plan(
+            str(pixinsight_binary), plan, instance_id=10, quiet=True
+        )
+
+        assert exit_code == 4
+        commands = sorted(call.args[0][2] for call in mock_subprocess.call_args_list)
+        assert commands == ["-n=10", "-n=11"]
+
+    def test_run_pixinsight_parallel_checks_all_scripts_first(self, tmp_path):
+        """Test that no instance starts when any script is missing."""
+        from ap_create_master.calibrate_masters import run_pixinsight_parallel
+
+        script_path = tmp_path / "logs" / "20260115_1_calibrate_masters.js"
+        script_path.parent.mkdir(parents=True, exist_ok=True)
+        script_path.write_text("// Test script")
+
+        pixinsight_binary = tmp_path / "bin" / "PixInsight.exe"
+        pixinsight_binary.parent.mkdir(parents=True, exist_ok=True)
+        pixinsight_binary.write_text("fake binary")
+
+        with patch("subprocess.run") as mock_subprocess:
+            with pytest.raises(FileNotFoundError, match="Script not found"):
+                run_pixinsight_parallel(
+                    str(pixinsight_binary),
+                    [(str(script_path), []), (str(tmp_path / "missing.js"), [])],
+                    calibrated_files=[],
+                    master_files=[],
+                )
+            mock_subprocess.assert_not_called()
+
     @patch("subprocess.run")
     def test_run_pixinsight_subprocess_exception(self, mock_subprocess, tmp_path):
         """Test handling of subprocess exceptions."""
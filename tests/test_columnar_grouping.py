@@ -0,0 +1,166 @@
+"""
+Unit tests for ap_create_master.columnar_grouping module.
+"""
+
+import random
+
+import pytest
+
+from ap_create_master import config
+from ap_create_master.columnar_grouping import (
+    ColumnarGrouper,
+    group_columns,
+    group_files_columnar,
+)
+from ap_create_master.grouping import FrameGrouper, group_files
+
+
+def _frame(path, **overrides):
+    """Build a dark frame file info dict with keyword overrides."""
+    headers = {
+        config.NORMALIZED_HEADER_TYPE: "dark",
+        config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+        config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+        config.NORMALIZED_HEADER_GAIN: "239",
+        config.NORMALIZED_HEADER_OFFSET: "150",
+        config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
+    }
+    for name, value in overrides.items():
+        headers[getattr(config, f"NORMALIZED_HEADER_{name.upper()}")] = value
+    return {"path": path, "headers": headers}
+
+
+def _assert_same_groups(files, frame_type):
+    """Assert both engines return the same groups in the same order."""
+    expected = group_files(files, frame_type)
+    actual = group_files_columnar(files, frame_type)
+    assert list(actual.items()) == list(expected.items())
+
+
+class TestGroupFilesColumnar:
+    """Tests that group_files_columnar matches group_files."""
+
+    def test_groups_in_first_arrival_order(self):
+        """Test that group order follows each group's first frame."""
+        files = [
+            _frame("dark1.fits", exposureseconds="300.0"),
+            _frame("dark2.fits", exposureseconds="60.0"),
+            _frame("dark3.fits", exposureseconds="300.0"),
+            _frame("dark4.fits", settemp="-20.00", exposureseconds="60.0"),
+            _frame("dark5.fits", exposureseconds="60.0"),
+        ]
+        _assert_same_groups(files, "dark")
+
+    def test_normalizes_values_like_group_key(self):
+        """Test whitespace, numeric values and missing keywords."""
+        files = [
+            _frame("dark1.fits", settemp=" -10.00 "),
+            _frame("dark2.fits", settemp="-10.00"),
+            _frame("dark3.fits", gain=239),
+            _frame("dark4.fits", gain="239"),
+            _frame("dark5.fits", offset=None),
+            _frame("dark6.fits", exposureseconds="n/a"),
+        ]
+        _assert_same_groups(files, "dark")
+
+    def test_bias_and_flat_keywords(self):
+        """Test frame types with different required keywords."""
+        bias = [_frame(f"bias{i}.fits", type="bias") for i in range(3)]
+        flats = [
+            _frame(f"flat{i}.fits", type="flat", filter=f, date="2026-01-15")
+            for i, f in enumerate(["B", "R", "B", "G", "R"])
+        ]
+        _assert_same_groups(bias, "bias")
+        _assert_same_groups(flats, "flat")
+
+    def test_random_frames(self):
+        """Test a shuffled set of frames spread over many groups."""
+        rng = random.Random(0)
+        files = [
+            _frame(
+                f"dark{i}.fits",
+                settemp=rng.choice(["-10.00", "-20.00", 0.0]),
+                gain=rng.choice(["0", "100", 239]),
+                exposureseconds=rng.choice(["30.0", "60.0", "120.0"]),
+            )
+            for i in range(500)
+        ]
+        _assert_same_groups(files, "dark")
+
+    def test_frame_sizes(self):
+        """Test that frame size estimates match the record-based engine."""
+        files = [_frame(f"dark{i}.fits") for i in range(4)]
+        files[0]["headers"].update(naxis1=3840, naxis2=2160, bitpix=16)
+        files[1]["headers"].update(naxis1=3840, naxis2=2160, bitpix=16)
+        files[2]["headers"].update(naxis1="100", naxis2="100", bitpix="-64")
+        _assert_same_groups(files, "dark")
+
+    def test_empty_input(self):
+        """Test that no files produce no groups."""
+        assert group_files_columnar([], "bias") == {}
+
+    def test_unknown_frame_type_raises_error(self):
+        """Test that an unknown frame type raises ValueError."""
+        with pytest.raises(ValueError, match="Unknown frame type"):
+            group_files_columnar([_frame("light1.fits")], "light")
+
+
+class TestGroupColumns:
+    """Tests for group_columns function."""
+
+    def test_missing_column_groups_as_empty_value(self):
+        """Test that an absent keyword column is treated as missing values."""
+        columns = {
+            config.NORMALIZED_HEADER_TYPE: ["bias", "bias"],
+            config.NORMALIZED_HEADER_CAMERA: ["ATR585M", "ATR585M"],
+        }
+
+        groups = group_columns(["bias1.fits", "bias2.fits"], columns, "bias")
+
+        (key,) = groups
+        assert [frame.path for frame in groups[key]] == ["bias1.fits", "bias2.fits"]
+        assert key.count("") == len(config.REQUIRED_KEYWORDS["bias"]) - 2
+
+
+class TestColumnarGrouper:
+    """Tests for ColumnarGrouper class."""
+
+    def test_matches_frame_grouper(self):
+        """Test that both groupers return the same groups per frame type."""
+        files = [
+            ("bias", _frame("bias1.fits", type="bias")),
+            ("dark", _frame("dark1.fits", exposureseconds="300.0")),
+            ("dark", _frame("dark2.fits")),
+            ("bias", _frame("bias2.fits", type="bias", gain="0")),
+            ("dark", _frame("dark3.fits", exposureseconds="300.0")),
+        ]
+        streaming = FrameGrouper()
+        columnar = ColumnarGrouper()
+        for frame_type, file_info in files:
+            streaming.add_headers(file_info["path"], file_info["headers"], frame_type)
+            columnar.add_headers(file_info["path"], file_info["headers"], frame_type)
+
+        for frame_type in config.REQUIRED_KEYWORDS:
+            assert list(columnar.groups(frame_type).items()) == list(
+                streaming.groups(frame_type).items()
+            )
+
+    def test_frames_added_after_grouping_are_included(self):
+        """Test that adding a frame invalidates the groups of its type."""
+        grouper = ColumnarGrouper()
+        frame = _frame("dark1.fits")
+        grouper.add_headers(frame["path"], frame["headers"], "dark")
+        assert len(grouper.groups("dark")) == 1
+
+        frame = _frame("dark2.fits", exposureseconds="300.0")
+        grouper.add_headers(frame["path"], frame["headers"], "dark")
+
+        assert len(grouper.groups("dark")) == 2
+
+    def test_unknown_frame_type_raises_error(self):
+        """Test that adding a frame of an unknown type raises ValueError."""
+        frame = _frame("light1.fits")
+        with pytest.raises(ValueError, match="Unknown frame type"):
+            ColumnarGrouper().add_headers(frame["path"], frame["headers"], "light")
+        assert ColumnarGrouper().groups("light") == {}
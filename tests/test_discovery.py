@@ -0,0 +1,611 @@
+"""
+Unit tests for ap_create_master.discovery module.
+"""
+
+import os
+import random
+import time
+from unittest.mock import patch
+
+from ap_create_master import config, discovery
+from ap_create_master.discovery import (
+    IGNORED,
+    PruneRules,
+    classify_frame,
+    discover_frames,
+    iter_frames,
+    iter_path_headers,
+    list_fits_files,
+    read_frame_headers,
+    scan_headers,
+)
+from ap_create_master.fits_header import FitsHeaderError
+from ap_create_master.header_index import HeaderIndex
+from ap_create_master.path_metadata import PathDiscoveryStats
+from ap_create_master.xisf_header import XisfHeaderError
+
+BIAS_HEADERS = {
+    config.NORMALIZED_HEADER_TYPE: "BIAS",
+    config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+    config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+    config.NORMALIZED_HEADER_GAIN: "239",
+    config.NORMALIZED_HEADER_OFFSET: "150",
+    config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+}
+
+DARK_HEADERS = {
+    **BIAS_HEADERS,
+    config.NORMALIZED_HEADER_TYPE: "DARK",
+    config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
+}
+
+FLAT_HEADERS = {
+    **BIAS_HEADERS,
+    config.NORMALIZED_HEADER_TYPE: "FLAT",
+    config.NORMALIZED_HEADER_DATE: "2026-01-15",
+    config.NORMALIZED_HEADER_FILTER: "B",
+}
+
+LIGHT_HEADERS = {
+    **BIAS_HEADERS,
+    config.NORMALIZED_HEADER_TYPE: "LIGHT",
+}
+
+
+class TestClassifyFrame:
+    """Tests for classify_frame function."""
+
+    def test_classifies_calibration_types(self):
+        """Test that bias, dark and flat frames land in their own buckets."""
+        assert classify_frame(BIAS_HEADERS) == "bias"
+        assert classify_frame(DARK_HEADERS) == "dark"
+        assert classify_frame(FLAT_HEADERS) == "flat"
+
+    def test_type_is_case_insensitive(self):
+        """Test that TYPE matching ignores case and whitespace."""
+        headers = {**BIAS_HEADERS, config.NORMALIZED_HEADER_TYPE: " bias "}
+        assert classify_frame(headers) == "bias"
+
+    def test_ignores_lights(self):
+        """Test that light frames are ignored."""
+        assert classify_frame(LIGHT_HEADERS) == IGNORED
+
+    def test_ignores_masters(self):
+        """Test that master frames in the input directory are ignored."""
+        headers = {**BIAS_HEADERS, config.NORMALIZED_HEADER_TYPE: "MASTER BIAS"}
+        assert classify_frame(headers) == IGNORED
+
+    def test_ignores_frame_missing_required_keyword(self):
+        """Test that frames missing a required keyword for their type are ignored."""
+        headers = dict(DARK_HEADERS)
+        del headers[config.NORMALIZED_HEADER_EXPOSURESECONDS]
+        assert classify_frame(headers) == IGNORED
+
+    def test_ignores_frame_without_type(self):
+        """Test that frames without TYPE are ignored."""
+        headers = dict(BIAS_HEADERS)
+        del headers[config.NORMALIZED_HEADER_TYPE]
+        assert classify_frame(headers) == IGNORED
+
+
+class TestListFitsFiles:
+    """Tests for list_fits_files function."""
+
+    def test_lists_fits_files_recursively_in_sorted_order(self, tmp_path):
+        """Test that .fit/.fits files are found recursively in a stable order."""
+        (tmp_path / "b").mkdir()
+        (tmp_path / "a").mkdir()
+        for name in ["b/2.fits", "b/1.FIT", "a/3.fits", "notes.txt", "a/x.xisf"]:
+            (tmp_path / name).write_bytes(b"")
+
+        paths = list_fits_files(str(tmp_path))
+
+        assert [os.path.relpath(p, tmp_path) for p in paths] == [
+            os.path.join("a", "3.fits"),
+            os.path.join("b", "1.FIT"),
+            os.path.join("b", "2.fits"),
+        ]
+
+    def test_lists_custom_extensions(self, tmp_path):
+        """Test that an explicit extension list replaces FITS_EXTENSIONS."""
+        for name in ["master.XISF", "frame.fits"]:
+            (tmp_path / name).write_bytes(b"")
+
+        paths = list_fits_files(str(tmp_path), extensions=[".xisf"])
+
+        assert [os.path.basename(p) for p in paths] == ["master.XISF"]
+
+
+class TestPruneRules:
+    """Tests for PruneRules and pruning in list_fits_files."""
+
+    @staticmethod
+    def _tree(root):
+        """Create a session tree with lights, flats and calibrated output."""
+        for name in [
+            "FLAT/flat1.fits",
+            "LIGHT/M31/light1.fits",
+            "night2/light/light2.fits",
+            "night2/DARK/dark1.fits",
+            "night2/calibrated/flat1_c.fits",
+        ]:
+            (root / name).parent.mkdir(parents=True, exist_ok=True)
+            (root / name).write_bytes(b"")
+
+    @staticmethod
+    def _relpaths(paths, root):
+        return [os.path.relpath(p, root).replace(os.sep, "/") for p in paths]
+
+    def test_exclude_matches_names_case_insensitively(self, tmp_path):
+        """Test that a pattern prunes matching directories at any depth."""
+        self._tree(tmp_path)
+
+        paths = list_fits_files(str(tmp_path), prune=PruneRules(exclude=["light"]))
+
+        assert self._relpaths(paths, tmp_path) == [
+            "FLAT/flat1.fits",
+            "night2/DARK/dark1.fits",
+            "night2/calibrated/flat1_c.fits",
+        ]
+
+    def test_exclude_matches_relative_paths(self, tmp_path):
+        """Test that a pattern with a separator matches the relative path."""
+        self._tree(tmp_path)
+
+        paths = list_fits_files(
+            str(tmp_path), prune=PruneRules(exclude=["night2/cal*"])
+        )
+
+        assert "night2/calibrated/flat1_c.fits" not in self._relpaths(paths, tmp_path)
+        assert "night2/DARK/dark1.fits" in self._relpaths(paths, tmp_path)
+
+    def test_marker_file_prunes_directory(self, tmp_path):
+        """Test that a directory containing a marker file is skipped."""
+        self._tree(tmp_path)
+        (tmp_path / "night2" / ".nocalib").write_bytes(b"")
+
+        paths = list_fits_files(str(tmp_path), prune=PruneRules(markers=[".nocalib"]))
+
+        assert self._relpaths(paths, tmp_path) == [
+            "FLAT/flat1.fits",
+            "LIGHT/M31/light1.fits",
+        ]
+
+    def test_excluded_dirs_and_root_never_pruned(self, tmp_path):
+        """Test that excluded directories are skipped but the root is not."""
+        self._tree(tmp_path)
+        prune = PruneRules(excluded_dirs=[str(tmp_path), str(tmp_path / "LIGHT")])
+
+        paths = list_fits_files(str(tmp_path), prune=prune)
+
+        assert "LIGHT/M31/light1.fits" not in self._relpaths(paths, tmp_path)
+        assert "FLAT/flat1.fits" in self._relpaths(paths, tmp_path)
+
+    def test_pruned_directories_are_never_listed(self, tmp_path):
+        """Test that os.walk never lists a pruned subtree."""
+        self._tree(tmp_path)
+        listed = []
+        real_scandir = os.scandir
+
+        def recording_scandir(path):
+            listed.append(os.path.relpath(path, tmp_path).replace(os.sep, "/"))
+            return real_scandir(path)
+
+        with patch("os.scandir", recording_scandir):
+            list_fits_files(str(tmp_path), prune=PruneRules(exclude=["LIGHT"]))
+
+        assert not any(p.lower().startswith(("light", "night2/light")) for p in listed)
+        assert "night2/DARK" in listed
+
+
+class TestReadFrameHeaders:
+    """Tests for read_frame_headers function."""
+
+    @patch("ap_common.get_file_headers")
+    @patch("ap_create_master.discovery.read_normalized_header")
+    def test_fits_uses_fast_reader(self, mock_fast, mock_get_headers):
+        """Test that FITS files are read with the minimal header reader."""
+        mock_fast.return_value = {**BIAS_HEADERS, "object": "M31"}
+
+        headers = read_frame_headers("/data/bias1.FITS")
+
+        assert headers == BIAS_HEADERS
+        mock_get_headers.assert_not_called()
+
+    @patch("ap_common.get_file_headers")
+    @patch("ap_create_master.discovery.read_normalized_xisf_header")
+    def test_xisf_uses_fast_reader(self, mock_fast, mock_get_headers):
+        """Test that XISF masters are read with the minimal XISF reader."""
+        mock_fast.return_value = DARK_HEADERS
+
+        assert read_frame_headers("/masters/dark.xisf") == DARK_HEADERS
+        mock_get_headers.assert_not_called()
+
+    @patch("ap_common.get_file_headers")
+    @patch("ap_create_master.discovery.read_normalized_xisf_header")
+    @patch("ap_create_master.discovery.read_normalized_header")
+    def test_falls_back_to_ap_common(self, mock_fits, mock_xisf, mock_get_headers):
+        """Test that files the fast readers cannot parse are read by ap-common."""
+        mock_fits.side_effect = FitsHeaderError("bad")
+        mock_xisf.side_effect = XisfHeaderError("bad")
+        mock_get_headers.return_value = DARK_HEADERS
+
+        assert read_frame_headers("/data/dark1.fits") == DARK_HEADERS
+        assert read_frame_headers("/data/master.xisf") == DARK_HEADERS
+        assert read_frame_headers("/data/frame.fz") == DARK_HEADERS
+        assert mock_get_headers.call_count == 3
+
+
+class TestScanHeaders:
+    """Tests for scan_headers function."""
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_reads_each_file_once(self, mock_read, tmp_path):
+        """Test that every header is read exactly once without an index."""
+        for name in ["bias1.fits", "dark1.fits"]:
+            (tmp_path / name).write_bytes(b"")
+        mock_read.side_effect = lambda path: {"path": path}
+
+        headers = scan_headers(str(tmp_path), quiet=True)
+
+        assert mock_read.call_count == 2
+        assert sorted(os.path.basename(p) for p in headers) == [
+            "bias1.fits",
+            "dark1.fits",
+        ]
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_skips_unreadable_files(self, mock_read, tmp_path):
+        """Test that files whose headers cannot be read are skipped."""
+        (tmp_path / "bad.fits").write_bytes(b"")
+        mock_read.side_effect = OSError("corrupt")
+
+        assert scan_headers(str(tmp_path), quiet=True) == {}
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_io_workers_keep_deterministic_order(self, mock_read, tmp_path):
+        """Test that concurrent reads return the same ordered result."""
+        names = [f"flat{i:02d}.fits" for i in range(12)]
+        for name in names:
+            (tmp_path / name).write_bytes(b"")
+
+        def slow_read(path):
+            # Earlier files finish last so completion order is reversed
+            time.sleep(0.002 * (len(names) - names.index(os.path.basename(path))))
+            return {"path": path}
+
+        mock_read.side_effect = slow_read
+
+        sequential = scan_headers(str(tmp_path), quiet=True)
+        concurrent = scan_headers(str(tmp_path), quiet=True, io_workers=8)
+
+        assert list(concurrent.items()) == list(sequential.items())
+        assert [os.path.basename(p) for p in concurrent] == names
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_stats_are_bounded_by_the_read_window(self, mock_read, tmp_path):
+        """Test that reads start before every file has been stat'ed."""
+        names = [f"bias{i:03d}.fits" for i in range(200)]
+        for name in names:
+            (tmp_path / name).write_bytes(b"")
+        events = []
+        stat_file = discovery._stat_file
+
+        def record_stat(path):
+            events.append("stat")
+            return stat_file(path)
+
+        def record_read(path):
+            events.append("read")
+            return {"path": path}
+
+        mock_read.side_effect = record_read
+        with patch("ap_create_master.discovery._stat_file", record_stat):
+            headers = scan_headers(str(tmp_path), quiet=True, io_workers=2)
+
+        assert len(headers) == len(names)
+        window = 2 * discovery.READS_IN_FLIGHT_PER_WORKER
+        assert events.index("read") <= window
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_header_index_skips_unchanged_files(self, mock_read, tmp_path):
+        """Test that a second scan only reads new or changed files."""
+        input_dir = tmp_path / "input"
+        input_dir.mkdir()
+        (input_dir / "bias1.fits").write_bytes(b"")
+        (input_dir / "bias2.fits").write_bytes(b"")
+        mock_read.return_value = BIAS_HEADERS
+        db_path = str(tmp_path / "cache" / "index.sqlite")
+
+        with HeaderIndex(db_path) as index:
+            first = scan_headers(str(input_dir), header_index=index, quiet=True)
+        assert mock_read.call_count == 2
+
+        # Add a file and change another one
+        (input_dir / "bias3.fits").write_bytes(b"")
+        (input_dir / "bias2.fits").write_bytes(b"changed")
+        mock_read.reset_mock()
+
+        with HeaderIndex(db_path) as index:
+            second = scan_headers(str(input_dir), header_index=index, quiet=True)
+
+        read_names = sorted(
+            os.path.basename(call.args[0]) for call in mock_read.call_args_list
+        )
+        assert read_names == ["bias2.fits", "bias3.fits"]
+        assert len(first) == 2
+        assert len(second) == 3
+        assert all(h == BIAS_HEADERS for h in second.values())
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_header_index_forgets_removed_files(self, mock_read, tmp_path):
+        """Test that entries for deleted files are dropped from the index."""
+        input_dir = tmp_path / "input"
+        input_dir.mkdir()
+        (input_dir / "bias1.fits").write_bytes(b"")
+        (input_dir / "bias2.fits").write_bytes(b"")
+        mock_read.return_value = BIAS_HEADERS
+        db_path = str(tmp_path / "index.sqlite")
+
+        with HeaderIndex(db_path) as index:
+            scan_headers(str(input_dir), header_index=index, quiet=True)
+        (input_dir / "bias2.fits").unlink()
+        with HeaderIndex(db_path) as index:
+            scan_headers(str(input_dir), header_index=index, quiet=True)
+            remaining = index.paths_under(str(input_dir))
+
+        assert [os.path.basename(p) for p in remaining] == ["bias1.fits"]
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_read_only_header_index_is_not_written(self, mock_read, tmp_path):
+        """Test that a read-only index serves hits but stores nothing."""
+        input_dir = tmp_path / "input"
+        input_dir.mkdir()
+        (input_dir / "bias1.fits").write_bytes(b"")
+        mock_read.return_value = BIAS_HEADERS
+        db_path = str(tmp_path / "index.sqlite")
+
+        with HeaderIndex(db_path) as index:
+            scan_headers(str(input_dir), header_index=index, quiet=True)
+        (input_dir / "bias2.fits").write_bytes(b"")
+        with HeaderIndex(db_path, read_only=True) as index:
+            scan_headers(str(input_dir), header_index=index, quiet=True)
+            assert (index.hits, index.misses) == (1, 1)
+            indexed = index.paths_under(str(input_dir))
+
+        assert [os.path.basename(p) for p in indexed] == ["bias1.fits"]
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_header_index_keys_are_absolute(self, mock_read, tmp_path, monkeypatch):
+        """Test that relative and absolute input paths share index entries."""
+        input_dir = tmp_path / "input"
+        input_dir.mkdir()
+        (input_dir / "bias1.fits").write_bytes(b"")
+        mock_read.return_value = BIAS_HEADERS
+        db_path = str(tmp_path / "index.sqlite")
+        monkeypatch.chdir(tmp_path)
+
+        with HeaderIndex(db_path) as index:
+            relative = scan_headers("input", header_index=index, quiet=True)
+        with HeaderIndex(db_path) as index:
+            absolute = scan_headers(str(input_dir), header_index=index, quiet=True)
+            indexed = index.paths_under(str(input_dir))
+
+        assert list(relative) == list(absolute) == [str(input_dir / "bias1.fits")]
+        assert indexed == [str(input_dir / "bias1.fits")]
+        assert mock_read.call_count == 1
+
+
+class TestIterPathHeaders:
+    """Tests for iter_path_headers function."""
+
+    # Folder naming every dark grouping keyword
+    DARK_DIR = (
+        "DARK/EXPOSURE_60.0/INSTRUME_ATR585M_SETTEMP_-10.00_GAIN_239"
+        "_OFFSET_150_READOUTM_Low Conversion Gain"
+    )
+
+    @staticmethod
+    def _write(root, frames):
+        """Create empty files for frames; return headers by absolute path."""
+        for name in frames:
+            (root / name).parent.mkdir(parents=True, exist_ok=True)
+            (root / name).write_bytes(b"")
+        return {str(root / name): headers for name, headers in frames.items()}
+
+    def _session(self, root):
+        """Create a session whose paths encode the frame keywords."""
+        frames = {}
+        for index in range(5):
+            frames[f"{self.DARK_DIR}/dark_{index}.fits"] = DARK_HEADERS
+            frames[f"LIGHT/light_{index}.fits"] = LIGHT_HEADERS
+        frames["notes_0001.fits"] = BIAS_HEADERS
+        return self._write(root, frames)
+
+    @staticmethod
+    def _expected(frames, mock_read):
+        """Headers read are kept; unread lights only get their path type."""
+        read = {call.args[0] for call in mock_read.call_args_list}
+        return {
+            path: (
+                headers
+                if path in read or "DARK" in path
+                else {config.NORMALIZED_HEADER_TYPE: "LIGHT"}
+            )
+            for path, headers in frames.items()
+        }
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_reads_one_sample_per_verified_group(self, mock_read, tmp_path):
+        """Test that verified groups give unread frames their path keywords."""
+        frames = self._session(tmp_path)
+        mock_read.side_effect = frames.__getitem__
+        stats = PathDiscoveryStats()
+
+        headers = dict(
+            iter_path_headers(
+                str(tmp_path),
+                quiet=True,
+                sample_size=1,
+                stats=stats,
+                rng=random.Random(0),
+            )
+        )
+
+        assert list(headers) == list_fits_files(str(tmp_path))
+        # The dark path names every dark keyword, so unread darks are complete
+        assert headers == self._expected(frames, mock_read)
+        # One sample each for DARK and LIGHT, plus the untyped file
+        assert mock_read.call_count == 3
+        assert (stats.files, stats.groups, stats.headers_read) == (11, 3, 3)
+        assert stats.fallback_groups == 1
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_mismatched_group_falls_back_to_headers(self, mock_read, tmp_path):
+        """Test that a sample disagreeing with the path reads the whole group."""
+        frames = self._session(tmp_path)
+        for path in frames:
+            if "DARK" in path:
+                frames[path] = {
+                    **DARK_HEADERS,
+                    config.NORMALIZED_HEADER_EXPOSURESECONDS: "120.0",
+                }
+        mock_read.side_effect = frames.__getitem__
+        stats = PathDiscoveryStats()
+
+        headers = dict(
+            iter_path_headers(str(tmp_path), quiet=True, sample_size=2, stats=stats)
+        )
+
+        assert headers == self._expected(frames, mock_read)
+        assert stats.fallback_groups == 2
+        assert stats.headers_read == 5 + 2 + 1
+        assert mock_read.call_count == stats.headers_read
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_keywords_missing_from_path_are_read(self, mock_read, tmp_path):
+        """Test that flats of mixed filters in one folder keep their filters."""
+        frames = {}
+        for index in range(10):
+            frames[f"FLAT/flat_{index}.fits"] = {
+                **FLAT_HEADERS,
+                config.NORMALIZED_HEADER_FILTER: "L" if index % 2 else "R",
+                config.NORMALIZED_HEADER_EXPOSURESECONDS: "2.0",
+            }
+        frames = self._write(tmp_path, frames)
+        mock_read.side_effect = frames.__getitem__
+
+        for seed in range(6):
+            stats = PathDiscoveryStats()
+            headers = dict(
+                iter_path_headers(
+                    str(tmp_path),
+                    quiet=True,
+                    sample_size=2,
+                    stats=stats,
+                    rng=random.Random(seed),
+                )
+            )
+
+            assert headers == frames
+            assert stats.fallback_groups == 1
+            assert stats.headers_read == 10
+
+
+class TestIterFrames:
+    @patch("ap_create_master.discovery.iter_path_headers")
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_path_sample_selects_path_metadata(
+        self, mock_iter_headers, mock_iter_path_headers, tmp_path
+    ):
+        """Test that path_sample switches discovery to path metadata."""
+        mock_iter_path_headers.return_value = [("bias1.fits", BIAS_HEADERS)]
+
+        frames = list(iter_frames(str(tmp_path), path_sample=3))
+
+        assert [bucket for bucket, _ in frames] == ["bias"]
+        assert mock_iter_path_headers.call_args.kwargs["sample_size"] == 3
+        mock_iter_headers.assert_not_called()
+
+    """Tests for iter_frames function."""
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_yields_classified_frames_in_order(self, mock_iter_headers, tmp_path):
+        """Test that each frame is yielded with its bucket as it is read."""
+        mock_iter_headers.return_value = [
+            ("bias1.fits", BIAS_HEADERS),
+            ("light1.fits", LIGHT_HEADERS),
+            ("flat1.fits", FLAT_HEADERS),
+        ]
+
+        frames = list(iter_frames(str(tmp_path)))
+
+        assert [(bucket, info["path"]) for bucket, info in frames] == [
+            ("bias", "bias1.fits"),
+            (IGNORED, "light1.fits"),
+            ("flat", "flat1.fits"),
+        ]
+        assert frames[0][1]["headers"] is BIAS_HEADERS
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_consumes_headers_lazily(self, mock_iter_headers, tmp_path):
+        """Test that frames are yielded before later headers are read."""
+        read = []
+
+        def headers():
+            for path, frame_headers in [
+                ("bias1.fits", BIAS_HEADERS),
+                ("dark1.fits", DARK_HEADERS),
+            ]:
+                read.append(path)
+                yield path, frame_headers
+
+        mock_iter_headers.return_value = headers()
+
+        frames = iter_frames(str(tmp_path))
+        bucket, _ = next(frames)
+
+        assert bucket == "bias"
+        assert read == ["bias1.fits"]
+
+
+class TestDiscoverFrames:
+    """Tests for discover_frames function."""
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_single_scan_of_input_directory(self, mock_iter_headers, tmp_path):
+        """Test that the input directory is scanned exactly once."""
+        mock_iter_headers.return_value = []
+
+        discover_frames(str(tmp_path))
+
+        assert mock_iter_headers.call_count == 1
+        assert mock_iter_headers.call_args.args[0] == str(tmp_path)
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_sorts_frames_into_buckets(self, mock_iter_headers, tmp_path):
+        """Test that frames are sorted into bias/dark/flat/ignored buckets."""
+        mock_iter_headers.return_value = {
+            "bias1.fits": BIAS_HEADERS,
+            "dark1.fits": DARK_HEADERS,
+            "flat1.fits": FLAT_HEADERS,
+            "flat2.fits": FLAT_HEADERS,
+            "light1.fits": LIGHT_HEADERS,
+        }.items()
+
+        buckets = discover_frames(str(tmp_path))
+
+        assert [f["path"] for f in buckets["bias"]] == ["bias1.fits"]
+        assert [f["path"] for f in buckets["dark"]] == ["dark1.fits"]
+        assert [f["path"] for f in buckets["flat"]] == ["flat1.fits", "flat2.fits"]
+        assert [f["path"] for f in buckets[IGNORED]] == ["light1.fits"]
+        assert buckets["bias"][0]["headers"] is BIAS_HEADERS
+
+    @patch("ap_create_master.discovery.iter_headers")
+    def test_empty_directory(self, mock_iter_headers, tmp_path):
+        """Test that an empty directory yields empty buckets."""
+        mock_iter_headers.return_value = []
+
+        buckets = discover_frames(str(tmp_path))
+
+        assert buckets == {"bias": [], "dark": [], "flat": [], IGNORED: []}
@@ -0,0 +1,133 @@
+"""
+Unit tests for ap_create_master.fits_header module.
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from ap_create_master.fits_header import (
+    FITS_BLOCK_SIZE,
+    FitsHeaderError,
+    parse_value,
+    read_normalized_header,
+    read_primary_header,
+)
+
+
+def _write_fits(path, cards, data=None):
+    """Write a FITS file with the given header cards using astropy."""
+    hdu = fits.PrimaryHDU(data=data)
+    for keyword, value in cards.items():
+        hdu.header[keyword] = value
+    hdu.writeto(path)
+
+
+class TestParseValue:
+    """Tests for parse_value function."""
+
+    def test_parses_strings(self):
+        """Test quoted strings, escaped quotes and trailing spaces."""
+        assert parse_value("'FLAT    '           / frame type") == "FLAT"
+        assert parse_value("'O''Brien'") == "O'Brien"
+        assert parse_value("''") == ""
+
+    def test_parses_numbers_and_logicals(self):
+        """Test integers, floats, D exponents and logicals."""
+        assert parse_value("                 239 / gain") == 239
+        assert parse_value("               -10.0") == -10.0
+        assert parse_value("              1.5D01") == 15.0
+        assert parse_value("                   T") is True
+        assert parse_value("                   F") is False
+
+    def test_undefined_value(self):
+        """Test that a card with no value parses as None."""
+        assert parse_value("                     / no value") is None
+
+
+class TestReadPrimaryHeader:
+    """Tests for read_primary_header function."""
+
+    def test_matches_astropy(self, tmp_path):
+        """Test that parsed values match astropy for the keywords we use."""
+        path = tmp_path / "flat.fits"
+        cards = {
+            "IMAGETYP": "FLAT",
+            "INSTRUME": "ATR585M",
+            "SET-TEMP": -10.0,
+            "GAIN": 239,
+            "OFFSET": 150,
+            "READOUTM": "Low Conversion Gain",
+            "EXPOSURE": 1.5,
+            "FILTER": "B",
+            "DATE-OBS": "2026-01-15T20:00:00.000",
+        }
+        _write_fits(path, cards, data=np.zeros((16, 16), dtype=np.uint16))
+
+        headers = read_primary_header(str(path))
+        expected = fits.getheader(path)
+
+        for keyword in cards:
+            assert headers[keyword] == expected[keyword]
+            assert type(headers[keyword]) is type(expected[keyword])
+
+    def test_stops_at_end_card_without_reading_data(self, tmp_path):
+        """Test that only header blocks are read, even if data is missing."""
+        path = tmp_path / "light.fits"
+        _write_fits(
+            path, {"IMAGETYP": "DARK"}, data=np.zeros((64, 64), dtype=np.uint16)
+        )
+        header_size = len(fits.getheader(path).tostring())
+        # Truncate the data unit; a header-only reader must not notice
+        with open(path, "r+b") as f:
+            f.truncate(header_size)
+
+        headers = read_primary_header(str(path))
+
+        assert headers["IMAGETYP"] == "DARK"
+        assert headers["NAXIS1"] == 64
+
+    def test_long_string_continue_cards(self, tmp_path):
+        """Test that CONTINUE cards are joined like astropy does."""
+        path = tmp_path / "long.fits"
+        value = "Low Conversion Gain " * 6
+        _write_fits(path, {"READOUTM": value})
+
+        assert (
+            read_primary_header(str(path))["READOUTM"]
+            == fits.getheader(path)["READOUTM"]
+        )
+
+    def test_rejects_non_fits_file(self, tmp_path):
+        """Test that a file without a SIMPLE card raises FitsHeaderError."""
+        path = tmp_path / "notes.fits"
+        path.write_bytes(b"not a fits file".ljust(FITS_BLOCK_SIZE))
+
+        with pytest.raises(FitsHeaderError):
+            read_primary_header(str(path))
+
+    def test_rejects_header_without_end(self, tmp_path):
+        """Test that a truncated header raises FitsHeaderError."""
+        path = tmp_path / "truncated.fits"
+        card = "SIMPLE  =                    T".ljust(80)
+        path.write_bytes(card.encode("ascii") * 36)
+
+        with pytest.raises(FitsHeaderError):
+            read_primary_header(str(path))
+
+
+class TestReadNormalizedHeader:
+    """Tests for read_normalized_header function."""
+
+    @patch("ap_common.normalize_headers")
+    def test_normalizes_with_ap_common(self, mock_normalize, tmp_path):
+        """Test that raw headers are normalized by ap-common."""
+        path = tmp_path / "bias.fits"
+        _write_fits(path, {"IMAGETYP": "BIAS"})
+        mock_normalize.return_value = {"type": "BIAS"}
+
+        # BITPIX is kept for memory estimates whatever ap-common returns
+        assert read_normalized_header(str(path)) == {"type": "BIAS", "bitpix": 8}
+        assert mock_normalize.call_args.args[0]["IMAGETYP"] == "BIAS"
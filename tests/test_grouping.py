@@ -8,12 +8,29 @@ import pytest
 
 from ap_create_master import config
 from ap_create_master.grouping import (
+    FrameGrouper,
+    FrameRecord,
     create_group_key,
+    frame_bytes,
     get_group_metadata,
     group_files,
 )
 
 
+def _bias_headers(overrides=None):
+    """Build normalized bias headers with optional keyword overrides."""
+    headers = {
+        config.NORMALIZED_HEADER_TYPE: "bias",
+        config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+        config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+        config.NORMALIZED_HEADER_GAIN: "239",
+        config.NORMALIZED_HEADER_OFFSET: "150",
+        config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+    }
+    headers.update(overrides or {})
+    return headers
+
+
 class TestCreateGroupKey:
     """Tests for create_group_key function."""
 
@@ -130,11 +147,134 @@ class TestGroupFiles:
         # First group should have 2 files
         for group_key, group_files_list in groups.items():
             if len(group_files_list) == 2:
-                assert group_files_list[0]["path"] in ["file1.fits", "file2.fits"]
-                assert group_files_list[1]["path"] in ["file1.fits", "file2.fits"]
+                assert group_files_list[0].path in ["file1.fits", "file2.fits"]
+                assert group_files_list[1].path in ["file1.fits", "file2.fits"]
             else:
                 assert len(group_files_list) == 1
-                assert group_files_list[0]["path"] == "file3.fits"
+                assert group_files_list[0].path == "file3.fits"
+
+
+class TestFrameGrouper:
+    """Tests for FrameGrouper class."""
+
+    @staticmethod
+    def _frame(path, frame_type, settemp="-10.00"):
+        return FrameRecord.from_headers(
+            path,
+            _bias_headers(
+                {
+                    config.NORMALIZED_HEADER_TYPE: frame_type,
+                    config.NORMALIZED_HEADER_SETTEMP: settemp,
+                }
+            ),
+            "bias",
+        )
+
+    def test_groups_frames_as_they_are_added(self):
+        """Test that frames join existing groups in arrival order."""
+        grouper = FrameGrouper()
+        first_key = grouper.add(self._frame("bias1.fits", "bias"))
+        grouper.add(self._frame("bias2.fits", "bias", settemp="-5.00"))
+        assert grouper.add(self._frame("bias3.fits", "bias")) == first_key
+
+        groups = grouper.groups("bias")
+        assert [[f.path for f in files] for files in groups.values()] == [
+            ["bias1.fits", "bias3.fits"],
+            ["bias2.fits"],
+        ]
+
+    def test_keeps_frame_types_separate(self):
+        """Test that each frame type has its own groups."""
+        grouper = FrameGrouper()
+        grouper.add(self._frame("bias1.fits", "bias"))
+
+        assert len(grouper.groups("bias")) == 1
+        assert grouper.groups("dark") == {}
+
+
+class TestFrameRecord:
+    """Tests for FrameRecord class."""
+
+    def test_from_headers_keeps_key_and_exposure_only(self):
+        """Test that a record holds the group key and parsed exposure."""
+        headers = _bias_headers(
+            {
+                config.NORMALIZED_HEADER_TYPE: "dark",
+                config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.0",
+                "filename": "dark1.fits",
+            }
+        )
+        record = FrameRecord.from_headers("dark1.fits", headers, "dark")
+
+        assert record.path == "dark1.fits"
+        assert record.key == create_group_key(headers, "dark")
+        assert record.exposure == 60.0
+        assert not hasattr(record, "__dict__")
+
+    def test_key_values_are_interned(self):
+        """Test that frames in one group share their key strings."""
+        first = FrameRecord.from_headers(
+            "a.fits",
+            _bias_headers({config.NORMALIZED_HEADER_GAIN: "".join(["2", "39"])}),
+            "bias",
+        )
+        second = FrameRecord.from_headers(
+            "b.fits",
+            _bias_headers({config.NORMALIZED_HEADER_GAIN: "".join(["23", "9"])}),
+            "bias",
+        )
+
+        assert all(a is b for a, b in zip(first.key, second.key))
+
+    def test_invalid_exposure_is_none(self):
+        """Test that an unparseable exposure is stored as None."""
+        headers = _bias_headers({config.NORMALIZED_HEADER_EXPOSURESECONDS: "n/a"})
+
+        assert FrameRecord.from_headers("bias1.fits", headers, "bias").exposure is None
+
+    def test_headers_rebuilds_required_keywords(self):
+        """Test that headers maps required keywords to the key values."""
+        headers = _bias_headers({"filename": "bias1.fits"})
+        record = FrameRecord.from_headers("bias1.fits", headers, "bias")
+
+        assert record.headers == get_group_metadata(headers, "bias")
+
+    def test_unknown_frame_type_raises_error(self):
+        """Test that building a record for an unknown type raises ValueError."""
+        with pytest.raises(ValueError, match="Unknown frame type"):
+            FrameRecord.from_headers("light1.fits", _bias_headers(), "light")
+
+
+class TestFrameBytes:
+    """Tests for frame_bytes function."""
+
+    def test_samples_are_held_as_floats(self):
+        """Test that 16-bit frames are counted as 32-bit samples."""
+        headers = {"naxis1": 3840, "naxis2": 2160, "bitpix": 16}
+
+        assert frame_bytes(headers) == 3840 * 2160 * 4
+
+    def test_channels_and_64_bit_samples(self):
+        """Test NAXIS3 and 64-bit data."""
+        headers = {"naxis1": "100", "naxis2": "50", "naxis3": "3", "bitpix": "-64"}
+
+        assert frame_bytes(headers) == 100 * 50 * 3 * 8
+
+    def test_missing_or_invalid_size_is_none(self):
+        """Test that an unknown image size gives no estimate."""
+        assert frame_bytes({"naxis1": 100, "bitpix": 16}) is None
+        assert frame_bytes({"naxis1": 100, "naxis2": "n/a", "bitpix": 16}) is None
+        assert frame_bytes({"naxis1": 100, "naxis2": 0, "bitpix": 16}) is None
+
+    def test_record_keeps_frame_bytes(self):
+        """Test that FrameRecord stores the estimate."""
+        headers = _bias_headers({"naxis1": 10, "naxis2": 10, "bitpix": 16})
+
+        assert FrameRecord.from_headers("b.fits", headers, "bias").frame_bytes == 400
+        assert (
+            FrameRecord.from_headers("b.fits", _bias_headers(), "bias").frame_bytes
+            is None
+        )
 
 
 class TestGetGroupMetadata:
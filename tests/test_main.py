@@ -7,7 +7,14 @@ Following CLI Testing Standards to prevent argparse attribute bugs.
 Generated By: Claude Code (Claude Sonnet 4.5)
 """
 
-from ap_create_master.calibrate_masters import main, EXIT_SUCCESS, EXIT_ERROR
+import pytest
+
+from ap_create_master.calibrate_masters import (
+    main,
+    EXIT_SUCCESS,
+    EXIT_ERROR,
+    RunPlan,
+)
 
 
 class TestMainCLI:
@@ -27,7 +34,7 @@ class TestMainCLI:
         # Mock generate_masters to isolate argparse logic
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -54,7 +61,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -86,7 +93,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -118,7 +125,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -148,7 +155,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -171,7 +178,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -200,7 +207,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -229,7 +236,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -258,7 +265,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([str(tmp_path / "script.js")], []),
+            return_value=RunPlan(script_paths=[str(tmp_path / "script.js")]),
         )
         mock_execute = mocker.patch("ap_create_master.calibrate_masters.run_pixinsight")
 
@@ -283,7 +290,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([str(tmp_path / "script.js")], []),
+            return_value=RunPlan(script_paths=[str(tmp_path / "script.js")]),
         )
 
         mocker.patch(
@@ -310,7 +317,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),  # No scripts, so execution is skipped
+            return_value=RunPlan(),  # No scripts, so execution is skipped
         )
 
         mocker.patch(
@@ -341,7 +348,7 @@ class TestMainCLI:
 
         mock_generate = mocker.patch(
             "ap_create_master.calibrate_masters.generate_masters",
-            return_value=([], []),
+            return_value=RunPlan(),
         )
 
         mocker.patch(
@@ -364,6 +371,425 @@ class TestMainCLI:
         assert call_args.kwargs["quiet"] is True
         assert call_args.kwargs["debug"] is True
 
+    def test_cache_dir_defaults_to_output_cache(self, tmp_path, mocker):
+        """Test that the header index defaults to output_dir/cache."""
+        input_dir = tmp_path / "input"
+        output_dir = tmp_path / "output"
+        input_dir.mkdir()
+        output_dir.mkdir()
+
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+
+        mocker.patch(
+            "sys.argv",
+            ["ap-create-master", str(input_dir), str(output_dir), "--script-only"],
+        )
+
+        result = main()
+
+        assert result == EXIT_SUCCESS
+        call_args = mock_generate.call_args
+        assert call_args.kwargs["cache_dir"] == str(output_dir / "cache")
+
+    def test_cache_dir_argument(self, tmp_path, mocker):
+        """Test --cache-dir passes value correctly."""
+        input_dir = tmp_path / "input"
+        output_dir = tmp_path / "output"
+        cache_dir = tmp_path / "cache"
+        input_dir.mkdir()
+        output_dir.mkdir()
+
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(input_dir),
+                str(output_dir),
+                "--cache-dir",
+                str(cache_dir),
+                "--script-only",
+            ],
+        )
+
+        result = main()
+
+        assert result == EXIT_SUCCESS
+        call_args = mock_generate.call_args
+        assert call_args.kwargs["cache_dir"] == str(cache_dir)
+
+    def test_no_cache_flag(self, tmp_path, mocker):
+        """Test --no-cache disables the header index."""
+        input_dir = tmp_path / "input"
+        output_dir = tmp_path / "output"
+        input_dir.mkdir()
+        output_dir.mkdir()
+
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(input_dir),
+                str(output_dir),
+                "--no-cache",
+                "--script-only",
+            ],
+        )
+
+        result = main()
+
+        assert result == EXIT_SUCCESS
+        call_args = mock_generate.call_args
+        assert call_args.kwargs["cache_dir"] is None
+
+    def test_io_workers_argument(self, tmp_path, mocker):
+        """Test --io-workers value passing."""
+        input_dir = tmp_path / "input"
+        output_dir = tmp_path / "output"
+        input_dir.mkdir()
+        output_dir.mkdir()
+
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(input_dir),
+                str(output_dir),
+                "--io-workers",
+                "12",
+                "--script-only",
+            ],
+        )
+
+        result = main()
+
+        assert result == EXIT_SUCCESS
+        assert mock_generate.call_args.kwargs["io_workers"] == 12
+
+    def test_grouping_engine_argument(self, tmp_path, mocker):
+        """Test --grouping-engine value passing and its default."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        argv = ["ap-create-master", str(tmp_path), str(tmp_path), "--script-only"]
+
+        mocker.patch("sys.argv", argv)
+        assert main() == EXIT_SUCCESS
+        assert mock_generate.call_args.kwargs["grouping_engine"] == "streaming"
+
+        mocker.patch("sys.argv", argv + ["--grouping-engine", "columnar"])
+        assert main() == EXIT_SUCCESS
+        assert mock_generate.call_args.kwargs["grouping_engine"] == "columnar"
+
+    def test_io_workers_must_be_positive(self, tmp_path, mocker):
+        """Test --io-workers rejects values below 1."""
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path),
+                str(tmp_path),
+                "--io-workers",
+                "0",
+            ],
+        )
+
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_incremental_flag(self, tmp_path, mocker):
+        """Test --incremental is passed through to generate_masters."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path / "input"),
+                str(tmp_path / "output"),
+                "--incremental",
+                "--script-only",
+            ],
+        )
+
+        result = main()
+
+        assert result == EXIT_SUCCESS
+        assert mock_generate.call_args.kwargs["incremental"] is True
+
+    def test_incremental_conflicts_with_no_cache(self, tmp_path, mocker):
+        """Test --incremental cannot be combined with --no-cache."""
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path),
+                str(tmp_path),
+                "--incremental",
+                "--no-cache",
+            ],
+        )
+
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_exclude_and_skip_marker_arguments(self, tmp_path, mocker):
+        """Test repeatable --exclude and --skip-marker value passing."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path / "input"),
+                str(tmp_path / "output"),
+                "--exclude",
+                "LIGHT*",
+                "--exclude",
+                "calibrated",
+                "--skip-marker",
+                ".nocalib",
+                "--script-only",
+            ],
+        )
+
+        result = main()
+
+        assert result == EXIT_SUCCESS
+        assert mock_generate.call_args.kwargs["exclude"] == ["LIGHT*", "calibrated"]
+        assert mock_generate.call_args.kwargs["skip_markers"] == [".nocalib"]
+
+    def test_path_metadata_arguments(self, tmp_path, mocker):
+        """Test --path-metadata enables path discovery with --path-sample."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        argv = ["ap-create-master", str(tmp_path), str(tmp_path), "--script-only"]
+
+        mocker.patch("sys.argv", argv)
+        main()
+        assert mock_generate.call_args.kwargs["path_sample"] is None
+
+        mocker.patch("sys.argv", argv + ["--path-metadata", "--path-sample", "4"])
+        main()
+        assert mock_generate.call_args.kwargs["path_sample"] == 4
+
+    def test_script_manifest_flag(self, tmp_path, mocker, capsys):
+        """Test --script-manifest value passing and the script argument hint."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(
+                script_paths=["driver.js"],
+                script_args=[["manifest.json"]],
+                master_files=[("master.xisf", "bias")],
+            ),
+        )
+        argv = ["ap-create-master", str(tmp_path), str(tmp_path), "--script-only"]
+
+        mocker.patch("sys.argv", argv)
+        main()
+        assert mock_generate.call_args.kwargs["script_manifest"] is False
+
+        mocker.patch("sys.argv", argv + ["--script-manifest"])
+        main()
+        assert mock_generate.call_args.kwargs["script_manifest"] is True
+        assert "-r=driver.js,manifest.json" in capsys.readouterr().out
+
+    def test_parallel_instances_argument(self, tmp_path, mocker):
+        """Test --parallel-instances value passing and validation."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        argv = ["ap-create-master", str(tmp_path), str(tmp_path), "--script-only"]
+
+        mocker.patch("sys.argv", argv)
+        main()
+        assert mock_generate.call_args.kwargs["parallel_instances"] == 1
+
+        mocker.patch("sys.argv", argv + ["--parallel-instances", "4"])
+        main()
+        assert mock_generate.call_args.kwargs["parallel_instances"] == 4
+
+        mocker.patch("sys.argv", argv + ["--parallel-instances", "0"])
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_memory_budget_argument(self, tmp_path, mocker):
+        """Test --memory-budget conversion to bytes and validation."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        argv = ["ap-create-master", str(tmp_path), str(tmp_path), "--script-only"]
+
+        mocker.patch("sys.argv", argv)
+        main()
+        assert mock_generate.call_args.kwargs["memory_budget"] is None
+
+        mocker.patch("sys.argv", argv + ["--memory-budget", "1.5"])
+        main()
+        assert mock_generate.call_args.kwargs["memory_budget"] == 3 * 2**29
+
+        mocker.patch("sys.argv", argv + ["--memory-budget", "0"])
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_parallel_scripts_run_in_parallel_instances(self, tmp_path, mocker):
+        """Test that a sharded plan runs every script from --instance-id up."""
+        plan = RunPlan(
+            script_paths=["run_1_calibrate_masters.js", "run_2_calibrate_masters.js"],
+            script_args=[[], []],
+        )
+        mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters", return_value=plan
+        )
+        mock_run_plan = mocker.patch(
+            "ap_create_master.calibrate_masters.run_pixinsight_plan",
+            return_value=0,
+        )
+        mocker.patch("ap_create_master.calibrate_masters.complete_run")
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path),
+                str(tmp_path),
+                "--pixinsight-binary",
+                "PixInsight",
+                "--instance-id",
+                "40",
+                "--parallel-instances",
+                "2",
+            ],
+        )
+
+        assert main() == EXIT_SUCCESS
+        call_args = mock_run_plan.call_args.args
+        assert call_args[1] is plan
+        assert call_args[2] == 40
+
+    def test_script_only_lists_commands_by_wave(self, tmp_path, mocker, capsys):
+        """Test that script-only mode says which commands wait for a wave."""
+        plan = RunPlan(
+            script_paths=[f"run_{n}_calibrate_masters.js" for n in (1, 2, 3)],
+            script_args=[[], [], []],
+            script_waves=[0, 0, 1],
+            script_dependencies=[[], [], [0]],
+        )
+        mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters", return_value=plan
+        )
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path),
+                str(tmp_path),
+                "--script-only",
+                "--instance-id",
+                "40",
+            ],
+        )
+
+        assert main() == EXIT_SUCCESS
+        lines = capsys.readouterr().out.splitlines()
+        first = lines.index("Wave 1:")
+        second = lines.index("Wave 2 (run after wave 1 completes):")
+        assert "-n=40" in lines[first + 1] and "-n=41" in lines[first + 2]
+        assert "-n=42 -r=run_3_calibrate_masters.js" in lines[second + 1]
+
+    def test_no_run_masters_flag(self, tmp_path, mocker):
+        """Test --no-run-masters turns off calibration with the run's masters."""
+        mock_generate = mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters",
+            return_value=RunPlan(),
+        )
+        argv = ["ap-create-master", str(tmp_path), str(tmp_path), "--script-only"]
+
+        mocker.patch("sys.argv", argv)
+        main()
+        assert mock_generate.call_args.kwargs["use_run_masters"] is True
+
+        mocker.patch("sys.argv", argv + ["--no-run-masters"])
+        main()
+        assert mock_generate.call_args.kwargs["use_run_masters"] is False
+
+    def test_path_sample_must_be_positive(self, tmp_path, mocker):
+        """Test --path-sample rejects values below 1."""
+        mocker.patch(
+            "sys.argv",
+            [
+                "ap-create-master",
+                str(tmp_path),
+                str(tmp_path),
+                "--path-metadata",
+                "--path-sample",
+                "0",
+            ],
+        )
+
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_records_processed_files_after_successful_run(self, tmp_path, mocker):
+        """Test processed files are recorded only after PixInsight succeeds."""
+        output_dir = tmp_path / "output"
+        plan = RunPlan(
+            script_paths=[str(tmp_path / "script.js")],
+            processed_files=["flat1.fits"],
+        )
+        mocker.patch(
+            "ap_create_master.calibrate_masters.generate_masters", return_value=plan
+        )
+        mock_execute = mocker.patch(
+            "ap_create_master.calibrate_masters.run_pixinsight", return_value=0
+        )
+        mock_record = mocker.patch(
+            "ap_create_master.calibrate_masters.record_processed_files"
+        )
+        argv = [
+            "ap-create-master",
+            str(tmp_path / "input"),
+            str(output_dir),
+            "--pixinsight-binary",
+            "/usr/bin/PixInsight",
+        ]
+        mocker.patch("sys.argv", argv)
+
+        assert main() == EXIT_SUCCESS
+        mock_record.assert_called_once_with(
+            str(output_dir / "cache"), str(tmp_path / "input"), ["flat1.fits"]
+        )
+
+        mock_record.reset_mock()
+        mock_execute.return_value = 1
+        assert main() == 1
+        mock_record.assert_not_called()
+
     def test_exception_returns_error_code(self, tmp_path, mocker):
         """Test EXIT_ERROR when generate_masters raises exception."""
         input_dir = tmp_path / "input"
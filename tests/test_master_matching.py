@@ -8,7 +8,41 @@ from pathlib import Path
 from unittest.mock import patch
 
 from ap_create_master import config
-from ap_create_master.master_matching import find_matching_master_for_flat
+from ap_create_master.header_index import HeaderIndex
+from ap_create_master.master_matching import (
+    DarkIndex,
+    MasterLibrary,
+    create_match_key,
+    find_matching_master_for_flat,
+    match_masters_for_groups,
+)
+
+INSTRUMENT_HEADERS = {
+    config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+    config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+    config.NORMALIZED_HEADER_GAIN: "239",
+    config.NORMALIZED_HEADER_OFFSET: "150",
+    config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+}
+
+
+def _dark(exposure, **overrides):
+    """Build master dark metadata for the default instrument settings."""
+    return {
+        config.NORMALIZED_HEADER_TYPE: "MASTER DARK",
+        **INSTRUMENT_HEADERS,
+        config.NORMALIZED_HEADER_EXPOSURESECONDS: exposure,
+        **overrides,
+    }
+
+
+def _bias(**overrides):
+    """Build master bias metadata for the default instrument settings."""
+    return {
+        config.NORMALIZED_HEADER_TYPE: "MASTER BIAS",
+        **INSTRUMENT_HEADERS,
+        **overrides,
+    }
 
 
 class TestFindMatchingMasterForFlat:
@@ -407,3 +441,355 @@ class TestFindMatchingMasterForFlat:
         find_matching_master_for_flat(master_dir, flat_headers, "flat")
         flat_call = mock_get_metadata.call_args
         assert flat_call.kwargs["filters"]["type"] == "MASTER FLAT"
+
+
+class TestDarkIndex:
+    """Tests for DarkIndex selection."""
+
+    CANDIDATES = [
+        (60.0, "dark_60s.xisf"),
+        (10.0, "dark_10s_a.xisf"),
+        (30.0, "dark_30s.xisf"),
+        (10.0, "dark_10s_b.xisf"),
+    ]
+
+    def test_select_prefers_largest_exposure_at_or_below_target(self):
+        """Test the selection rule, including ties and targets below the range."""
+        index = DarkIndex(self.CANDIDATES)
+
+        assert index.exposures == [10.0, 30.0, 60.0]
+        assert index.select(45.0) == "dark_30s.xisf"
+        assert index.select(30.0) == "dark_30s.xisf"
+        assert index.select(10.0) == "dark_10s_a.xisf"
+        assert index.select(1.0) == "dark_10s_a.xisf"
+        assert index.select(600.0) == "dark_60s.xisf"
+
+    def test_select_many_matches_select_in_input_order(self):
+        """Test that a multi-target sweep agrees with single selections."""
+        index = DarkIndex(self.CANDIDATES)
+        targets = [600.0, 1.0, 45.0, 10.0, 30.0, 29.9, 45.0]
+
+        assert index.select_many(targets) == [index.select(t) for t in targets]
+        assert index.select_many([]) == []
+
+
+class TestMasterLibrary:
+    """Tests for MasterLibrary index."""
+
+    @patch("ap_common.get_filtered_metadata")
+    def test_scans_library_once_for_many_flat_groups(self, mock_get_metadata, tmp_path):
+        """Test that one scan serves every flat group lookup."""
+        master_dir = tmp_path / "masters"
+        master_dir.mkdir()
+        mock_get_metadata.return_value = {
+            "dark_10s.xisf": _dark("10.0"),
+            "dark_30s.xisf": _dark("30.0"),
+        }
+
+        library = MasterLibrary.scan(str(master_dir), "dark")
+        results = [
+            find_matching_master_for_flat(
+                str(master_dir), INSTRUMENT_HEADERS, "dark", [exposure], library
+            )
+            for exposure in [5.0, 15.0, 30.0, 60.0]
+        ]
+
+        assert mock_get_metadata.call_count == 1
+        assert results == [
+            "dark_10s.xisf",
+            "dark_10s.xisf",
+            "dark_30s.xisf",
+            "dark_30s.xisf",
+        ]
+
+    def test_keys_masters_by_instrument_settings(self):
+        """Test that masters only match flats with the same instrument settings."""
+        library = MasterLibrary(
+            "dark",
+            {
+                "gain100.xisf": _dark("10.0", **{config.NORMALIZED_HEADER_GAIN: "100"}),
+                "gain239.xisf": _dark("20.0"),
+            },
+        )
+        other_camera = {**INSTRUMENT_HEADERS, config.NORMALIZED_HEADER_CAMERA: "X"}
+
+        assert library.find(INSTRUMENT_HEADERS, [60.0]) == "gain239.xisf"
+        assert library.find(other_camera, [60.0]) is None
+
+    def test_equal_exposures_keep_library_order(self):
+        """Test that ties on exposure pick the first master in library order."""
+        library = MasterLibrary(
+            "dark",
+            {
+                "dark_a.xisf": _dark("30.0"),
+                "dark_b.xisf": _dark("30.0"),
+                "dark_c.xisf": _dark("60.0"),
+            },
+        )
+
+        assert library.find(INSTRUMENT_HEADERS, [45.0]) == "dark_a.xisf"
+        assert library.find(INSTRUMENT_HEADERS, [10.0]) == "dark_a.xisf"
+
+    @patch("ap_create_master.master_matching.create_match_key")
+    def test_memoizes_lookups_by_instrument_settings(self, mock_key):
+        """Test that identical instrument settings normalize only once."""
+        mock_key.return_value = ("atr585m",)
+        library = MasterLibrary("dark", {})
+        library._first_match[("atr585m",)] = "dark_30s.xisf"
+        other_filter = {**INSTRUMENT_HEADERS, config.NORMALIZED_HEADER_FILTER: "Ha"}
+
+        results = [
+            library.find(INSTRUMENT_HEADERS),
+            library.find(INSTRUMENT_HEADERS, [10.0]),
+            library.find(other_filter),
+        ]
+
+        assert results == ["dark_30s.xisf"] * 3
+        assert mock_key.call_count == 1
+        assert (library.hits, library.misses) == (2, 1)
+
+    def test_memo_keeps_settings_apart(self):
+        """Test that different instrument settings are resolved separately."""
+        library = MasterLibrary("bias", {"bias.xisf": _bias()})
+        other_gain = {**INSTRUMENT_HEADERS, config.NORMALIZED_HEADER_GAIN: "100"}
+
+        assert library.find(INSTRUMENT_HEADERS) == "bias.xisf"
+        assert library.find(other_gain) is None
+        assert library.find(other_gain) is None
+        assert library.find(INSTRUMENT_HEADERS) == "bias.xisf"
+        assert (library.hits, library.misses) == (2, 2)
+
+    def test_find_darks_for_many_exposures(self):
+        """Test matching many sky-flat exposures against one instrument key."""
+        library = MasterLibrary(
+            "dark",
+            {"dark_10s.xisf": _dark("10.0"), "dark_30s.xisf": _dark("30.0")},
+        )
+        other_camera = {**INSTRUMENT_HEADERS, config.NORMALIZED_HEADER_CAMERA: "X"}
+
+        assert library.find_darks(INSTRUMENT_HEADERS, [2.5, 12.0, 31.0]) == [
+            "dark_10s.xisf",
+            "dark_10s.xisf",
+            "dark_30s.xisf",
+        ]
+        assert library.find_darks(other_camera, [2.5, 12.0]) == [None, None]
+
+    def test_lookup_and_dark_exposures(self):
+        """Test the public lookups used by batch matching."""
+        library = MasterLibrary(
+            "dark",
+            {"dark_30s.xisf": _dark("30.0"), "dark_10s.xisf": _dark("10.0")},
+        )
+        other_camera = {**INSTRUMENT_HEADERS, config.NORMALIZED_HEADER_CAMERA: "X"}
+
+        key, first_match = library.lookup(INSTRUMENT_HEADERS)
+
+        assert key == create_match_key(INSTRUMENT_HEADERS)
+        assert first_match == "dark_30s.xisf"
+        assert library.dark_exposures(INSTRUMENT_HEADERS) == [10.0, 30.0]
+        assert library.lookup(other_camera)[1] is None
+        assert library.dark_exposures(other_camera) == []
+
+    def test_missing_directory_gives_empty_library(self, tmp_path):
+        """Test that scanning a missing directory yields an empty library."""
+        library = MasterLibrary.scan(str(tmp_path / "missing"), "bias")
+
+        assert library.size == 0
+        assert library.find(INSTRUMENT_HEADERS) is None
+
+    @patch("ap_common.get_filtered_metadata")
+    def test_run_masters_precede_scanned_masters(self, mock_get_metadata, tmp_path):
+        """Test that run masters are indexed first and replace same-path files."""
+        master_dir = tmp_path / "masters"
+        master_dir.mkdir()
+        mock_get_metadata.return_value = {
+            "library_bias.xisf": _bias(),
+            "run_bias.xisf": _bias(),
+        }
+        run_masters = {"run_bias.xisf": dict(INSTRUMENT_HEADERS)}
+
+        library = MasterLibrary.scan(str(master_dir), "bias", run_masters=run_masters)
+        missing = MasterLibrary.scan(
+            str(tmp_path / "missing"), "bias", run_masters=run_masters
+        )
+
+        assert library.size == 2
+        assert library.find(INSTRUMENT_HEADERS) == "run_bias.xisf"
+        assert missing.find(INSTRUMENT_HEADERS) == "run_bias.xisf"
+
+    @patch("ap_create_master.discovery.read_frame_headers")
+    def test_catalog_only_rereads_changed_masters(self, mock_read, tmp_path):
+        """Test that a catalog-backed scan skips unchanged master files."""
+        master_dir = tmp_path / "masters"
+        master_dir.mkdir()
+        (master_dir / "dark_10s.xisf").write_bytes(b"")
+        (master_dir / "dark_30s.xisf").write_bytes(b"")
+        (master_dir / "bias.xisf").write_bytes(b"")
+        (master_dir / "notes.txt").write_bytes(b"")
+        metadata = {
+            "dark_10s.xisf": _dark("10.0"),
+            "dark_30s.xisf": _dark("30.0"),
+            "bias.xisf": {
+                config.NORMALIZED_HEADER_TYPE: "MASTER BIAS",
+                **INSTRUMENT_HEADERS,
+            },
+        }
+        mock_read.side_effect = lambda path: metadata[Path(path).name]
+        db_path = str(tmp_path / "cache" / "catalog.sqlite")
+
+        with HeaderIndex(db_path) as catalog:
+            first = MasterLibrary.scan(str(master_dir), "dark", catalog=catalog)
+        assert mock_read.call_count == 3
+
+        (master_dir / "dark_30s.xisf").write_bytes(b"changed")
+        mock_read.reset_mock()
+
+        with HeaderIndex(db_path) as catalog:
+            second = MasterLibrary.scan(str(master_dir), "dark", catalog=catalog)
+
+        assert [Path(c.args[0]).name for c in mock_read.call_args_list] == [
+            "dark_30s.xisf"
+        ]
+        assert first.size == second.size == 2
+        assert Path(second.find(INSTRUMENT_HEADERS, [20.0])).name == "dark_10s.xisf"
+
+
+class TestMatchMastersForGroups:
+    """Tests for match_masters_for_groups function."""
+
+    @staticmethod
+    def _scan(master_dir, master_type, catalog=None, io_workers=1, run_masters=None):
+        """Stand in for MasterLibrary.scan with a fixed library."""
+        if master_type == "bias":
+            return MasterLibrary("bias", {**(run_masters or {}), "bias.xisf": _bias()})
+        return MasterLibrary(
+            "dark",
+            {
+                **(run_masters or {}),
+                "dark_60s.xisf": _dark("60.0"),
+                "dark_10s.xisf": _dark("10.0"),
+                "dark_30s.xisf": _dark("30.0"),
+            },
+        )
+
+    def test_matches_every_group_with_one_scan_per_library(self):
+        """Test results and diagnostics for groups sharing instrument settings."""
+        groups = {
+            "L": (INSTRUMENT_HEADERS, [45.0, 50.0]),
+            "Ha": (INSTRUMENT_HEADERS, [120.0]),
+            "B": (INSTRUMENT_HEADERS, [2.0]),
+        }
+
+        with patch.object(MasterLibrary, "scan", side_effect=self._scan) as mock_scan:
+            matches = match_masters_for_groups(groups, "bias_lib", "dark_lib")
+
+        assert mock_scan.call_count == 2
+        assert {g: (m.bias, m.dark) for g, m in matches.items()} == {
+            "L": ("bias.xisf", "dark_30s.xisf"),
+            "Ha": ("bias.xisf", "dark_60s.xisf"),
+            "B": ("bias.xisf", "dark_10s.xisf"),
+        }
+        match = matches["L"]
+        assert match.bias_matched and match.dark_matched
+        assert match.match_key == (
+            "atr585m",
+            "-10.00",
+            "239",
+            "150",
+            "low conversion gain",
+        )
+        assert match.target_exposure == 45.0
+        assert match.dark_exposures == [10.0, 30.0, 60.0]
+
+    def test_agrees_with_single_group_matching(self):
+        """Test that batch results equal find_matching_master_for_flat."""
+        flat_headers = {
+            **INSTRUMENT_HEADERS,
+            config.NORMALIZED_HEADER_EXPOSURESECONDS: "20.0",
+        }
+        other_gain = {**INSTRUMENT_HEADERS, config.NORMALIZED_HEADER_GAIN: "100"}
+        groups = {
+            "header_exposure": (flat_headers, []),
+            "no_exposure": (INSTRUMENT_HEADERS, []),
+            "unmatched": (other_gain, [10.0]),
+        }
+        bias = self._scan(None, "bias")
+        dark = self._scan(None, "dark")
+
+        with patch.object(MasterLibrary, "scan", side_effect=self._scan):
+            matches = match_masters_for_groups(groups, "bias_lib", "dark_lib")
+
+        for group_id, (headers, exposures) in groups.items():
+            assert matches[group_id].bias == bias.find(headers)
+            assert matches[group_id].dark == dark.find(headers, exposures or None)
+        assert not matches["unmatched"].dark_matched
+        assert matches["unmatched"].dark_exposures == []
+
+    def test_skips_libraries_without_directories(self):
+        """Test that no scan happens without a library or without groups."""
+        with patch.object(MasterLibrary, "scan") as mock_scan:
+            matches = match_masters_for_groups(
+                {"L": (INSTRUMENT_HEADERS, [1.0])}, None, None
+            )
+            assert match_masters_for_groups({}, "bias_lib", "dark_lib") == {}
+
+        mock_scan.assert_not_called()
+        assert (matches["L"].bias, matches["L"].dark) == (None, None)
+        assert matches["L"].match_key[0] == "atr585m"
+
+    def test_run_masters_are_matched_without_libraries(self):
+        """Test that masters created by the run calibrate flats on their own."""
+        run_masters = {
+            "bias": {"run_bias.xisf": dict(INSTRUMENT_HEADERS)},
+            "dark": {
+                "run_dark_30s.xisf": {
+                    **INSTRUMENT_HEADERS,
+                    config.NORMALIZED_HEADER_EXPOSURESECONDS: "30.0",
+                },
+                # Missing readout mode: cannot be matched, so it is ignored
+                "run_dark_5s.xisf": {
+                    config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+                    config.NORMALIZED_HEADER_EXPOSURESECONDS: "5.0",
+                },
+            },
+        }
+
+        with patch.object(MasterLibrary, "scan") as mock_scan:
+            matches = match_masters_for_groups(
+                {"L": (INSTRUMENT_HEADERS, [10.0])},
+                None,
+                None,
+                run_masters=run_masters,
+            )
+
+        mock_scan.assert_not_called()
+        match = matches["L"]
+        assert (match.bias, match.dark) == ("run_bias.xisf", "run_dark_30s.xisf")
+        assert match.bias_from_run and match.dark_from_run
+
+    def test_run_masters_join_library_candidates(self):
+        """Test run masters win ties while darks are still chosen by exposure."""
+        run_dark = {
+            **INSTRUMENT_HEADERS,
+            config.NORMALIZED_HEADER_EXPOSURESECONDS: "10.0",
+        }
+        run_masters = {
+            "bias": {"run_bias.xisf": dict(INSTRUMENT_HEADERS)},
+            "dark": {"run_dark_10s.xisf": run_dark},
+        }
+        groups = {
+            "L": (INSTRUMENT_HEADERS, [12.0]),
+            "Ha": (INSTRUMENT_HEADERS, [45.0]),
+        }
+
+        with patch.object(MasterLibrary, "scan", side_effect=self._scan) as mock_scan:
+            matches = match_masters_for_groups(
+                groups, "bias_lib", "dark_lib", run_masters=run_masters
+            )
+
+        assert mock_scan.call_args.kwargs["run_masters"] == run_masters["dark"]
+        assert matches["L"].bias == "run_bias.xisf"
+        assert matches["L"].dark == "run_dark_10s.xisf"
+        assert matches["L"].dark_from_run
+        assert matches["Ha"].dark == "dark_30s.xisf"
+        assert not matches["Ha"].dark_from_run
@@ -0,0 +1,147 @@
+"""
+Unit tests for ap_create_master.path_metadata module.
+"""
+
+import os
+
+from ap_create_master import config
+from ap_create_master.path_metadata import (
+    parse_path_keywords,
+    path_keywords_complete,
+    verify_samples,
+)
+
+
+def _dark_headers(**overrides):
+    """Build normalized dark headers with keyword overrides."""
+    headers = {
+        config.NORMALIZED_HEADER_TYPE: "DARK",
+        config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+        config.NORMALIZED_HEADER_SETTEMP: -10.0,
+        config.NORMALIZED_HEADER_GAIN: 100,
+        config.NORMALIZED_HEADER_OFFSET: 50,
+        config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+        config.NORMALIZED_HEADER_EXPOSURESECONDS: 60.0,
+    }
+    for name, value in overrides.items():
+        headers[getattr(config, f"NORMALIZED_HEADER_{name.upper()}")] = value
+    return headers
+
+
+class TestParsePathKeywords:
+    """Tests for parse_path_keywords function."""
+
+    def test_parses_folder_and_file_tokens(self, tmp_path):
+        """Test KEYWORD_value tokens and bare frame types across components."""
+        path = os.path.join(
+            tmp_path,
+            "DARK",
+            "EXPOSURE_60.00s",
+            "GAIN_100_OFFSET_50_SETTEMP_-10.00_0001.fits",
+        )
+
+        keywords = parse_path_keywords(path, str(tmp_path))
+
+        assert keywords == {
+            config.NORMALIZED_HEADER_TYPE: "DARK",
+            config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.00",
+            config.NORMALIZED_HEADER_GAIN: "100",
+            config.NORMALIZED_HEADER_OFFSET: "50",
+            config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+        }
+
+    def test_file_name_overrides_folders(self, tmp_path):
+        """Test that later path components win."""
+        path = os.path.join(tmp_path, "FILTER_L", "FLAT_FILTER_B_DATE_2026-01-15.fits")
+
+        keywords = parse_path_keywords(path, str(tmp_path))
+
+        assert keywords[config.NORMALIZED_HEADER_FILTER] == "B"
+        assert keywords[config.NORMALIZED_HEADER_DATE] == "2026-01-15"
+        assert keywords[config.NORMALIZED_HEADER_TYPE] == "FLAT"
+
+    def test_ignores_folders_above_input_dir(self, tmp_path):
+        """Test that only components below input_dir are parsed."""
+        input_dir = tmp_path / "DARK"
+        path = os.path.join(input_dir, "session_0001.fits")
+
+        assert parse_path_keywords(path, str(input_dir)) == {}
+
+
+class TestPathKeywordsComplete:
+    """Tests for path_keywords_complete function."""
+
+    DARK_KEYWORDS = {
+        config.NORMALIZED_HEADER_TYPE: "DARK",
+        config.NORMALIZED_HEADER_CAMERA: "ATR585M",
+        config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+        config.NORMALIZED_HEADER_GAIN: "100",
+        config.NORMALIZED_HEADER_OFFSET: "50",
+        config.NORMALIZED_HEADER_READOUTMODE: "Low Conversion Gain",
+        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.00",
+    }
+
+    def test_every_grouping_keyword_is_required(self):
+        """Test that a path missing a grouping keyword is incomplete."""
+        partial = dict(self.DARK_KEYWORDS)
+        del partial[config.NORMALIZED_HEADER_GAIN]
+
+        assert path_keywords_complete(self.DARK_KEYWORDS)
+        assert not path_keywords_complete(partial)
+        assert not path_keywords_complete({})
+
+    def test_flats_also_need_exposure(self):
+        """Test that flat paths must supply exposure for dark matching."""
+        flat = {
+            **self.DARK_KEYWORDS,
+            config.NORMALIZED_HEADER_TYPE: "FLAT",
+            config.NORMALIZED_HEADER_FILTER: "L",
+            config.NORMALIZED_HEADER_DATE: "2026-01-15",
+        }
+        no_exposure = dict(flat)
+        del no_exposure[config.NORMALIZED_HEADER_EXPOSURESECONDS]
+
+        assert path_keywords_complete(flat)
+        assert not path_keywords_complete(no_exposure)
+
+    def test_ignored_types_only_need_the_type(self):
+        """Test that a LIGHT path is enough to ignore the frame."""
+        assert path_keywords_complete({config.NORMALIZED_HEADER_TYPE: "LIGHT"})
+
+
+class TestVerifySamples:
+    """Tests for verify_samples function."""
+
+    PATH_KEYWORDS = {
+        config.NORMALIZED_HEADER_TYPE: "DARK",
+        config.NORMALIZED_HEADER_EXPOSURESECONDS: "60.00",
+        config.NORMALIZED_HEADER_SETTEMP: "-10.00",
+    }
+
+    def test_matching_samples_return_path_keywords(self):
+        """Test that agreeing samples verify, comparing numbers numerically."""
+        sampled = [_dark_headers(), _dark_headers()]
+
+        # Only path keywords, in the sampled headers' formatting
+        assert verify_samples(self.PATH_KEYWORDS, sampled) == {
+            config.NORMALIZED_HEADER_TYPE: "DARK",
+            config.NORMALIZED_HEADER_EXPOSURESECONDS: 60.0,
+            config.NORMALIZED_HEADER_SETTEMP: -10.0,
+        }
+
+    def test_path_mismatch_fails(self):
+        """Test that a header disagreeing with the path fails verification."""
+        sampled = [_dark_headers(), _dark_headers(exposureseconds=120.0)]
+
+        assert verify_samples(self.PATH_KEYWORDS, sampled) is None
+
+    def test_samples_must_agree_on_unparsed_keywords(self):
+        """Test that keywords missing from the path must match across samples."""
+        sampled = [_dark_headers(), _dark_headers(camera="ASI2600MM")]
+
+        assert verify_samples(self.PATH_KEYWORDS, sampled) is None
+
+    def test_unreadable_or_missing_samples_fail(self):
+        """Test that an unreadable sample or an empty sample fails."""
+        assert verify_samples(self.PATH_KEYWORDS, [_dark_headers(), None]) is None
+        assert verify_samples(self.PATH_KEYWORDS, []) is None
@@ -0,0 +1,49 @@
+"""
+Unit tests for ap_create_master.run_manifest module.
+"""
+
+from ap_create_master.run_manifest import RunManifest
+
+
+class TestRunManifest:
+    """Tests for RunManifest class."""
+
+    def test_unseen_until_recorded(self, tmp_path):
+        """Test that recorded paths are no longer reported as unseen."""
+        db_path = str(tmp_path / "manifest.sqlite")
+        input_dir = str(tmp_path / "inbox")
+
+        with RunManifest(db_path) as manifest:
+            assert manifest.unseen(input_dir, ["a.fits", "b.fits"]) == {
+                "a.fits",
+                "b.fits",
+            }
+            manifest.record(input_dir, ["a.fits"])
+
+        with RunManifest(db_path) as manifest:
+            assert manifest.unseen(input_dir, ["a.fits", "b.fits"]) == {"b.fits"}
+
+    def test_read_only_manifest_records_nothing(self, tmp_path):
+        """Test that a read-only manifest answers unseen but is not written."""
+        db_path = str(tmp_path / "manifest.sqlite")
+        input_dir = str(tmp_path / "inbox")
+        with RunManifest(db_path) as manifest:
+            manifest.record(input_dir, ["a.fits"])
+
+        with RunManifest(db_path, read_only=True) as manifest:
+            manifest.record(input_dir, ["b.fits"])
+            assert manifest.unseen(input_dir, ["a.fits", "b.fits"]) == {"b.fits"}
+
+        with RunManifest(db_path) as manifest:
+            assert manifest.unseen(input_dir, ["a.fits", "b.fits"]) == {"b.fits"}
+
+    def test_recorded_per_input_directory(self, tmp_path):
+        """Test that each input directory has its own record."""
+        db_path = str(tmp_path / "manifest.sqlite")
+
+        with RunManifest(db_path) as manifest:
+            manifest.record(str(tmp_path / "inbox1"), ["a.fits"])
+
+            assert manifest.unseen(str(tmp_path / "inbox2"), ["a.fits"]) == {"a.fits"}
+            # Equivalent spellings of a directory share a record
+            assert manifest.unseen(str(tmp_path / "inbox1" / "."), ["a.fits"]) == set()
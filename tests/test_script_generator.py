@@ -4,15 +4,27 @@ Unit tests for ap_create_master.script_generator module.
 Generated By: Cursor (Claude Sonnet 4.5)
 """
 
+import json
 from unittest.mock import patch
 
 import pytest
 
-from ap_create_master import config
+from jinja2 import FileSystemLoader, ModuleLoader
+
+from ap_create_master import config, script_generator
+from ap_create_master.template_env import compile_templates
 from ap_create_master.script_generator import (
+    SCRIPT_MANIFEST_VERSION,
+    _get_template_env,
+    build_script_manifest,
     escape_js_string,
     generate_combined_script,
+    generate_driver_script,
     generate_master_filename,
+    load_script_manifest,
+    stream_combined_script,
+    write_driver_script,
+    write_script_manifest,
 )
 
 
@@ -263,3 +275,322 @@ class TestGenerateCombinedScript:
         # Should NOT use File.findFiles (that was the bug)
         assert "File.findFiles" not in script
         assert "FlagCaseInsensitive" not in script
+
+    def test_process_setup_is_defined_once_for_many_groups(self, tmp_path):
+        """Test that groups call shared functions instead of repeating setup."""
+        flat_groups = [
+            (
+                {config.NORMALIZED_HEADER_FILTER: flt},
+                [f"/in/{flt}_{i}.fits" for i in range(3)],
+                "bias_master.xisf",
+                "dark_master.xisf",
+            )
+            for flt in ["L", "R", "G", "B"]
+        ]
+        bias_groups = [({}, ["/in/bias1.fits"])]
+
+        script = generate_combined_script(
+            str(tmp_path / "output"), bias_groups, [], flat_groups, "run.log"
+        )
+
+        assert script.count("new ImageIntegration") == 1
+        assert script.count("new ImageCalibration") == 1
+        assert script.count("P.sigmaLow") == 1
+        assert script.count("new FileFormatInstance") == 1
+        assert script.count("calibrateFlats({") == 4
+        assert script.count('integrateMaster("flat", {') == 4
+        assert script.count('integrateMaster("bias", {') == 1
+
+    def test_run_masters_are_created_before_flat_calibration(self, tmp_path):
+        """Test that masters calibrating flats are integrated before them."""
+        output_dir = str(tmp_path / "output")
+        bias_metadata = {config.NORMALIZED_HEADER_GAIN: "100"}
+        bias_name = generate_master_filename(bias_metadata, "bias")
+        run_bias = str(tmp_path / "output" / f"{bias_name}.xisf")
+        flat_groups = [
+            ({config.NORMALIZED_HEADER_FILTER: "B"}, ["/in/f1.fits"], run_bias, None)
+        ]
+        bias_groups = [
+            (bias_metadata, ["/in/b1.fits"]),
+            ({config.NORMALIZED_HEADER_GAIN: "200"}, ["/in/b2.fits"]),
+        ]
+
+        script = generate_combined_script(
+            output_dir, bias_groups, [], flat_groups, str(tmp_path / "test.log")
+        )
+
+        creating = script.index("Phase 1: Creating Calibration Masters")
+        calibrating = script.index("calibrateFlats({")
+        assert creating < script.index('"/in/b1.fits"') < calibrating
+        assert script.index('"/in/b2.fits"') > calibrating
+        assert script.count('integrateMaster("bias", {') == 2
+        assert "Phase 3: Creating Master Frames" in script
+
+    def test_stack_size_replaces_automatic_memory(self, tmp_path):
+        """Test that a stack size turns off automatic memory sizing."""
+        args = (str(tmp_path / "output"), [({}, ["/in/b1.fits"])], [], [], "run.log")
+
+        automatic = generate_combined_script(*args)
+        budgeted = generate_combined_script(*args, stack_size_mb=6144)
+
+        assert "INTEGRATION_MEMORY.stackSizeMB = 6144;" in budgeted
+        assert "INTEGRATION_MEMORY.autoMemorySize = false;" in budgeted
+        assert "INTEGRATION_MEMORY.autoMemorySize = false;" not in automatic
+
+
+class TestStreamCombinedScript:
+    """Tests for stream_combined_script function."""
+
+    def test_stream_matches_rendered_script(self, tmp_path):
+        """Test that streamed chunks join to the rendered script."""
+        flat_groups = [
+            (
+                {config.NORMALIZED_HEADER_FILTER: "B"},
+                ["C:\\input\\flat1.fits", "D:/input/flat2.fits"],
+                "bias_master.xisf",
+                None,
+            ),
+            ({config.NORMALIZED_HEADER_FILTER: "R"}, ["/in/r1.fits"], None, None),
+        ]
+        args = (
+            str(tmp_path / "output"),
+            [({}, ["/in/bias1.fits"])],
+            [({}, ["/in/dark1.fits", "/in/dark2.fits"])],
+            flat_groups,
+            str(tmp_path / "test.log"),
+            str(tmp_path / "calibrated"),
+        )
+
+        chunks = list(stream_combined_script(*args))
+
+        assert len(chunks) > 1
+        assert "".join(chunks) == generate_combined_script(*args)
+        assert '"C:/input/flat1.fits"' in "".join(chunks)
+
+    def test_large_group_streams_in_small_chunks(self, tmp_path):
+        """Test that no chunk holds a whole group's file list."""
+        paths = [f"/in/frame_{index:05d}.fits" for index in range(2000)]
+        master_bias = str(tmp_path / "output" / "bias.xisf")
+        args = (
+            str(tmp_path / "output"),
+            [({}, paths)],
+            [({}, paths)],
+            [({config.NORMALIZED_HEADER_FILTER: "L"}, paths, master_bias, None)],
+            str(tmp_path / "test.log"),
+        )
+
+        chunks = list(stream_combined_script(*args))
+        script = "".join(chunks)
+
+        # Bias, dark, calibrated flat and integrated flat lists
+        assert script.count('"/in/frame_01999.fits"') == 3
+        assert max(chunk.count("/in/frame_") for chunk in chunks) == 1
+
+
+class TestTemplateEnvironment:
+    """Tests for the cached and precompiled template environment."""
+
+    BIAS_GROUPS = [({config.NORMALIZED_HEADER_CAMERA: "ATR585M"}, ["/in/b1.fits"])]
+
+    @pytest.fixture
+    def compiled_paths(self, tmp_path, monkeypatch):
+        """Point the compiled template paths at tmp_path with a fresh cache."""
+        archive = tmp_path / "compiled.zip"
+        manifest = tmp_path / "compiled.json"
+        monkeypatch.setattr(script_generator, "COMPILED_TEMPLATE_ARCHIVE", archive)
+        monkeypatch.setattr(script_generator, "COMPILED_TEMPLATE_MANIFEST", manifest)
+        _get_template_env.cache_clear()
+        yield archive, manifest
+        _get_template_env.cache_clear()
+
+    def _render(self):
+        return generate_combined_script("/out", self.BIAS_GROUPS, [], [], "/out/x.log")
+
+    def test_environment_is_created_once(self, compiled_paths):
+        """Test that repeated calls reuse one environment."""
+        assert _get_template_env() is _get_template_env()
+
+    def test_compiled_templates_render_like_source(self, compiled_paths):
+        """Test that precompiled templates are used and render identically."""
+        archive, manifest = compiled_paths
+        from_source = self._render()
+        assert isinstance(_get_template_env().loader, FileSystemLoader)
+
+        compile_templates(archive, manifest)
+        _get_template_env.cache_clear()
+
+        assert isinstance(_get_template_env().loader, ModuleLoader)
+        assert self._render() == from_source
+
+    def test_templates_compiled_for_another_jinja2_are_ignored(self, compiled_paths):
+        """Test that a stamp from a different Jinja2 falls back to source."""
+        archive, manifest = compiled_paths
+        compile_templates(archive, manifest)
+        manifest.write_text('{"jinja2": "0.0"}', encoding="utf-8")
+
+        assert isinstance(_get_template_env().loader, FileSystemLoader)
+
+    def test_template_sources_are_not_read_when_compiled(
+        self, compiled_paths, monkeypatch
+    ):
+        """Test that a cold start with compiled templates needs no sources."""
+        archive, manifest = compiled_paths
+        compile_templates(archive, manifest)
+        monkeypatch.setattr(
+            script_generator, "TEMPLATE_DIR", archive.parent / "missing"
+        )
+
+        assert isinstance(_get_template_env().loader, ModuleLoader)
+        assert "integrateMaster" in self._render()
+
+
+class TestScriptManifest:
+    """Tests for the JSON script manifest and its driver script."""
+
+    FLAT_GROUPS = [
+        (
+            {config.NORMALIZED_HEADER_FILTER: "B"},
+            ["C:\\input\\flat1.fits", "/input/flat2.fits"],
+            "bias_master.xisf",
+            None,
+        ),
+        ({config.NORMALIZED_HEADER_FILTER: "R"}, ["/in/r1.fits"], None, None),
+    ]
+
+    def _manifest(self, tmp_path):
+        return build_script_manifest(
+            str(tmp_path / "output"),
+            [({}, ["/in/bias1.fits"])],
+            [],
+            self.FLAT_GROUPS,
+            str(tmp_path / "test.log"),
+            str(tmp_path / "calibrated"),
+        )
+
+    def _write(self, tmp_path, manifest):
+        path = str(tmp_path / "manifest.json")
+        write_script_manifest(path, manifest)
+        return path
+
+    def test_manifest_round_trips(self, tmp_path):
+        """Test that a written manifest loads back unchanged."""
+        manifest = self._manifest(tmp_path)
+
+        assert load_script_manifest(self._write(tmp_path, manifest)) == manifest
+        assert manifest["version"] == SCRIPT_MANIFEST_VERSION
+        assert [len(manifest[t]) for t in ("bias", "dark", "flat")] == [1, 0, 2]
+
+    def test_masters_calibrating_flats_are_marked(self, tmp_path):
+        """Test that bias and dark groups feeding flats are marked feedsFlats."""
+        bias_name = generate_master_filename({}, "bias")
+        run_bias = str(tmp_path / "output" / f"{bias_name}.xisf")
+        manifest = build_script_manifest(
+            str(tmp_path / "output"),
+            [({}, ["/in/bias1.fits"])],
+            [({}, ["/in/dark1.fits"])],
+            [({}, ["/in/flat1.fits"], run_bias, None)],
+            str(tmp_path / "test.log"),
+        )
+
+        assert manifest["bias"][0]["feedsFlats"] is True
+        assert manifest["dark"][0]["feedsFlats"] is False
+
+    def test_stack_size_is_recorded(self, tmp_path):
+        """Test that the stack size is null by default and set when given."""
+        manifest = build_script_manifest(
+            str(tmp_path / "output"),
+            [({}, ["/in/bias1.fits"])],
+            [],
+            [],
+            str(tmp_path / "test.log"),
+            stack_size_mb=2048,
+        )
+
+        assert self._manifest(tmp_path)["stackSizeMB"] is None
+        assert load_script_manifest(self._write(tmp_path, manifest)) == manifest
+        assert manifest["stackSizeMB"] == 2048
+
+    def test_flat_groups_carry_calibration_paths(self, tmp_path):
+        """Test calibrated image paths and forward-slash normalization."""
+        calibrated, uncalibrated = self._manifest(tmp_path)["flat"]
+
+        assert calibrated["calibrated"] is True
+        assert calibrated["files"][0] == "C:/input/flat1.fits"
+        assert calibrated["masterBias"] == "bias_master.xisf"
+        assert calibrated["masterDark"] == ""
+        assert all(
+            image.startswith(calibrated["outputDirectory"] + "/")
+            and image.endswith("_c.xisf")
+            for image in calibrated["images"]
+        )
+        assert uncalibrated["calibrated"] is False
+        assert uncalibrated["images"] == uncalibrated["files"] == ["/in/r1.fits"]
+
+    @pytest.mark.parametrize(
+        "corrupt",
+        [
+            lambda m: m.update(version=SCRIPT_MANIFEST_VERSION + 1),
+            lambda m: m.pop("logFile"),
+            lambda m: m.pop("stackSizeMB"),
+            lambda m: m.update(stackSizeMB=0),
+            lambda m: m.update(dark=None),
+            lambda m: m["bias"].append("bias.xisf"),
+            lambda m: m["bias"][0].pop("output"),
+            lambda m: m["bias"][0].update(images=[]),
+            lambda m: m["flat"][0].update(files=[1]),
+            lambda m: m["flat"][0].update(masterBias=""),
+        ],
+    )
+    def test_invalid_manifest_raises(self, tmp_path, corrupt):
+        """Test that invalid manifests are neither written nor loaded."""
+        manifest = self._manifest(tmp_path)
+        corrupt(manifest)
+        path = tmp_path / "manifest.json"
+
+        with pytest.raises(ValueError):
+            write_script_manifest(str(path), manifest)
+        assert not path.exists()
+
+        path.write_text(json.dumps(manifest), encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_script_manifest(str(path))
+
+    def test_non_json_manifest_raises(self, tmp_path):
+        """Test that unparseable or non-object JSON is rejected."""
+        path = tmp_path / "manifest.json"
+        path.write_text("{not json", encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_script_manifest(str(path))
+
+        path.write_text(json.dumps([]), encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_script_manifest(str(path))
+
+    def test_driver_defines_functions_once_without_paths(self):
+        """Test that the driver holds the process setup but no run data."""
+        driver = generate_driver_script()
+
+        assert driver.count("function calibrateFlats(") == 1
+        assert driver.count("function integrateMaster(") == 1
+        assert "jsArguments[0]" in driver
+        assert f"manifest.version != {SCRIPT_MANIFEST_VERSION}" in driver
+        assert ".fits" not in driver
+
+    def test_file_paths_are_not_echoed_to_the_console(self):
+        """Test that the processes only log how many files they handle."""
+        driver = generate_driver_script()
+
+        assert "P.images.length" in driver
+        assert "P.images[i]" not in driver
+        assert "P.targetFrames[i]" not in driver
+
+    def test_driver_is_only_rewritten_when_changed(self, tmp_path):
+        """Test that an up-to-date driver script is left untouched."""
+        driver_path = tmp_path / "driver.js"
+
+        assert write_driver_script(driver_path) is True
+        assert write_driver_script(driver_path) is False
+
+        driver_path.write_text("// outdated", encoding="utf-8")
+        assert write_driver_script(driver_path) is True
+        assert driver_path.read_text(encoding="utf-8") == generate_driver_script()
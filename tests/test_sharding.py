@@ -0,0 +1,225 @@
+"""
+Unit tests for ap_create_master.sharding module.
+"""
+
+import pytest
+
+from ap_create_master import config
+from ap_create_master.script_generator import generate_master_filename
+from ap_create_master.sharding import MIB, group_cost, group_working_set, shard_groups
+
+GAIN = config.NORMALIZED_HEADER_GAIN
+
+
+def _group(name, frames):
+    """Build a (metadata, file_paths) group with the given frame count."""
+    return ({"name": name}, [f"{name}_{index}.fits" for index in range(frames)])
+
+
+def _names(groups):
+    return [metadata["name"] for metadata, *_ in groups]
+
+
+class TestGroupCost:
+    """Tests for group_cost function."""
+
+    def test_calibrated_groups_count_twice(self):
+        """Test that calibrated frames are counted for both passes."""
+        assert group_cost(["a.fits", "b.fits"]) == 2
+        assert group_cost(["a.fits", "b.fits"], calibrated=True) == 4
+
+
+class TestGroupWorkingSet:
+    """Tests for group_working_set function."""
+
+    def test_unknown_frames_use_the_fallback(self):
+        """Test that frames of unknown size count as the fallback size."""
+        assert group_working_set([100, None, 100]) == 200
+        assert group_working_set([100, None, 100], fallback_frame_bytes=50) == 250
+
+
+class TestShardGroups:
+    """Tests for shard_groups function."""
+
+    def test_single_instance_keeps_everything_in_order(self):
+        """Test that one instance gets every group in run order."""
+        bias = [_group("b1", 5), _group("b2", 50)]
+        dark = [_group("d1", 20)]
+        flat = [(*_group("f1", 10), "bias.xisf", None)]
+
+        (shard,) = shard_groups(bias, dark, flat, 1)
+
+        assert shard.bias_groups == bias
+        assert shard.dark_groups == dark
+        assert shard.flat_groups == flat
+        assert shard.cost == 5 + 50 + 20 + 2 * 10
+
+    def test_groups_are_balanced_by_cost(self):
+        """Test largest-first assignment to the least loaded shard."""
+        bias = [_group("b1", 40), _group("b2", 30), _group("b3", 20)]
+        dark = [_group("d1", 10), _group("d2", 10), _group("d3", 10)]
+
+        shards = shard_groups(bias, dark, [], 2)
+
+        assert sorted(shard.cost for shard in shards) == [60, 60]
+        assert _names(shards[0].bias_groups) == ["b1"]
+        assert _names(shards[0].dark_groups) == ["d1", "d2"]
+        assert _names(shards[1].bias_groups) == ["b2", "b3"]
+        assert _names(shards[1].dark_groups) == ["d3"]
+
+    def test_calibrated_flats_weigh_more(self):
+        """Test that a calibrated flat group counts its frames twice."""
+        flat = [
+            (*_group("f1", 10), "bias.xisf", None),
+            (*_group("f2", 15), None, None),
+            (*_group("f3", 5), None, None),
+        ]
+
+        shards = shard_groups([], [], flat, 2)
+
+        assert [_names(shard.flat_groups) for shard in shards] == [
+            ["f1"],
+            ["f2", "f3"],
+        ]
+
+    def test_empty_shards_are_dropped(self):
+        """Test that more instances than groups yields one shard per group."""
+        shards = shard_groups([_group("b1", 3)], [_group("d1", 3)], [], 8)
+
+        assert len(shards) == 2
+        assert _names(shards[0].bias_groups) == ["b1"]
+        assert _names(shards[1].dark_groups) == ["d1"]
+        assert shard_groups([], [], [], 4) == []
+
+    def test_instances_must_be_positive(self):
+        """Test that fewer than one instance is rejected."""
+        with pytest.raises(ValueError):
+            shard_groups([_group("b1", 1)], [], [], 0)
+
+    def test_dependent_flats_run_in_a_second_wave(self):
+        """Test that flats calibrated with run masters wait for them."""
+        b2_metadata, b2_paths = _group("b2", 10)
+        bias = [_group("b1", 10), ({**b2_metadata, GAIN: "100"}, b2_paths)]
+        dark = [_group("d1", 10)]
+        bias_path = f"/masters/{generate_master_filename(bias[1][0], 'bias')}.xisf"
+        dark_path = f"/masters/{generate_master_filename(dark[0][0], 'dark')}.xisf"
+        flat = [
+            (*_group("f1", 10), bias_path, dark_path),
+            (*_group("f2", 10), "/library/bias.xisf", None),
+        ]
+
+        shards = shard_groups(bias, dark, flat, 4, master_dir="/masters")
+        independent = shard_groups(bias, dark, flat, 4)
+
+        assert [shard.wave for shard in shards] == [0, 0, 0, 0, 1]
+        assert _names(shards[4].flat_groups) == ["f1"]
+        # Library-calibrated flats do not wait
+        assert _names(shards[3].flat_groups) == ["f2"]
+        assert [shard.wave for shard in independent] == [0, 0, 0, 0]
+
+    def test_dependent_flats_wait_only_for_their_masters(self):
+        """Test that second-wave shards depend on the shards they need."""
+        bias = [
+            ({"name": "b1", GAIN: "0"}, ["b1_0.fits"] * 20),
+            ({"name": "b2", GAIN: "100"}, ["b2_0.fits"] * 10),
+        ]
+        paths = [
+            f"/masters/{generate_master_filename(metadata, 'bias')}.xisf"
+            for metadata, _ in bias
+        ]
+        flat = [
+            (*_group("f1", 10), paths[1], None),
+            (*_group("f2", 10), paths[0], None),
+            (*_group("f3", 10), paths[1], None),
+        ]
+
+        shards = shard_groups(bias, [], flat, 2, master_dir="/masters")
+
+        assert [_names(shard.bias_groups) for shard in shards[:2]] == [["b1"], ["b2"]]
+        assert [
+            (_names(shard.flat_groups), shard.depends_on) for shard in shards[2:]
+        ] == [
+            (["f2"], [0]),
+            (["f1"], [1]),
+            (["f3"], [1]),
+        ]
+
+    def test_flats_sharing_a_master_are_spread(self):
+        """Test that flats of one run master are not kept in one shard."""
+        bias = [_group("b1", 10)]
+        bias_path = f"/masters/{generate_master_filename(bias[0][0], 'bias')}.xisf"
+        flat = [(*_group(f"f{index}", 10), bias_path, None) for index in range(4)]
+
+        shards = shard_groups(bias, [], flat, 2, master_dir="/masters")
+
+        assert [shard.wave for shard in shards] == [0, 1, 1]
+        assert _names(shards[0].bias_groups) == ["b1"]
+        assert [shard.cost for shard in shards[1:]] == [40, 40]
+
+    def test_single_instance_keeps_dependencies_in_one_script(self):
+        """Test that one instance creates run masters before its flats."""
+        bias = [_group("b1", 10)]
+        bias_path = f"/masters/{generate_master_filename(bias[0][0], 'bias')}.xisf"
+        flat = [(*_group("f1", 10), bias_path, None)]
+
+        (shard,) = shard_groups(bias, [], flat, 1, master_dir="/masters")
+
+        assert shard.wave == 0
+        assert shard.bias_groups == bias
+        assert shard.flat_groups == flat
+
+    def test_memory_budget_packs_large_groups_together(self):
+        """Test that groups too large to run side by side share an instance."""
+        bias = [_group("b1", 10), _group("b2", 10), _group("b3", 10)]
+        working_sets = [6 * MIB, 6 * MIB, 1 * MIB]
+
+        unbounded = shard_groups(bias, [], [], 3, working_sets=working_sets)
+        shards = shard_groups(
+            bias, [], [], 3, working_sets=working_sets, memory_budget=8 * MIB
+        )
+
+        assert len(unbounded) == 3
+        assert all(shard.stack_size_mb is None for shard in unbounded)
+        assert [_names(shard.bias_groups) for shard in shards] == [
+            ["b1", "b2"],
+            ["b3"],
+        ]
+        assert [shard.working_set for shard in shards] == [6 * MIB, 1 * MIB]
+
+    def test_memory_budget_is_split_by_working_set(self):
+        """Test that stack sizes share the whole budget in proportion."""
+        bias = [_group("b1", 10), _group("b2", 10)]
+
+        shards = shard_groups(
+            bias, [], [], 2, working_sets=[3 * MIB, 1 * MIB], memory_budget=8 * MIB
+        )
+        unknown = shard_groups(bias, [], [], 2, memory_budget=8 * MIB)
+
+        assert [shard.stack_size_mb for shard in shards] == [6, 2]
+        assert [shard.stack_size_mb for shard in unknown] == [4, 4]
+
+    def test_each_packing_gets_the_whole_budget(self):
+        """Test that released shards split the budget among themselves."""
+        bias = [_group("b1", 10)]
+        bias_path = f"/masters/{generate_master_filename(bias[0][0], 'bias')}.xisf"
+        flat = [(*_group(f"f{index}", 10), bias_path, None) for index in range(2)]
+
+        shards = shard_groups(
+            bias,
+            [],
+            flat,
+            2,
+            master_dir="/masters",
+            working_sets=[2 * MIB, 2 * MIB, 2 * MIB],
+            memory_budget=8 * MIB,
+        )
+
+        assert [shard.stack_size_mb for shard in shards] == [8, 4, 4]
+        assert [shard.depends_on for shard in shards] == [[], [0], [0]]
+
+    def test_invalid_memory_arguments(self):
+        """Test a non-positive budget and misaligned working sets."""
+        with pytest.raises(ValueError):
+            shard_groups([_group("b1", 1)], [], [], 1, memory_budget=0)
+        with pytest.raises(ValueError):
+            shard_groups([_group("b1", 1)], [], [], 1, working_sets=[1, 2])
@@ -0,0 +1,180 @@
+"""
+Unit tests for ap_create_master.xisf_header module.
+"""
+
+import io
+import struct
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from xisf import XISF
+
+from ap_create_master.xisf_header import (
+    XisfHeaderError,
+    read_normalized_xisf_header,
+    read_xisf_header,
+)
+
+
+def _write_xisf(path, keywords):
+    """Write a small XISF image with FITS keywords using the xisf library."""
+    XISF.write(
+        str(path),
+        np.zeros((8, 8, 1), dtype=np.float32),
+        image_metadata={
+            "FITSKeywords": {
+                name: [{"value": value, "comment": ""}]
+                for name, value in keywords.items()
+            }
+        },
+    )
+
+
+def _write_raw_xisf(path, xml, data=b""):
+    """Write an XISF file from a raw XML header."""
+    header = xml.encode("utf-8")
+    path.write_bytes(b"XISF0100" + struct.pack("<I", len(header)) + b"\0" * 4)
+    with open(path, "ab") as f:
+        f.write(header + data)
+
+
+class TestReadXisfHeader:
+    """Tests for read_xisf_header function."""
+
+    def test_reads_fits_keywords(self, tmp_path):
+        """Test that FITS keywords match what the xisf library reports."""
+        path = tmp_path / "masterDark.xisf"
+        keywords = {
+            "IMAGETYP": "MASTER DARK",
+            "INSTRUME": "ATR585M",
+            "SET-TEMP": "-10.0",
+            "GAIN": "239",
+            "EXPOSURE": "60.0",
+        }
+        _write_xisf(path, keywords)
+
+        headers = read_xisf_header(str(path))
+
+        metadata = {}
+        XISF.read(str(path), image_metadata=metadata)
+        for name in keywords:
+            assert headers[name] == metadata["FITSKeywords"][name][0]["value"]
+
+    def test_strips_fits_quoting(self, tmp_path):
+        """Test that PixInsight-style quoted values are unquoted."""
+        path = tmp_path / "master.xisf"
+        _write_raw_xisf(
+            path,
+            '<xisf xmlns="http://www.pixinsight.com/xisf" version="1.0">'
+            '<Image geometry="1:1:1" sampleFormat="Float32">'
+            '<FITSKeyword name="IMAGETYP" value="\'MASTER BIAS  \'" comment=""/>'
+            '<FITSKeyword name="READOUTM" value="\'O\'\'Hare\'" comment=""/>'
+            "</Image></xisf>",
+        )
+
+        headers = read_xisf_header(str(path))
+
+        assert headers["IMAGETYP"] == "MASTER BIAS"
+        assert headers["READOUTM"] == "O'Hare"
+
+    def test_properties_fill_missing_keywords(self, tmp_path):
+        """Test that XISF properties are used only when keywords are missing."""
+        path = tmp_path / "master.xisf"
+        _write_raw_xisf(
+            path,
+            '<xisf xmlns="http://www.pixinsight.com/xisf" version="1.0">'
+            '<Image geometry="1:1:1" sampleFormat="Float32">'
+            '<FITSKeyword name="INSTRUME" value="ATR585M" comment=""/>'
+            '<Property id="Instrument:Camera:Name" type="String">Other</Property>'
+            '<Property id="Instrument:ExposureTime" type="Float32" value="30"/>'
+            "</Image></xisf>",
+        )
+
+        headers = read_xisf_header(str(path))
+
+        assert headers["INSTRUME"] == "ATR585M"
+        assert headers["EXPOSURE"] == "30"
+
+    def test_geometry_fills_image_size(self, tmp_path):
+        """Test that geometry and sample format stand in for NAXIS and BITPIX."""
+        path = tmp_path / "flat.xisf"
+        _write_raw_xisf(
+            path,
+            '<xisf xmlns="http://www.pixinsight.com/xisf" version="1.0">'
+            '<Image geometry="3856:2180:1" sampleFormat="UInt16">'
+            '<FITSKeyword name="NAXIS1" value="3840" comment=""/>'
+            "</Image></xisf>",
+        )
+
+        headers = read_xisf_header(str(path))
+
+        assert headers["NAXIS1"] == "3840"
+        assert headers["NAXIS2"] == 2180
+        assert headers["NAXIS3"] == 1
+        assert headers["BITPIX"] == 16
+
+    def test_never_reads_data_block(self, tmp_path):
+        """Test that only the preamble and XML header are read."""
+        path = tmp_path / "master.xisf"
+        xml = (
+            '<xisf xmlns="http://www.pixinsight.com/xisf" version="1.0">'
+            '<Image geometry="1:1:1" sampleFormat="Float32">'
+            '<FITSKeyword name="IMAGETYP" value="MASTER FLAT" comment=""/>'
+            "</Image></xisf>"
+        )
+        _write_raw_xisf(path, xml, data=b"\xff" * 65536)
+
+        positions = []
+
+        class RecordingFile(io.BytesIO):
+            def __exit__(self, *exc_info):
+                positions.append(self.tell())
+                return super().__exit__(*exc_info)
+
+        with patch(
+            "ap_create_master.xisf_header.open",
+            lambda *args: RecordingFile(path.read_bytes()),
+            create=True,
+        ):
+            headers = read_xisf_header(str(path))
+
+        assert headers["IMAGETYP"] == "MASTER FLAT"
+        assert positions == [16 + len(xml.encode("utf-8"))]
+
+    def test_rejects_non_xisf_file(self, tmp_path):
+        """Test that a file without the XISF signature raises XisfHeaderError."""
+        path = tmp_path / "notes.xisf"
+        path.write_bytes(b"SIMPLE  =                    T")
+
+        with pytest.raises(XisfHeaderError):
+            read_xisf_header(str(path))
+
+    def test_rejects_truncated_header(self, tmp_path):
+        """Test that a header shorter than its declared length raises."""
+        path = tmp_path / "truncated.xisf"
+        path.write_bytes(b"XISF0100" + struct.pack("<I", 4096) + b"\0" * 4 + b"<x")
+
+        with pytest.raises(XisfHeaderError):
+            read_xisf_header(str(path))
+
+
+class TestReadNormalizedXisfHeader:
+    """Tests for read_normalized_xisf_header function."""
+
+    @patch("ap_common.normalize_headers")
+    def test_normalizes_with_ap_common(self, mock_normalize, tmp_path):
+        """Test that raw keywords are normalized by ap-common."""
+        path = tmp_path / "masterBias.xisf"
+        _write_xisf(path, {"IMAGETYP": "MASTER BIAS"})
+        mock_normalize.return_value = {"type": "MASTER BIAS"}
+
+        # The image size is kept for memory estimates whatever ap-common returns
+        assert read_normalized_xisf_header(str(path)) == {
+            "type": "MASTER BIAS",
+            "naxis1": 8,
+            "naxis2": 8,
+            "naxis3": 1,
+            "bitpix": -32,
+        }
+        assert mock_normalize.call_args.args[0]["IMAGETYP"] == "MASTER BIAS"